@@ -1,10 +1,17 @@
 import pygame
+import numpy as np
 import random
 import math
+import json
+import os
 from enum import Enum
 import heapq
 from collections import defaultdict
+from itertools import chain
+from operator import attrgetter
+from types import MappingProxyType
 import time
+from timers import default_timers, cooldown_property, timer_property
 
 class AIState(Enum):
     """AI状态枚举"""
@@ -17,101 +24,408 @@ class AIState(Enum):
     SEARCH = "search"       # 新增：搜索状态
     ALERT = "alert"         # 新增：警戒状态
 
+class AIEvent:
+    """影响状态转换的事件标志位
+
+    感知结果(看到/察觉)、计时(搜索超时、空闲结束)和受伤等情况各占一位，
+    组合后作为转移表的键。
+    """
+    SEE = 1              # 看到玩家
+    SENSE = 2            # 察觉到玩家但看不到
+    RETREAT = 4          # 应该撤退(生命值低)
+    OUT_OF_COMBAT = 8    # 不在战斗中
+    CALM = 16            # 警戒等级低于30
+    SEARCH_EXPIRED = 32  # 搜索超过3秒
+    IDLE_EXPIRED = 64    # 空闲等待结束
+    AGGRESSIVE = 128     # 攻击性高于0.5
+    HEAR = 256           # 听到玩家发出的声音
+    COUNT = 512          # 标志位组合的数量
+
+
+def _decide_transition(state, events):
+    """状态转换规则：根据当前状态和事件标志位决定下一个状态
+    只在编译转移表时调用一次。
+    """
+    see = events & AIEvent.SEE
+    sense = events & AIEvent.SENSE
+    hear = events & AIEvent.HEAR
+    
+    # 优先处理紧急状态
+    if events & AIEvent.RETREAT:
+        return AIState.RETREAT
+        
+    # 根据当前状态和感知信息决定下一个状态
+    if state == AIState.IDLE:
+        # 从空闲状态更容易进入巡逻状态
+        if see:
+            return AIState.CHASE
+        elif sense or hear:
+            return AIState.ALERT
+        elif events & AIEvent.IDLE_EXPIRED:
+            return AIState.PATROL
+            
+    elif state == AIState.PATROL:
+        if see:
+            return AIState.CHASE
+        elif sense or hear:
+            return AIState.ALERT
+            
+    elif state == AIState.ALERT:
+        if see:
+            if events & AIEvent.AGGRESSIVE:
+                return AIState.CHASE
+        elif not (sense or hear):
+            if events & AIEvent.CALM:
+                return AIState.PATROL
+                
+    elif state == AIState.CHASE:
+        if not see:
+            if sense or hear:
+                return AIState.SEARCH
+            else:
+                return AIState.PATROL
+            
+    elif state == AIState.SEARCH:
+        if see:
+            return AIState.CHASE
+        elif events & AIEvent.SEARCH_EXPIRED:
+            return AIState.PATROL
+            
+    # 脱战相关的状态转换
+    if events & AIEvent.OUT_OF_COMBAT:
+        if state in (AIState.CHASE, AIState.ATTACK, AIState.SEARCH):
+            return AIState.PATROL
+            
+    return state
+
+
+# 转移表：状态 -> 按事件标志位索引的下一个状态，模块加载时编译一次
+AI_TRANSITIONS = {
+    state: tuple(_decide_transition(state, events) for events in range(AIEvent.COUNT))
+    for state in AIState
+}
+
+
+class BehaviorNode:
+    """行为树节点"""
+    def evaluate(self, ai, info):
+        return False
+
+
+class HealthCheck(BehaviorNode):
+    """生命值低于撤退阈值"""
+    def evaluate(self, ai, info):
+        health_ratio = getattr(ai.entity, 'health', 100) / 100
+        return health_ratio < ai.thresholds['health_retreat']
+
+
+class RangeCheck(BehaviorNode):
+    """玩家在攻击范围内"""
+    def evaluate(self, ai, info):
+        return info['distance'] <= ai.attack_range
+
+
+class AlwaysTrue(BehaviorNode):
+    """默认分支"""
+    def evaluate(self, ai, info):
+        return True
+
+
+# 行为树只创建一次，所有AI共用
+BEHAVIOR_TREE = (
+    (HealthCheck(), AIState.RETREAT),
+    (RangeCheck(), AIState.ATTACK),
+    (AlwaysTrue(), AIState.CHASE),  # 默认行为
+)
+
+
+class AIArchetype:
+    """AI原型
+
+    同一类敌人共享的只读配置，从数据文件加载一次，所有同类AI引用同一个对象。
+    数据文件中base是所有原型的公共配置，archetypes中每个原型覆盖其中的部分字段，
+    weight是随机生成敌人时选中该原型的权重。
+    """
+    DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'ai', 'archetypes.json')
+    # AI以只读属性读取的字段
+    FIELDS = (
+        'detection_range', 'attack_range', 'move_speed', 'jump_force',
+        'aggression', 'caution', 'intelligence',
+        'path_update_interval', 'state_change_cooldown', 'acceleration', 'deceleration',
+        'min_jump_height', 'jump_cooldown_time', 'path_node_distance', 'max_path_length',
+        'attack_damage', 'attack_knockback', 'attack_cooldown_time',
+        'search_radius', 'search_timeout', 'alert_duration', 'stunned_duration',
+        'vision_angle', 'vision_distance', 'peripheral_vision', 'hearing_range',
+        'attack_windup', 'attack_recovery', 'combo_window', 'state_durations', 'thresholds',
+        'attack_type', 'melee_range', 'ranged_range',
+        'lunge_speed', 'lunge_duration', 'lunge_cooldown',
+        'projectile_speed', 'projectile_cooldown', 'projectile_damage', 'max_shots', 'burst_cooldown',
+        'taunt_cooldown_time', 'taunt_duration', 'taunt_float_speed', 'taunts',
+        'avoid_threshold', 'combat_timeout', 'target_lock_duration', 'lock_break_distance',
+    )
+    _archetypes = None   # 名称 -> AIArchetype
+    _pool = None         # 每个原型按权重重复出现的列表，用于随机选择
+
+    def __init__(self, name, config):
+        """
+        name: 原型名称
+        config: 合并了公共配置的原型配置
+        """
+        values = dict(config)
+        values.pop('weight', None)
+        # 角度在数据文件中以度为单位
+        values['vision_angle'] = math.radians(values.pop('vision_angle_degrees'))
+        values['peripheral_vision'] = math.radians(values.pop('peripheral_vision_degrees'))
+        values['state_durations'] = MappingProxyType(
+            {AIState[state]: duration for state, duration in values['state_durations'].items()})
+        values['thresholds'] = MappingProxyType(dict(values['thresholds']))
+        values['behavior_weights'] = MappingProxyType(dict(values['behavior_weights']))
+        values['taunts'] = MappingProxyType(
+            {taunt_type: tuple(texts) for taunt_type, texts in values['taunts'].items()})
+        missing = [field for field in self.FIELDS if field not in values]
+        if missing:
+            raise KeyError(f"AI原型 {name} 缺少配置: {', '.join(missing)}")
+        values['name'] = name
+        self.__dict__.update(values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("AI原型是只读的")
+
+    @classmethod
+    def load(cls, path=None):
+        """从数据文件加载所有原型
+        Args:
+            path: 数据文件路径，默认为DATA_PATH
+        Returns:
+            dict: 名称 -> AIArchetype
+        """
+        with open(path or cls.DATA_PATH, "r", encoding='utf-8') as f:
+            data = json.load(f)
+        base = data.get('base', {})
+        archetypes = {}
+        pool = []
+        for name, overrides in data['archetypes'].items():
+            archetypes[name] = cls(name, {**base, **overrides})
+            pool.extend([archetypes[name]] * overrides.get('weight', 1))
+        cls._archetypes = archetypes
+        cls._pool = pool
+        return archetypes
+
+    @classmethod
+    def get(cls, name):
+        """按名称获取原型(第一次使用时加载数据文件)"""
+        if cls._archetypes is None:
+            cls.load()
+        return cls._archetypes[name]
+
+    @classmethod
+    def all(cls):
+        """获取所有原型(第一次使用时加载数据文件)"""
+        if cls._archetypes is None:
+            cls.load()
+        return tuple(cls._archetypes.values())
+
+    @classmethod
+    def choose(cls):
+        """按权重随机选择一个原型"""
+        if cls._archetypes is None:
+            cls.load()
+        return random.choice(cls._pool)
+
+
+class _SearchBuffers:
+    """A*搜索缓冲区，同样大小的地图共用一份"""
+    __slots__ = ('rows', 'cols', 'tile_version', 'walkable', 'g', 'parent', 'seen', 'closed', 'generation')
+
+    def __init__(self, rows, cols):
+        size = rows * cols
+        self.rows = rows
+        self.cols = cols
+        self.tile_version = None
+        self.walkable = [False] * size
+        self.g = [0] * size
+        self.parent = [-1] * size
+        self.seen = [0] * size      # 等于当前代数表示已加入开放集
+        self.closed = [0] * size    # 等于当前代数表示已关闭
+        self.generation = 0
+
+
 class AStarPathFinding:
-    """A*寻路算法实现"""
-    def __init__(self, game_map):
+    """A*寻路算法实现
+
+    节点用砖块编号(行 * 列数 + 列)索引扁平数组，g值、父节点和开放/关闭集合
+    以代数标记复用同一组缓冲区，不需要每次清空。搜索受展开节点数和时间预算限制，
+    找不到目标时返回通往离目标最近节点的部分路径。
+    """
+    _buffers = {}   # (行数, 列数) -> _SearchBuffers
+    _shared = {}    # 地图 -> 该地图上所有AI共用的寻路器
+
+    def __init__(self, game_map, max_iterations=1000, max_time_ms=3.0):
+        """
+        game_map: 游戏地图
+        max_iterations: 单次搜索最多展开的节点数
+        max_time_ms: 单次搜索的时间预算(毫秒)
+        """
         self.game_map = game_map
         self.tile_size = game_map.tile_size
-        self.max_iterations = 1000  # 防止无限循环
-        
+        self.max_iterations = max_iterations  # 防止无限循环
+        self.max_time_ms = max_time_ms
+        self.last_result = None   # 'found' / 'partial' / 'failed'
+        self.stats = {
+            'searches': 0,        # 搜索次数
+            'expanded': 0,        # 累计展开的节点数
+            'last_expanded': 0,   # 上次搜索展开的节点数
+            'last_ms': 0.0,       # 上次搜索耗时
+            'partial': 0,         # 返回部分路径的次数
+            'failed': 0,          # 没有路径的次数
+        }
+
+    @classmethod
+    def shared(cls, game_map):
+        """获取同一地图上所有AI共用的寻路器"""
+        path_finding = cls._shared.get(game_map)
+        if path_finding is None:
+            path_finding = cls._shared[game_map] = cls(game_map)
+        return path_finding
+
+    def _get_buffers(self):
+        """获取共享缓冲区，地图砖块变化时重建可行走标记"""
+        solid = self.game_map.solid_grid
+        rows, cols = solid.shape
+        buffers = AStarPathFinding._buffers.get((rows, cols))
+        if buffers is None:
+            buffers = AStarPathFinding._buffers[(rows, cols)] = _SearchBuffers(rows, cols)
+        if buffers.tile_version != self.game_map.tile_version:
+            # 可行走：本身不是实心且头顶一格也不是实心(第一行头顶在地图外，视为墙)
+            walkable = ~solid
+            walkable[1:] &= ~solid[:-1]
+            walkable[0] = False
+            buffers.walkable = walkable.ravel().tolist()
+            buffers.tile_version = self.game_map.tile_version
+        return buffers
+
     def find_path(self, start, end):
         """寻找路径
         Args:
             start: (x, y) 起点坐标
             end: (x, y) 终点坐标
         Returns:
-            list: 路径点列表
+            list: 路径点列表(目标不可达或超出预算时为通往最近节点的部分路径)
         """
-        start_node = (int(start[0] // self.tile_size), 
-                     int(start[1] // self.tile_size))
-        end_node = (int(end[0] // self.tile_size), 
-                   int(end[1] // self.tile_size))
-        
-        frontier = []
-        heapq.heappush(frontier, (0, start_node))
-        came_from = {start_node: None}
-        cost_so_far = {start_node: 0}
+        started = time.perf_counter()
+        buffers = self._get_buffers()
+        rows, cols = buffers.rows, buffers.cols
+        tile_size = self.tile_size
+        
+        start_x, start_y = int(start[0] // tile_size), int(start[1] // tile_size)
+        end_x, end_y = int(end[0] // tile_size), int(end[1] // tile_size)
+        if not (0 <= start_x < cols and 0 <= start_y < rows):
+            self._record('failed', 0, started)
+            return []
+        start_id = start_y * cols + start_x
+        goal_id = end_y * cols + end_x if (0 <= end_x < cols and 0 <= end_y < rows) else -1
+        
+        buffers.generation += 1
+        generation = buffers.generation
+        walkable = buffers.walkable
+        g = buffers.g
+        parent = buffers.parent
+        seen = buffers.seen
+        closed = buffers.closed
+        
+        g[start_id] = 0
+        parent[start_id] = -1
+        seen[start_id] = generation
+        best_id = start_id
+        best_h = abs(start_x - end_x) + abs(start_y - end_y)
+        frontier = [(best_h, best_h, start_id)]
+        
+        heappop = heapq.heappop
+        heappush = heapq.heappush
+        deadline = started + self.max_time_ms / 1000.0
+        max_iterations = self.max_iterations
+        expanded = 0
+        found = False
         
         while frontier:
-            current = heapq.heappop(frontier)[1]
-            
-            if current == end_node:
+            _, h, current = heappop(frontier)
+            if closed[current] == generation:
+                continue
+            closed[current] = generation
+            if current == goal_id:
+                found = True
                 break
                 
-            for next_node in self._get_neighbors(current):
-                new_cost = cost_so_far[current] + 1
+            # 记录离目标最近的节点，用于部分路径
+            if h < best_h or (h == best_h and g[current] < g[best_id]):
+                best_id = current
+                best_h = h
+                
+            expanded += 1
+            if expanded >= max_iterations:
+                break
+            if not expanded & 63 and time.perf_counter() > deadline:
+                break
                 
-                if next_node not in cost_so_far or new_cost < cost_so_far[next_node]:
-                    cost_so_far[next_node] = new_cost
-                    priority = new_cost + self._heuristic(next_node, end_node)
-                    heapq.heappush(frontier, (priority, next_node))
-                    came_from[next_node] = current
+            current_x = current % cols
+            current_y = current // cols
+            new_g = g[current] + 1
+            
+            # 基本方向：下、右、上、左
+            for next_id, next_x, next_y in (
+                (current + cols, current_x, current_y + 1),
+                (current + 1, current_x + 1, current_y),
+                (current - cols, current_x, current_y - 1),
+                (current - 1, current_x - 1, current_y),
+            ):
+                if next_x < 0 or next_x >= cols or next_y < 0 or next_y >= rows:
+                    continue
+                if not walkable[next_id] or closed[next_id] == generation:
+                    continue
+                if seen[next_id] != generation or new_g < g[next_id]:
+                    seen[next_id] = generation
+                    g[next_id] = new_g
+                    parent[next_id] = current
+                    next_h = abs(next_x - end_x) + abs(next_y - end_y)
+                    heappush(frontier, (new_g + next_h, next_h, next_id))
                     
+        if found:
+            target = goal_id
+            self._record('found', expanded, started)
+        elif best_id != start_id:
+            target = best_id
+            self._record('partial', expanded, started)
+        else:
+            self._record('failed', expanded, started)
+            return []
+            
         # 重建路径
         path = []
-        current = end_node
-        while current != start_node:
-            if current not in came_from:
-                return []  # 无法找到路径
-            path.append((current[0] * self.tile_size + self.tile_size // 2,
-                        current[1] * self.tile_size + self.tile_size // 2))
-            current = came_from[current]
+        half = tile_size // 2
+        current = target
+        while current != start_id:
+            path.append(((current % cols) * tile_size + half,
+                         (current // cols) * tile_size + half))
+            current = parent[current]
             
         path.append((start[0], start[1]))
         path.reverse()
         return path
-        
-    def _get_neighbors(self, node):
-        """获取相邻节点"""
-        x, y = node
-        neighbors = []
-        
-        # 基本方向
-        directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
-        
-        for dx, dy in directions:
-            next_x, next_y = x + dx, y + dy
-            if self._is_valid_node((next_x, next_y)):
-                neighbors.append((next_x, next_y))
-                
-        return neighbors
-        
-    def _is_valid_node(self, node):
-        """检查节点是否有效"""
-        x, y = node
-        # 检查是否在地图范围内
-        if x < 0 or y < 0:
-            return False
-            
-        # 获取实际的世界坐标
-        world_x = x * self.tile_size
-        world_y = y * self.tile_size
-        
-        # 检查是否是实心砖块
-        if self.game_map.is_solid(world_x, world_y):
-            return False
-            
-        # 检查头顶是否有空间（假设实体高度为2个tile）
-        if self.game_map.is_solid(world_x, world_y - self.tile_size):
-            return False
-            
-        return True
-        
-    def _heuristic(self, a, b):
-        """启发式函数 - 曼哈顿距离"""
-        return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+    def _record(self, result, expanded, started):
+        """记录搜索统计"""
+        self.last_result = result
+        stats = self.stats
+        stats['searches'] += 1
+        stats['expanded'] += expanded
+        stats['last_expanded'] = expanded
+        stats['last_ms'] = (time.perf_counter() - started) * 1000
+        if result != 'found':
+            stats[result] += 1
 
 class AIEmotionState:
+    __slots__ = ('aggression', 'fear', 'confidence')
+
     def __init__(self):
         self.aggression = 0.5
         self.fear = 0.0
@@ -131,133 +445,457 @@ class AIEmotionState:
         self.fear = max(0, self.fear - 0.1 * dt)
         self.confidence = min(1, max(0, self.confidence))
 
+class AIOverlay:
+    """所有AI共享的覆盖层
+
+    路径、感知范围、叫骂气泡、锁定标记和调试图形都绘制到同一张
+    复用的透明表面上，只记录被绘制过的包围盒，每帧合成一次。
+    pygame.draw直接覆盖像素的RGBA而不混合：线条和轮廓直接画在覆盖层上(很细，重叠处无关紧要)；
+    半透明的填充图形按参数缓存成小的透明表面，只把屏幕内的部分blit到覆盖层上混合，
+    避免后画的敌人擦掉先画的内容。
+    """
+    max_cached_shapes = 64
+
+    def __init__(self, game):
+        self.game = game
+        # 覆盖层在放大到窗口之后合成，按窗口分辨率绘制
+        self.surface = pygame.Surface(game.display.get_size(), pygame.SRCALPHA)
+        self.bounds = self.surface.get_rect()
+        self.dirty_rect = None
+        self._shapes = {}   # 形状参数 -> 画好的透明表面
+
+    def _blit_shape(self, key, position, size, draw, alpha=None):
+        """把缓存的填充图形混合到覆盖层(只处理屏幕内的部分)
+        Args:
+            key: 缓存键
+            position: 图形表面左上角在覆盖层上的位置
+            size: 图形表面大小
+            draw: draw(shape_surface)，第一次使用时在图形表面上绘制
+            alpha: 整体透明度，None表示不变
+        Returns:
+            pygame.Rect: 覆盖层上被绘制的区域
+        """
+        rect = pygame.Rect(position, (max(1, size[0]), max(1, size[1])))
+        visible = rect.clip(self.bounds)
+        if not visible.width or not visible.height:
+            return visible
+        shape = self._shapes.get(key)
+        if shape is None:
+            shape = pygame.Surface(rect.size, pygame.SRCALPHA)
+            draw(shape)
+            if len(self._shapes) >= self.max_cached_shapes:
+                self._shapes.clear()
+            self._shapes[key] = shape
+        shape.set_alpha(alpha)
+        drawn = self.surface.blit(shape, visible.topleft, visible.move(-rect.x, -rect.y))
+        self.mark(drawn)
+        return drawn
+
+    def draw_circle(self, color, center, radius, width=0):
+        """绘制圆：轮廓直接画在覆盖层上，填充圆按颜色和半径缓存后混合"""
+        radius = int(radius)
+        center = (int(center[0]), int(center[1]))
+        if width:
+            return self.mark(pygame.draw.circle(self.surface, color, center, radius, width))
+        return self._blit_shape(
+            ('circle', color, radius),
+            (center[0] - radius, center[1] - radius),
+            (radius * 2 + 1, radius * 2 + 1),
+            lambda shape: pygame.draw.circle(shape, color, (radius, radius), radius)
+        )
+
+    def draw_polygon(self, color, points):
+        """混合绘制填充多边形(按相对顶点缓存，适合形状固定的视锥)"""
+        left = int(math.floor(min(x for x, _ in points)))
+        top = int(math.floor(min(y for _, y in points)))
+        local = tuple((int(round(x - left)), int(round(y - top))) for x, y in points)
+        size = (max(x for x, _ in local) + 1, max(y for _, y in local) + 1)
+        return self._blit_shape(
+            ('polygon', color, local), (left, top), size,
+            lambda shape: pygame.draw.polygon(shape, color, local)
+        )
+
+    def draw_lines(self, color, closed, points, width=1):
+        """直接在覆盖层上绘制折线"""
+        return self.mark(pygame.draw.lines(self.surface, color, closed, points, width))
+
+    def draw_rect(self, color, rect, border_radius=0, alpha=None):
+        """混合绘制填充矩形(按颜色和大小缓存，淡出时只改变整体透明度)"""
+        rect = pygame.Rect(rect)
+        return self._blit_shape(
+            ('rect', color, rect.size, border_radius), rect.topleft, rect.size,
+            lambda shape: pygame.draw.rect(shape, color, shape.get_rect(), border_radius=border_radius),
+            alpha
+        )
+
+    def mark(self, rect):
+        """记录被绘制的区域
+        Returns:
+            pygame.Rect: 覆盖层内被绘制的区域
+        """
+        rect = rect.clip(self.bounds)
+        if rect.width <= 0 or rect.height <= 0:
+            return rect
+        if self.dirty_rect is None:
+            self.dirty_rect = rect
+        else:
+            self.dirty_rect.union_ip(rect)
+        return rect
+
+    def render(self, camera_offset=(0, 0)):
+        """合成覆盖层到屏幕并清空已绘制区域"""
+        game = self.game
+        if game.debug and game.debug_info.get('ai'):
+            for enemy in game.enemies:
+                enemy.ai.render_debug(self, camera_offset)
+        
+        if self.dirty_rect is None:
+            return
+        game.display.blit(self.surface, self.dirty_rect.topleft, self.dirty_rect)
+        self.surface.fill((0, 0, 0, 0), self.dirty_rect)
+        self.dirty_rect = None
+
+class PerceptionRecord:
+    """单个AI的感知结果
+
+    每个AI预先分配一份，每次感知时原地覆盖，不再为每次思考创建新字典。
+    支持按键读取(info['distance']、info.get('player_pos'))，与原来的字典用法兼容。
+    """
+    __slots__ = ('can_see_player', 'can_sense_player', 'distance', 'player_pos',
+                 'has_line_of_sight', 'target_locked', 'direction', 'heard_noise', 'heard_player', 'fresh')
+
+    def __init__(self):
+        self.clear()
+        self.fresh = False   # 本帧是否已由批量感知填写
+
+    def clear(self):
+        """恢复为没有感知到玩家的状态"""
+        self.can_see_player = False
+        self.can_sense_player = False
+        self.distance = float('inf')
+        self.player_pos = None
+        self.has_line_of_sight = False   # 是否有直接视线
+        self.target_locked = False       # 是否锁定目标
+        self.direction = None
+        self.heard_noise = None          # 听到的声源位置
+        self.heard_player = False        # 听到的声音是否由玩家发出
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+
+class PerceptionPass:
+    """批量感知
+
+    每帧对所有活跃AI执行一次：距离、警戒范围和视锥(点积)测试是一次向量运算，
+    只对通过这些测试的AI判断视线：地图有覆盖检测范围的玩家视野时先排除所在格子看不到玩家的AI，
+    宽松视野是精确视线的超集，排除不会漏掉能看到玩家的AI，剩下的仍投射视线确认。结果写入各AI的PerceptionRecord(距离、能否察觉、是否有视线)，
+    锁定和警戒等有状态的部分在AI思考时处理。
+    尺寸、视野等很少变化的属性按AI列表缓存，每帧只收集位置和速度。
+    """
+    def __init__(self, batch_threshold=64):
+        """
+        batch_threshold: 视线数超过该值时使用批量网格遍历(数量少时逐条投射比批量遍历的固定开销更省)
+        """
+        self.batch_threshold = batch_threshold
+        self._ais = []
+        self._static = None   # 与_ais对应的 (宽, 高, 检测范围, 视野角度余弦) 数组
+        self._max_range = 0.0  # _ais中最大的检测范围
+
+    def _get_static(self, ais):
+        """获取AI列表的静态属性数组(列表变化时重建)"""
+        if self._static is None or ais != self._ais:
+            self._ais = list(ais)
+            static = np.array([
+                (ai.entity.width, ai.entity.height, ai.detection_range, ai.vision_angle)
+                for ai in ais
+            ], dtype=np.float64).reshape(len(ais), 4)
+            width, height, detection_range, vision_angle = static.T
+            self._static = (width / 2, height / 2, detection_range,
+                            detection_range * 1.5, np.cos(vision_angle / 2))
+            self._max_range = float(detection_range.max()) if len(ais) else 0.0
+        return self._static
+
+    def update(self, ais, player_pos):
+        """计算一组AI的感知
+        Args:
+            ais: AI列表
+            player_pos: 玩家位置
+        Returns:
+            int: 投射的视线数
+        """
+        if not ais:
+            return 0
+        if not player_pos:
+            for ai in ais:
+                record = ai.perception
+                record.distance = float('inf')
+                record.can_sense_player = False
+                record.has_line_of_sight = False
+                record.fresh = True
+            return 0
+            
+        count = len(ais)
+        half_width, half_height, detection_range, alert_range, cone_cos = self._get_static(ais)
+        dynamic = np.fromiter(chain.from_iterable(
+            (ai.entity.x, ai.entity.y, ai.entity.vx) for ai in ais
+        ), dtype=np.float64, count=count * 3).reshape(count, 3)
+        x, y, vx = dynamic.T
+        player_x, player_y = player_pos
+        
+        # 距离按实体左上角计算，视锥按实体中心计算
+        distance = np.hypot(player_x - x, player_y - y)
+        can_sense = distance <= alert_range
+        center_x = x + half_width
+        center_y = y + half_height
+        to_x = player_x - center_x
+        to_y = player_y - center_y
+        facing = np.where(vx >= 0, 1.0, -1.0)
+        in_cone = facing * to_x >= cone_cos * np.hypot(to_x, to_y)
+        
+        # 只对视觉范围内、视锥内的AI判断视线
+        candidates = np.flatnonzero((distance <= detection_range) & in_cone)
+        has_los = np.zeros(count, dtype=bool)
+        game_map = ais[0].game_map
+        fov = getattr(game_map, 'player_fov', None)
+        if fov is not None and fov.covers(player_pos) and fov.max_range >= self._max_range:
+            # 玩家视野已覆盖检测范围：宽松视野里不可见的格子一定看不到玩家，可见的再用视线确认
+            candidates = candidates[fov.are_visible(center_x[candidates], center_y[candidates])]
+        if len(candidates) > self.batch_threshold:
+            blocked = game_map.raycast_batch(
+                center_x[candidates], center_y[candidates],
+                np.full(len(candidates), player_x, dtype=np.float64),
+                np.full(len(candidates), player_y, dtype=np.float64)
+            )[0]
+            has_los[candidates] = ~blocked
+        else:
+            raycast = game_map.raycast
+            for index in candidates.tolist():
+                has_los[index] = raycast(center_x[index], center_y[index], player_x, player_y) is None
+        rays = len(candidates)
+            
+        for ai, ai_distance, ai_can_sense, ai_has_los in zip(
+                ais, distance.tolist(), can_sense.tolist(), has_los.tolist()):
+            record = ai.perception
+            record.distance = ai_distance
+            record.can_sense_player = ai_can_sense
+            record.has_line_of_sight = ai_has_los
+            record.fresh = True
+        return rays
+
+
+class AIScheduler:
+    """AI思考调度器
+
+    行动(移动)每帧对所有活跃AI执行；思考(感知、状态选择、寻路)按优先级排队，
+    优先级由与玩家的距离和距上次思考的时间共同决定，每帧在毫秒预算内尽量多地执行。
+    """
+    def __init__(self, budget_ms=2.0, reference_distance=400, max_staleness=0.5):
+        """
+        budget_ms: 每帧思考的时间预算(毫秒)
+        reference_distance: 距离衰减参考值，距离为该值时优先级减半
+        max_staleness: 超过该时间没有思考的AI无视预算优先执行(秒)
+        """
+        self.budget_ms = budget_ms
+        self.reference_distance = reference_distance
+        self.max_staleness = max_staleness
+
+        self.time = 0.0
+        self.last_think = {}    # enemy -> 上次思考的时间
+        self.perception = PerceptionPass()  # 所有活跃AI的批量感知
+        self.stats = {'thinks': 0, 'pending': 0, 'think_ms': 0.0, 'rays': 0}
+
+    def update(self, dt, player_pos, enemies):
+        """执行本帧的思考和行动
+        Args:
+            dt: 帧时间
+            player_pos: 玩家位置
+            enemies: 活跃敌人列表
+        Returns:
+            list: 更新出错的敌人
+        """
+        self.time += dt
+        now = self.time
+
+        # 刚进入活跃范围的AI从上一帧开始计时
+        last_think = {enemy: self.last_think.get(enemy, now - dt) for enemy in enemies}
+        self.last_think = last_think
+
+        # 优先级 = 等待时间 / (1 + 距离 / 参考距离)
+        queue = []
+        for order, enemy in enumerate(enemies):
+            staleness = now - last_think[enemy]
+            distance = math.hypot(player_pos[0] - enemy.x, player_pos[1] - enemy.y)
+            priority = staleness / (1 + distance / self.reference_distance)
+            queue.append((-priority, order, staleness, enemy))
+        heapq.heapify(queue)
+
+        failed = []
+        thinks = 0
+        start = time.perf_counter()
+        
+        # 所有活跃AI的感知一次批量计算
+        self.stats['rays'] = self.perception.update(
+            [enemy.ai for enemy in enemies if hasattr(enemy, 'ai')], player_pos
+        )
+        deadline = start + self.budget_ms / 1000.0
+        while queue:
+            # 每帧至少思考一次，超出预算后只处理等待过久的AI
+            if thinks and time.perf_counter() >= deadline:
+                queue = [item for item in queue if item[2] >= self.max_staleness]
+                if not queue:
+                    break
+                heapq.heapify(queue)
+                deadline = float('inf')
+            _, _, staleness, enemy = heapq.heappop(queue)
+            try:
+                enemy.ai.think(staleness, player_pos)
+            except Exception as e:
+                print(f"敌人AI更新错误: {e}")
+                failed.append(enemy)
+            last_think[enemy] = now
+            thinks += 1
+
+        self.stats['thinks'] = thinks
+        self.stats['pending'] = len(enemies) - thinks
+        self.stats['think_ms'] = (time.perf_counter() - start) * 1000
+
+        skipped = set(failed)
+        for enemy in enemies:
+            if enemy in skipped:
+                continue
+            try:
+                enemy.ai.act(dt)
+            except Exception as e:
+                print(f"敌人AI更新错误: {e}")
+                failed.append(enemy)
+        return failed
+
 class AI:
-    """AI基类"""
-    def __init__(self, entity, game_map):
+    """AI基类
+
+    只读配置(感知、移动、战斗参数和叫骂文本)放在共享的AIArchetype中，以只读属性的形式读取；
+    实例只在__slots__中保存会变化的状态。
+    """
+    __slots__ = (
+        'entity', 'game_map', 'archetype', 'state', 'target', 'state_timer', 'perception',
+        'path', 'path_update_timer', 'path_finding', 'path_service', 'path_progress',
+        'last_state_change', 'alert_level', 'search_timer', 'search_spot',
+        'last_known_target_pos', 'behavior_weights', 'target_vx',
+        'combo_count', 'is_lunging', 'shots_fired', 'current_taunt', 'taunt_offset_y',
+        'timers', '_attack_ready_at', '_jump_ready_at', '_taunt_ready_at',
+        '_taunt_end', '_lunge_end', '_combo_end', 'direction_change_start',
+        '_taunt_text', '_taunt_surface', 'player_avoid_timer', 'last_player_interaction',
+        'combat_timer', 'last_combat_time', 'in_combat', 'emotion_state',
+        'target_locked', 'target_lock_time', 'patrol_points', 'current_patrol_index',
+        'obstacle_counter', 'last_direction',
+        'idle_wait', '_decision_state', '_decision_events', '__weakref__',
+    )
+    # 所有AI共享的渲染缓存
+    _vision_cone_cache = {}   # (朝向, 视野角度, 视野距离) -> 视锥顶点偏移
+    _state_text_cache = {}    # 状态 -> 调试文本表面
+    _lock_surface = None      # 锁定标记表面
+    _font = None              # 叫骂和调试文本字体
+    
+    # 冷却和计时保存为游戏时钟上的到期时刻，不需要每帧递减
+    attack_cooldown = cooldown_property('_attack_ready_at', "攻击冷却剩余时间(秒)")
+    jump_cooldown = cooldown_property('_jump_ready_at', "跳跃冷却剩余时间(秒)")
+    taunt_cooldown = cooldown_property('_taunt_ready_at', "叫骂冷却剩余时间(秒)")
+    taunt_timer = timer_property('_taunt_end', '_on_taunt_end', "叫骂文本剩余显示时间(秒)")
+    lunge_timer = timer_property('_lunge_end', '_on_lunge_end', "扑击剩余时间(秒)")
+    combo_timer = timer_property('_combo_end', '_on_combo_end', "连击窗口剩余时间(秒)")
+    
+    def __init__(self, entity, game_map, archetype=None):
+        """
+        entity: AI控制的实体
+        game_map: 游戏地图
+        archetype: AI原型，为None时按权重随机选择(近战80%，远程20%)
+        """
         # 基础引用
         self.entity = entity          # AI控制的实体
         self.game_map = game_map      # 游戏地图用
+        self.archetype = archetype or AIArchetype.choose()  # 共享的只读配置
+        self.timers = default_timers  # 冷却和计时使用的游戏时钟
+        self._taunt_end = None        # 叫骂显示结束的计时器
+        self._lunge_end = None        # 扑击结束的计时器
+        self._combo_end = None        # 连击窗口结束的计时器
         
         # 状态相关
         self.state = AIState.IDLE     # 当前状态
         self.target = None            # 当前目标
         self.state_timer = 0          # 状态计时器
-        
-        # 移动参数
-        self.detection_range = 400    # 增加检测范围 (从300增加到400)
-        self.attack_range = 80        # 攻击范围
-        self.move_speed = 180         # 增加移动速度 (从150增加到180)
-        self.jump_force = -400        # 跳跃力度
-        
-        # 行为参数
-        self.aggression = 0.7         # 攻击性(0-1)
-        self.caution = 0.3           # 谨慎性(0-1)
-        self.intelligence = 0.5       # 智能程度(0-1)
+        self.perception = PerceptionRecord()  # 感知结果(原地复用)
+        self.idle_wait = random.expovariate(0.6)  # 空闲多久后开始巡逻(秒)
+        self._decision_state = None   # 上次查转移表时的状态
+        self._decision_events = -1    # 上次查转移表时的事件标志位
         
         # 路径寻找
         self.path = []               # 当前路径
         self.path_update_timer = 0   # 路径更新计时器
-        self.path_update_interval = 0.2  # 减少路径更新间隔 (从0.3减少到0.2)
-        self.path_finding = AStarPathFinding(game_map)
+        # 优先使用地图的平台导航图，没有时退回同一地图共用的网格A*
+        self.path_finding = getattr(game_map, 'nav_graph', None) or AStarPathFinding.shared(game_map)
+        self.path_service = getattr(game_map, 'path_service', None)  # 异步寻路(没有时同步寻路)
         self.path_progress = 0       # 当前路径进度
         
         # 确保初始化所有必要的属性
         self.attack_cooldown = 0
         self.last_state_change = 0
-        self.state_change_cooldown = 0.2  # 减少状态切换冷却 (从0.5减少到0.2)
         self.alert_level = 0
         self.search_timer = 0
+        self.search_spot = None      # 当前搜索地点(由影响图中玩家的出没痕迹选出)
         self.last_known_target_pos = None
-        self.behavior_weights = {
-            'aggression': 0.5,
-            'caution': 0.5,
-            'intelligence': 0.5,
-            'persistence': 0.5
-        }
+        self.behavior_weights = self.archetype.behavior_weights  # 生成敌人时可替换为个体的权重
         
-        # 移动相关参数
+        # 移动相关
         self.target_vx = 0           # 目标水平速度
-        self.acceleration = 1000      # 增加加速度 (从800增加到1000)
-        self.deceleration = 1500      # 增加减速度 (从1200增加到1500)
-        self.min_jump_height = 32    # 最小跳跃高度
         self.jump_cooldown = 0       # 跳跃冷却
-        self.jump_cooldown_time = 1.0  # 跳跃冷却时间
-        
-        # 添加寻路相关的初始化
-        self.path_node_distance = 64   # 路径节点间距
-        self.max_path_length = 10      # 最大路径长度
-        
-        # 添加战斗相关的初始化
-        self.attack_damage = 10        # 基础攻击伤害
-        self.attack_knockback = 300    # 基础击退力度
-        self.attack_cooldown_time = 1.0  # 攻击冷却时间
-        
-        # 添加搜索相关的初始化
-        self.search_radius = 100       # 搜索半径
-        self.search_timeout = 5.0      # 搜索超时时间
-        
-        # 添加状态持续时间
-        self.alert_duration = 3.0      # 戒状态持续时间
-        self.stunned_duration = 1.0    # 眩晕状态持续时间
-        
-        # 添加视觉和感知参数
-        self.vision_angle = math.pi / 2  # 视野角度 (90度)
-        self.vision_distance = 400       # 视野距离
-        self.hearing_range = 300         # 听觉范围
-        
-        # 添加战斗参数
-        self.attack_windup = 0.2        # 攻击前摇时间
-        self.attack_recovery = 0.3      # 攻击后摇时间
-        self.combo_window = 0.8         # 连击窗口时间
-        self.combo_count = 0            # 当前连击数
+        self.direction_change_start = None  # 开始转向的时刻(没有转向时为None)
         
-        # 添加状态持续时间制
-        self.state_durations = {
-            AIState.ALERT: 3.0,         # 警戒状态最长持续时间
-            AIState.SEARCH: 5.0,        # 搜索状态最长持续时间
-            AIState.CHASE: 10.0,        # 追击状态最长持续时间
-            AIState.RETREAT: 4.0,       # 撤退状态最长持续时间
-        }
-        
-        # 添加行为阈值
-        self.thresholds = {
-            'health_retreat': 0.3,      # 生值低于30%时考虑退
-            'health_cautious': 0.5,     # 生命值低于50%时更谨慎
-            'alert_chase': 70,          # 警戒值高于70时可能追击
-            'alert_decay': 5,           # 衰减量
-        }
-        
-        # 添加攻击相关参数
-        self.attack_type = random.choice(['melee'] * 8 + ['ranged'] * 2)  # 随机选择攻击类型，低远程攻击的概率(20%)
-        self.melee_range = 60  # 近战攻击范围
-        self.ranged_range = 200  # 远程攻击范围
-        self.attack_range = self.melee_range if self.attack_type == 'melee' else self.ranged_range
-        
-        # 近战攻击参数
-        self.lunge_speed = 400  # 扑击速度
-        self.lunge_duration = 0.3  # 扑击持续时间
-        self.lunge_cooldown = 1.5  # 扑击冷却时间
+        # 战斗相关
+        self.combo_count = 0            # 当前连击数
         self.is_lunging = False  # 是否正在扑击
         self.lunge_timer = 0  # 扑击计时器
-        
-        # 远程攻击参数
-        self.projectile_speed = 300  # 投射物速度
-        self.projectile_cooldown = 2.0  # 射击冷却时间
-        self.projectile_damage = 8  # 投射物伤害
-        self.max_shots = 3            # 连续射击最大次数
         self.shots_fired = 0          # 当前射击次数
-        self.burst_cooldown = 4.0     # 连发冷却时间
         
-        # 叫骂相关参数
+        # 叫骂相关
         self.taunt_cooldown = 0      # 叫骂冷却
-        self.taunt_cooldown_time = 2.0  # 减少叫骂冷却时间 (从3.0改为2.0)
-        self.taunt_duration = 1.5    # 增加显示持续时间 (从1.0改为1.5)
         self.current_taunt = None    # 当前显示的叫骂文本
         self.taunt_timer = 0         # 叫显示计时器
         self.taunt_offset_y = 0      # 文本上下浮动偏移
-        self.taunt_float_speed = 2   # 浮动速度
+        self._taunt_text = None      # 已渲染的叫骂文本
+        self._taunt_surface = None   # 缓存的叫骂文本表面
         
-        # 尝试加载中文字体
+        # 避战检测
+        self.player_avoid_timer = 0      # 玩家避战计时器
+        self.last_player_interaction = 0  # 上次与玩家交互时间
+        
+        # 脱战相关
+        self.combat_timer = 0           # 战斗计时器
+        self.last_combat_time = 0       # 上次战斗时间
+        self.in_combat = False          # 是否在战斗中
+        
+        self.emotion_state = AIEmotionState()
+        
+        # 目标锁定
+        self.target_locked = False        # 是否锁定目标
+        self.target_lock_time = 0         # 目标锁定时间
+
+    @property
+    def font(self):
+        """所有AI共享的叫骂字体(第一次使用时加载)"""
+        if AI._font is None:
+            AI._font = AI._load_font()
+        return AI._font
+
+    @staticmethod
+    def _load_font():
+        """加载中文字体，找不到时使用默认字体"""
         try:
             # Windows系统常见中文字体
             font_names = [
@@ -270,154 +908,41 @@ class AI:
             ]
             
             # 尝试加载字体
-            self.font = None
             for font_name in font_names:
                 try:
-                    self.font = pygame.font.SysFont(font_name, 24)  # 增大字号到24
-                    test_surface = self.font.render("测试", True, (255, 255, 255))
+                    font = pygame.font.SysFont(font_name, 24)  # 增大字号到24
+                    test_surface = font.render("测试", True, (255, 255, 255))
                     if test_surface.get_width() > 0:  # 验证字是否正确渲染
                         print(f"成功加载字体: {font_name}")
-                        break
+                        return font
                 except:
                     continue
                 
             # 如果没有找到中文字体，使用默认字体
-            if self.font is None:
-                print("警告：无法加载中文字体，使用默认字体")
-                self.font = pygame.font.Font(None, 24)
+            print("警告：无法加载中文字体，使用默认字体")
+            return pygame.font.Font(None, 24)
                 
         except Exception as e:
             print(f"字体加载错误: {e}")
-            self.font = pygame.font.Font(None, 24)
-            
-        # 更新叫骂文本内容，添加玩家逃跑相关的叫骂
-        self.taunts = {
-            'alert': [
-                "! 有入侵者！",
-                "! 谁在那里？",
-                "! 发现目标！",
-                "! 站住！别动！"
-            ],
-            'chase': [
-                "-> 别想跑！",
-                "-> 抓住你了！",
-                "-> 你跑不掉的！",
-                "-> 看我追上你！"
-            ],
-            'attack': [
-                "* 看招！",
-                "* 吃我一击！",
-                "* 拿命来！",
-                "* 受死吧！"
-            ],
-            'retreat': [
-                "<- 战略性撤退！",
-                "<- 暂时撤退...",
-                "<- 我还会回来的！",
-                "<- 下次再战！"
-            ],
-            'search': [
-                "? 躲在哪里？",
-                "? 出来啊！",
-                "? 我知道你在附近...",
-                "? 让我找找..."
-            ],
-            'hit': [
-                "x 啊！",
-                "x 可恶！",
-                "x 你会付出代价！",
-                "x 这点伤算什么！"
-            ],
-            'victory': [
-                "v 解决了！",
-                "v 胜利！",
-                "v 就这点本事？",
-                "v 太弱了！"
-            ],
-            # 新增玩家逃跑相关的叫骂
-            'player_flee': [
-                "→ 别跑啊，胆小鬼！",
-                "→ 哈哈，被吓跑吗？",
-                "→ 跑得掉吗？",
-                "→ 回来打啊！"
-            ],
-            'player_hide': [
-                "? 躲起来了？懦夫！",
-                "? 不敢正面对决吗？",
-                "? 就知道躲躲藏藏！",
-                "? 出来单挑啊！"
-            ],
-            'mock_player': [
-                "! 就这？",
-                "! 太弱了吧！",
-                "! 不堪一击！",
-                "! 不自量力！"
-            ],
-            'player_avoid': [
-                "→ 怎么，不敢来打吗？",
-                "→ 一直躲着算什么英雄！",
-                "→ 来啊，别当缩头乌龟！",
-                "→ 这就是你的实力？就知道躲！"
-            ],
-            'player_far': [
-                "! 站那么远干什么？",
-                "! 有本事近战啊！",
-                "! 不敢近身吗？",
-                "! 离这么远，怕了？"
-            ],
-            'challenge': [
-                "* 来单挑啊！",
-                "* 有种过来打！",
-                "* 你就只会躲吗？",
-                "* 看来你也就这点胆量！"
-            ],
-            'combat_end': [
-                "→ 算你跑得快！",
-                "→ 下次别让我逮到你！",
-                "→ 懦夫！别跑！",
-                "→ 跑什么跑！"
-            ],
-            'combat_start': [
-                "* 终于敢来了？",
-                "* 看来你还有点胆量！",
-                "* 这次别想跑！",
-                "* 来战个痛快！"
-            ]
-        }
-        
-        # 添加避战检测相关参数
-        self.player_avoid_timer = 0      # 玩家避战计时器
-        self.avoid_threshold = 5.0       # 避战判定阈值（秒）
-        self.last_player_interaction = 0  # 上次与玩家交互时间
-        
-        # 添加脱战相关参数
-        self.combat_timer = 0           # 战斗计时器
-        self.combat_timeout = 5.0       # 脱战时间阈值
-        self.last_combat_time = 0       # 上次战斗时间
-        self.in_combat = False          # 是否在战斗中
-        
-        self.emotion_state = AIEmotionState()
-        
-        # 添加目标锁定相关参数
-        self.target_locked = False        # 是否锁定目标
-        self.target_lock_time = 0         # 目标锁定时间
-        self.target_lock_duration = 2.0   # 锁定持续时间
-        self.lock_break_distance = 500    # 锁定打断距离
-        
-        # 视觉相关参数调整
-        self.vision_angle = math.pi / 2   # 视锥角度(90度)
-        self.vision_distance = 400        # 视野距离
-        self.peripheral_vision = math.pi * 0.75  # 周边视野(135度)
+            return pygame.font.Font(None, 24)
 
     def update(self, dt, player_pos):
-        """更新AI状态和行为"""
+        """更新AI状态和行为(思考和行动都在本帧完成)"""
+        self.think(dt, player_pos)
+        self.act(dt)
+
+    def think(self, dt, player_pos):
+        """思考：感知、状态选择和路径请求，可以由调度器降低频率
+        Args:
+            dt: 距上次思考经过的时间
+            player_pos: 玩家位置
+        """
         if self.state == AIState.STUNNED:
             self._update_stunned(dt)
             return
             
-        # 更新计时器
+        # 更新计时器(冷却由游戏时钟计时，不需要递减)
         self.state_timer += dt
-        self.attack_cooldown = max(0, self.attack_cooldown - dt)
         
         # 获取感知信息
         perception_info = self._check_perception(player_pos)
@@ -426,45 +951,27 @@ class AI:
         # 更新朝向
         self._update_facing_direction(perception_info)
         
-        # 状态转换（添加冷却检查）
-        current_time = time.time()
-        if current_time - self.last_state_change >= self.state_change_cooldown:
-            new_state = self._determine_new_state(perception_info)
-            if new_state != self.state:
-                self._on_state_change(new_state)
-                self.state = new_state
-                self.last_state_change = current_time
+        # 状态转换：只在感知、计时或受伤等事件变化时查转移表（添加冷却检查）
+        if self.state == AIState.IDLE and self.idle_wait > 0:
+            self.idle_wait -= dt
+        events = self._get_events(perception_info)
+        if events != self._decision_events or self.state != self._decision_state:
+            current_time = time.time()
+            if current_time - self.last_state_change >= self.state_change_cooldown:
+                self._decision_events = events
+                new_state = AI_TRANSITIONS[self.state][events]
+                if new_state != self.state:
+                    self._on_state_change(new_state)
+                    self.state = new_state
+                    self.last_state_change = current_time
+                self._decision_state = self.state
         
         # 更新行为
         self._update_current_state(dt, perception_info)
         
-        # 平滑移动
-        self._update_movement(dt)
-        
-        # 更新连击计时器
-        if hasattr(self, 'combo_timer'):
-            self.combo_timer = max(0, self.combo_timer - dt)
-            if self.combo_timer <= 0:
-                self.combo_count = 0
-        
         # 检查状态超时
         self._check_state_timeout(dt)
         
-        # 更新扑击状态
-        if self.is_lunging:
-            self.lunge_timer -= dt
-            if self.lunge_timer <= 0:
-                self.is_lunging = False
-                self.entity.vx = 0  # 停止扑击移动
-        
-        # 更新叫骂计时器
-        if self.taunt_cooldown > 0:
-            self.taunt_cooldown -= dt
-        if self.taunt_timer > 0:
-            self.taunt_timer -= dt
-            if self.taunt_timer <= 0:
-                self.current_taunt = None
-        
         # 更新战斗状态
         self._update_combat_state(dt, perception_info)
         
@@ -473,163 +980,146 @@ class AI:
             'dealt_damage': getattr(self, 'dealt_damage', False)
         })
 
+    def act(self, dt):
+        """行动：按最近一次思考的结果移动，每帧执行
+        Args:
+            dt: 帧时间
+        """
+        if self.state == AIState.STUNNED:
+            return
+            
+        # 平滑移动(连击、扑击和叫骂计时到期时由游戏时钟回调)
+        self._update_movement(dt)
+
+    def _on_taunt_end(self):
+        """叫骂显示结束"""
+        self._taunt_end = None
+        self.current_taunt = None
+
+    def _on_lunge_end(self):
+        """扑击结束"""
+        self._lunge_end = None
+        if self.is_lunging:
+            self.is_lunging = False
+            self.entity.vx = 0  # 停止扑击移动
+
+    def _on_combo_end(self):
+        """连击窗口结束"""
+        self._combo_end = None
+        self.combo_count = 0
+
     def _update_current_state(self, dt, perception_info):
         """更新当前状态的具体行为"""
-        state_updates = {
-            AIState.IDLE: self._update_idle,
-            AIState.PATROL: self._update_patrol,
-            AIState.CHASE: self._update_chase,
-            AIState.ATTACK: self._update_attack,
-            AIState.RETREAT: self._update_retreat,
-            AIState.SEARCH: self._update_search,
-            AIState.ALERT: self._update_alert,
-            AIState.STUNNED: self._update_stunned
-        }
-        
-        if self.state in state_updates:
-            state_updates[self.state](dt, perception_info)
+        handler = AI_STATE_HANDLERS.get(self.state)
+        if handler is not None:
+            handler(self, dt, perception_info)
 
-    def _determine_new_state(self, perception_info):
-        """确定新状态"""
-        current_state = self.state
-        can_see_player = perception_info['can_see_player']
-        can_sense_player = perception_info['can_sense_player']
-        distance = perception_info['distance']
-        
-        # 优先处理紧急状态
+    def _get_events(self, perception_info):
+        """把影响状态转换的感知、计时和受伤情况编码为事件标志位
+        Returns:
+            int: AIEvent标志位的组合
+        """
+        if perception_info['can_see_player']:
+            events = AIEvent.SEE
+        elif perception_info['can_sense_player']:
+            events = AIEvent.SENSE
+        else:
+            events = 0
+        if perception_info['heard_player']:
+            events |= AIEvent.HEAR
         if self._should_retreat(perception_info):
-            return AIState.RETREAT
-        
-        # 根据当前状态和感知信息决定下一个状态
-        if current_state == AIState.IDLE:
-            # 从空闲状态更容易进入巡逻状态
-            if can_see_player:
-                return AIState.CHASE
-            elif can_sense_player:
-                return AIState.ALERT
-            elif random.random() < 0.01:  # 1%的概率开始巡逻
-                return AIState.PATROL
-                
-        elif current_state == AIState.PATROL:
-            if can_see_player:
-                return AIState.CHASE
-            elif can_sense_player:
-                return AIState.ALERT
-                
-        elif current_state == AIState.ALERT:
-            if can_see_player:
-                if self.behavior_weights['aggression'] > 0.5:
-                    return AIState.CHASE
-            elif not can_sense_player:
-                if self.alert_level < 30:
-                    return AIState.PATROL
-                    
-        elif current_state == AIState.CHASE:
-            if not can_see_player:
-                if can_sense_player:
-                    return AIState.SEARCH
-                else:
-                    return AIState.PATROL
-                
-        elif current_state == AIState.SEARCH:
-            if can_see_player:
-                return AIState.CHASE
-            elif self.search_timer > 3.0:
-                return AIState.PATROL
-                
-        # 添加脱战相关的状态转换逻辑
+            events |= AIEvent.RETREAT
         if not self.in_combat:
-            if current_state in [AIState.CHASE, AIState.ATTACK, AIState.SEARCH]:
-                return AIState.PATROL
-                
-        return current_state
+            events |= AIEvent.OUT_OF_COMBAT
+        if self.alert_level < 30:
+            events |= AIEvent.CALM
+        if self.search_timer > 3.0:
+            events |= AIEvent.SEARCH_EXPIRED
+        if self.idle_wait <= 0:
+            events |= AIEvent.IDLE_EXPIRED
+        if self.behavior_weights['aggression'] > 0.5:
+            events |= AIEvent.AGGRESSIVE
+        return events
+
+    def _determine_new_state(self, perception_info):
+        """确定新状态(查转移表)"""
+        return AI_TRANSITIONS[self.state][self._get_events(perception_info)]
 
     def _check_perception(self, player_pos):
-        """检查感知信息"""
-        perception_info = {
-            'can_see_player': False,
-            'distance': float('inf'),
-            'player_pos': None,
-            'can_sense_player': False,
-            'has_line_of_sight': False,  # 新增:是否有直接视线
-            'target_locked': False       # 新增:是否锁定目标
-        }
+        """检查感知信息
+        距离、察觉和视线由PerceptionPass批量计算(调度器每帧对所有活跃AI执行一次)，
+        这里根据结果更新锁定、警戒等级和最后已知位置。
+        """
+        perception_info = self.perception
+        if not perception_info.fresh:
+            PerceptionPass().update([self], player_pos)
+        perception_info.fresh = False
+        perception_info.can_see_player = False
+        perception_info.player_pos = None
+        perception_info.target_locked = False
+        perception_info.direction = None
+        perception_info.heard_noise = None
+        perception_info.heard_player = False
         
         if not player_pos:
             return perception_info
         
-        # 计算与玩家的距离
-        dx = player_pos[0] - self.entity.x
-        dy = player_pos[1] - self.entity.y
-        distance = math.sqrt(dx * dx + dy * dy)
-        perception_info['distance'] = distance
-        
-        # 检查是否在警戒范围内
-        alert_range = self.detection_range * 1.5
-        if distance <= alert_range:
-            perception_info['can_sense_player'] = True
-            
-            # 如果在视觉范围内，检查是否有直接视线
-            if distance <= self.detection_range:
-                # 检查是否在视锥内
-                if self._is_in_vision_cone(player_pos):
-                    ai_center = (
-                        self.entity.x + self.entity.width / 2,
-                        self.entity.y + self.entity.height / 2
-                    )
-                    player_center = (
-                        player_pos[0],
-                        player_pos[1]
-                    )
-                    
-                    # 检查视线
-                    has_los = self._has_line_of_sight(ai_center, player_center)
-                    perception_info['has_line_of_sight'] = has_los
-                    
-                    if has_los:
-                        perception_info['can_see_player'] = True
-                        perception_info['player_pos'] = player_pos
-                        perception_info['direction'] = math.copysign(1, dx)
-                        self.last_known_target_pos = player_pos
-                        
-                        # 锁定目标
-                        if not self.target_locked:
-                            self.target_locked = True
-                            self.target_lock_time = time.time()
-                        perception_info['target_locked'] = True
-                        
-                        # 看到玩家时显著提高警戒等级
-                        self.alert_level = min(100, self.alert_level + 50)
+        if perception_info.can_sense_player:
+            # 视觉范围内、视锥内且有直接视线
+            if perception_info.has_line_of_sight:
+                perception_info.can_see_player = True
+                perception_info.player_pos = player_pos
+                perception_info.direction = math.copysign(1, player_pos[0] - self.entity.x)
+                self.last_known_target_pos = player_pos
+                
+                # 锁定目标
+                if not self.target_locked:
+                    self.target_locked = True
+                    self.target_lock_time = time.time()
+                perception_info.target_locked = True
+                
+                # 看到玩家时显著提高警戒等级
+                self.alert_level = min(100, self.alert_level + 50)
                     
         # 如果失去视线但之前已锁定，保持一段时间的锁定
         elif self.target_locked:
             current_time = time.time()
             if current_time - self.target_lock_time < self.target_lock_duration:
-                perception_info['target_locked'] = True
-                perception_info['can_sense_player'] = True
+                perception_info.target_locked = True
+                perception_info.can_sense_player = True
             else:
                 self.target_locked = False
                 
+        # 看不到玩家时查询声音场，听到玩家的声音就去声源处查看
+        if not perception_info.can_see_player:
+            self._check_hearing(perception_info)
+                
         return perception_info
 
-    def _is_in_vision_cone(self, target_pos):
-        """检查目标是否在视锥内"""
-        # 计算到目标的向量
-        dx = target_pos[0] - (self.entity.x + self.entity.width/2)
-        dy = target_pos[1] - (self.entity.y + self.entity.height/2)
-        
-        # 计算角度
-        angle = math.atan2(dy, dx)
-        
-        # 获取AI当前朝向
-        facing_angle = 0 if self.entity.vx >= 0 else math.pi
-        
-        # 计算角度差
-        angle_diff = abs(angle - facing_angle)
-        angle_diff = min(angle_diff, 2 * math.pi - angle_diff)
-        
-        # 检查是否在视锥角度内
-        return angle_diff <= self.vision_angle / 2
+    def _check_hearing(self, perception_info):
+        """查询所在格子的声音
+        Args:
+            perception_info: 感知结果，听到声音时写入声源位置，由玩家发出时标记heard_player
+        """
+        noise = getattr(self.game_map, 'noise', None)
+        if not noise:
+            return
+        x = self.entity.x + self.entity.width / 2
+        y = self.entity.y + self.entity.height / 2
+        # 先听玩家的声音，敌人造成的声音(投射物撞墙、死亡)只让AI警觉，不当作玩家的位置
+        heard = noise.sample(x, y, 'player')
+        if heard and heard[0] <= self.hearing_range:
+            perception_info.heard_player = True
+        else:
+            heard = noise.sample(x, y, 'enemy')
+            if not heard or heard[0] > self.hearing_range:
+                return
+        perceived_distance, origin = heard
+        perception_info.heard_noise = origin
+        if perception_info.heard_player and not perception_info.target_locked:
+            self.last_known_target_pos = origin
+        # 越近的声音越让AI警觉
+        self.alert_level = min(100, self.alert_level + 10 * (1 - perceived_distance / self.hearing_range))
 
     def _perform_attack(self):
         """执行攻击"""
@@ -735,9 +1225,20 @@ class AI:
         """判断是否应该撤退"""
         # 根据生命值和谨慎性判断
         health_ratio = getattr(self.entity, 'health', 100) / 100
-        return (health_ratio < 0.3 or  # 生命值于30%
-                (health_ratio < 0.5 and  # 生命值低于50%且
-                 self.behavior_weights['caution'] > 0.7))  # 谨慎性高
+        if health_ratio < 0.3:  # 生命值于30%
+            return True
+        if health_ratio < 0.5:  # 生命值低于50%且
+            if self.behavior_weights['caution'] > 0.7:  # 谨慎性高
+                return True
+            # 或者身处玩家威胁中而附近没有同伴
+            influence = getattr(self.game_map, 'influence', None)
+            if influence is not None:
+                center_x = self.entity.x + self.entity.width / 2
+                center_y = self.entity.y + self.entity.height / 2
+                # 所在格的密度包含自己的1，相邻同伴各贡献0.5，隔一格的各贡献0.25
+                companions = influence.sample('density', center_x, center_y) - 1.0
+                return influence.sample('threat', center_x, center_y) > 0.6 and companions < 0.5
+        return False
 
     def set_patrol_points(self, points):
         """设置巡逻点
@@ -841,6 +1342,10 @@ class AI:
         patrol_points = []
         base_x = self.entity.x
         base_y = self.entity.y
+        surfaces = self.game_map.surface_index
+        height = self.entity.height
+        min_headroom = -(-height // self.game_map.tile_size)   # 身体需要的净空(格)
+        start_row = surfaces.stand_row(base_y, height)
         
         # 定义搜索范围
         search_range = [-300, -200, -100, 100, 200, 300]  # 增加搜索范围和密度
@@ -848,60 +1353,30 @@ class AI:
         
         for offset in search_range:
             x = base_x + offset
-            y = base_y
             
             # 确保点在地图范围内
-            if 0 <= x < self.game_map.level_width:
-                # 向下寻找可站立的地面
-                found_ground = False
-                test_y = y
-                while test_y < self.game_map.level_height - self.entity.height:
-                    # 检查脚下是否是地面
-                    foot_pos = test_y + self.entity.height + 1
-                    if self.game_map.is_solid(x, foot_pos):
-                        # 检查头顶是否有空间
-                        head_space = True
-                        for check_y in range(int(test_y), int(test_y + self.entity.height)):
-                            if self.game_map.is_solid(x, check_y):
-                                head_space = False
-                                break
-                        
-                        if head_space:
-                            patrol_points.append((x, test_y))
-                            found_ground = True
-                            break
-                    
-                    test_y += self.game_map.tile_size/2
-                
-                if not found_ground:
-                    # 如果向下没找到，尝试向找
-                    test_y = y
-                    while test_y > 0:
-                        foot_pos = test_y + self.entity.height + 1
-                        if self.game_map.is_solid(x, foot_pos):
-                            # 检查头顶否有空间
-                            head_space = True
-                            for check_y in range(int(test_y), int(test_y + self.entity.height)):
-                                if self.game_map.is_solid(x, check_y):
-                                    head_space = False
-                                    break
-                            
-                            if head_space:
-                                patrol_points.append((x, test_y))
-                                break
-                        
-                        test_y -= self.game_map.tile_size/2
+            if 0 <= x < self.game_map.world_width:
+                col = int(x // self.game_map.tile_size)
+                # 优先向下寻找可站立的地面，没有时向上找
+                row = surfaces.find_surface(col, start_row, min_headroom)
+                if row is None:
+                    row = surfaces.find_surface(col, start_row, min_headroom, downward=False)
+                if row is not None:
+                    patrol_points.append((x, surfaces.stand_y(row, height)))
         
         # 如果没有找到任何有效的巡逻点，至少保留当前位置
         if not patrol_points:
             patrol_points.append((base_x, base_y))
         
-        # 检查巡逻点之间是否有可通行的路径
+        # 只保留和第一个点在同一段可行走区段上的点，巡逻时沿地面直接走过去
+        def span_of(point):
+            col = int(point[0] // self.game_map.tile_size)
+            return surfaces.span_at(col, surfaces.stand_row(point[1], height), min_headroom)
+            
+        first_span = span_of(patrol_points[0])
         valid_points = [patrol_points[0]]  # 从第一个点开始
         for point in patrol_points[1:]:
-            # 使用A*检查是否可以到达该点
-            path = self.path_finding.find_path(valid_points[-1], point)
-            if path:  # 如果找到路径，则该点有效
+            if first_span is not None and span_of(point) == first_span:
                 valid_points.append(point)
         
         return valid_points
@@ -918,11 +1393,7 @@ class AI:
             return False
         
         # 检查身体位置是否有障碍物
-        for check_y in range(int(y), int(y + self.entity.height)):
-            if self.game_map.is_solid(x, check_y):
-                return False
-            
-        return True
+        return not self.game_map.is_rect_solid(x, int(y), 1, int(y + self.entity.height) - int(y))
 
     def _update_search(self, dt, perception_info):
         """更新搜索状态"""
@@ -968,32 +1439,73 @@ class AI:
         if self._should_jump(target_point):
             self._try_jump()
 
-    def _has_line_of_sight(self, start, end):
-        """检查两点间是否有视线"""
-        dx = end[0] - start[0]
-        dy = end[1] - start[1]
-        distance = math.sqrt(dx * dx + dy * dy)
-        
-        if distance == 0:
-            return True
-            
-        steps = int(distance / 10)  # 每10像素检查一次
-        if steps == 0:
-            steps = 1
-            
-        dx /= steps
-        dy /= steps
-        
-        for i in range(steps):
-            check_x = start[0] + dx * i
-            check_y = start[1] + dy * i
+    def _request_path(self, target_pos):
+        """请求到目标位置的路径
+        有寻路服务时异步执行，结果到达前保留当前路径。
+        Args:
+            target_pos: 目标位置
+        Returns:
+            bool: 是否得到了新路径
+        """
+        start = (self.entity.x, self.entity.y)
+        if self.path_service is None:
+            self.path = self.path_finding.find_path(start, target_pos)
+        else:
+            path = self.path_service.poll(self, start)
+            if path is None:
+                self.path_service.request(self, start, target_pos)
+                return False
+            self.path = path
+        self.path_progress = 0
+        return True
+
+    def _steer_towards(self, target_pos, speed):
+        """没有可用路径时直接朝目标水平移动"""
+        dx = target_pos[0] - self.entity.x
+        self.target_vx = math.copysign(speed, dx) if abs(dx) > 10 else 0
+
+    def _follow_flow_field(self, target_pos, speed):
+        """沿共享流场向目标移动一步
+        Args:
+            target_pos: 目标位置
+            speed: 移动速度
+        Returns:
+            bool: 流场是否可用(不可用时由调用者自行寻路)
+        """
+        get_flow_field = getattr(self.path_finding, 'get_flow_field', None)
+        if get_flow_field is None:
+            return False
             
-            # 检点是否在固体方块
-            if self.game_map.is_solid(check_x, check_y):
+        # 在空中时保持起跳时选定的路径点
+        if not self.entity.on_ground and self.path and self.path_progress < len(self.path):
+            waypoint = self.path[self.path_progress]
+        else:
+            field = get_flow_field(target_pos)
+            if field is None:
                 return False
-                
+            node = self.path_finding._nearest_node(self.entity.x, self.entity.y)
+            if node is None or not field.reaches(node):
+                return False
+            step = field.next_step(node)
+            if step is None:
+                # 已经到达目标所在节点
+                self.target_vx = 0
+                self.path = []
+                return True
+            waypoint = self.path_finding.get_waypoint(*step)
+            self.path = [(self.entity.x, self.entity.y), waypoint]
+            self.path_progress = 1
+            
+        dx = waypoint[0] - self.entity.x
+        self.target_vx = math.copysign(speed, dx) if abs(dx) > 10 else 0
+        if self._should_jump(waypoint):
+            self._try_jump()
         return True
 
+    def _has_line_of_sight(self, start, end):
+        """检查两点间是否有视线(线段经过的砖块都不是实心)"""
+        return self.game_map.raycast(start[0], start[1], end[0], end[1]) is None
+
     def _get_player(self):
         """获取玩家引用"""
         if hasattr(self.game_map, 'game') and hasattr(self.game_map.game, 'player'):
@@ -1044,7 +1556,17 @@ class AI:
 
     def _update_retreat(self, dt, perception_info):
         """更新撤退状态"""
-        if perception_info['can_see_player']:
+        # 沿影响图中威胁下降的方向撤退
+        influence = getattr(self.game_map, 'influence', None)
+        direction = 0
+        if influence is not None:
+            direction = influence.retreat_direction(self.entity.x + self.entity.width / 2,
+                                                    self.entity.y + self.entity.height / 2)
+        if direction:
+            self.target_vx = direction * self.move_speed * 1.2
+            if self._check_obstacle_ahead():
+                self._try_jump()
+        elif perception_info['can_see_player']:
             # 远离玩家
             dx = perception_info['player_pos'][0] - self.entity.x
             self.target_vx = -math.copysign(self.move_speed * 1.2, dx)
@@ -1065,22 +1587,67 @@ class AI:
             self.state = AIState.PATROL
             return
             
-        # 更新路径到最后已知位置
-        if not self.path or self.path_progress >= len(self.path):
-            self.path = self.path_finding.find_path(
-                (self.entity.x, self.entity.y),
-                self.last_known_target_pos
-            )
-            self.path_progress = 0
+        # 在最后已知位置附近按玩家的出没痕迹依次搜索，没有痕迹时直接前往最后已知位置
+        target_pos = self._get_search_spot() or self.last_known_target_pos
             
-        # 按路径移动
-        self._follow_path()
+        # 优先沿共享流场前往搜索地点，流场不可用时自己寻路
+        if not self._follow_flow_field(target_pos, self.move_speed):
+            # 更新路径到搜索地点，结果到达前直接朝目标移动
+            if not self.path or self.path_progress >= len(self.path):
+                if not self._request_path(target_pos):
+                    self._steer_towards(target_pos, self.move_speed)
+                
+            # 按路径移动
+            self._follow_path()
         
         # 搜索超时，返回巡逻
         if self.search_timer > 5.0:
             self.last_known_target_pos = None
+            self.search_spot = None
             self.state = AIState.PATROL
 
+    def _get_flank_position(self, target_center, crowd_density=1.0):
+        """玩家附近敌人密集时选择包抄位置
+        Args:
+            target_center: 目标(玩家)身体中心的世界坐标
+            crowd_density: 玩家所在格的敌人密度达到该值时才包抄(默认相当于两个相邻的敌人)
+        Returns:
+            tuple: 包抄位置(实体左上角坐标)，不需要包抄时为None
+        """
+        influence = getattr(self.game_map, 'influence', None)
+        if influence is None or influence.sample('density', *target_center) < crowd_density:
+            return None
+        entity = self.entity
+        cell = influence.find_flank_spot(target_center[0], target_center[1],
+                                         entity.x + entity.width / 2, entity.y + entity.height / 2)
+        if cell is None:
+            return None
+        return influence.cell_position(cell, entity.width, entity.height)
+
+    def _get_search_spot(self):
+        """获取当前搜索地点，到达后清除该处的痕迹并选择下一个
+        Returns:
+            tuple: 搜索地点(实体左上角坐标)，影响图不可用或附近没有痕迹时为None
+        """
+        influence = getattr(self.game_map, 'influence', None)
+        if influence is None:
+            return None
+        entity = self.entity
+        if self.search_spot is not None:
+            if (abs(self.search_spot[0] - entity.x) < influence.tile_size / 2 and
+                    abs(self.search_spot[1] - entity.y) < influence.tile_size):
+                # 已搜索过，清除痕迹以免自己或同伴再来
+                influence.clear_area('presence', entity.x + entity.width / 2,
+                                     entity.y + entity.height - 1)
+                self.search_spot = None
+            else:
+                return self.search_spot
+        target_x, target_y = self.last_known_target_pos
+        cell = influence.find_search_spot(target_x, target_y)
+        if cell is not None:
+            self.search_spot = influence.cell_position(cell, entity.width, entity.height)
+        return self.search_spot
+
     def _update_alert(self, dt, perception_info):
         """更新警戒状态"""
         current_time = time.time()
@@ -1111,6 +1678,10 @@ class AI:
                     
                 # 快速增加警戒等级
                 self.alert_level = min(100, self.alert_level + 30 * dt)
+        elif perception_info['heard_player']:
+            # 听到玩家的声音，慢慢走向声源
+            dx = perception_info['heard_noise'][0] - self.entity.x
+            self.target_vx = math.copysign(self.move_speed * 0.3, dx) if abs(dx) > 10 else 0
         else:
             # 快速降低警戒等级
             self.alert_level = max(0, self.alert_level - 35 * dt)
@@ -1130,29 +1701,26 @@ class AI:
 
     def _update_movement(self, dt):
         """平滑移动更新"""
-        # 更新跳跃冷却
-        if hasattr(self, 'jump_cooldown'):
-            self.jump_cooldown = max(0, self.jump_cooldown - dt)
-        
         # 添加转向延迟
-        if not hasattr(self, 'direction_change_timer'):
-            self.direction_change_timer = 0
+        if not hasattr(self, 'last_direction'):
             self.last_direction = 1 if self.target_vx >= 0 else -1
         
         current_direction = 1 if self.target_vx >= 0 else -1
         
         # 检查是否需要改变方向
         if current_direction != self.last_direction:
-            self.direction_change_timer += dt
-            # 只有当方向改变计时器超过阈值时才真正改变方向
-            if self.direction_change_timer >= 0.3:  # 300ms的转向延迟
+            now = self.timers.now
+            if self.direction_change_start is None:
+                self.direction_change_start = now - dt
+            # 只有当转向持续超过阈值时才真正改变方向
+            if now - self.direction_change_start >= 0.3:  # 300ms的转向延迟
                 self.last_direction = current_direction
-                self.direction_change_timer = 0
+                self.direction_change_start = None
             else:
                 # 在转向延迟期间保持原来的方向
                 self.target_vx = self.move_speed * self.last_direction
         else:
-            self.direction_change_timer = 0
+            self.direction_change_start = None
         
         # 计算加速度，添加缓冲区
         if abs(self.entity.vx) < abs(self.target_vx) - 10:  # 添加速度缓冲区
@@ -1171,7 +1739,7 @@ class AI:
         if self._check_wall_collision():
             self.entity.vx = 0
             self.target_vx = 0
-            self.direction_change_timer = 0  # 重置方向改变计时器
+            self.direction_change_start = None  # 重置转向计时
 
     def _check_wall_collision(self):
         """检查是否撞墙"""
@@ -1180,7 +1748,8 @@ class AI:
         check_points = [
             (self.entity.x + direction * self.entity.width, self.entity.y),
             (self.entity.x + direction * self.entity.width, self.entity.y + self.entity.height/2),
-            (self.entity.x + direction * self.entity.width, self.entity.y + self.entity.height)
+            # 脚底向上一个像素，避免把脚下的地面当成墙
+            (self.entity.x + direction * self.entity.width, self.entity.y + self.entity.height - 1)
         ]
         
         return any(self.game_map.is_solid(x, y) for x, y in check_points)
@@ -1214,10 +1783,9 @@ class AI:
             return False
         
         # 检查头顶空间
-        head_space = not any(self.game_map.is_solid(
-            self.entity.x + x,
-            self.entity.y - self.min_jump_height
-        ) for x in [0, self.entity.width])
+        head_space = not self.game_map.is_rect_solid(
+            self.entity.x, self.entity.y - self.min_jump_height, self.entity.width + 1, 1
+        )
         
         if not head_space:
             return False
@@ -1230,6 +1798,11 @@ class AI:
 
     def _should_jump(self, target_point):
         """判断是否需要跳跃到目标点"""
+        # 导航图路径点已经标明移动方式，只在跳跃边上起跳
+        kind = getattr(target_point, 'kind', None)
+        if kind is not None:
+            return kind == 'jump' and self.entity.on_ground and self.jump_cooldown <= 0
+        
         if not self.entity.on_ground or (hasattr(self, 'jump_cooldown') and self.jump_cooldown > 0):
             return False
         
@@ -1240,10 +1813,9 @@ class AI:
         dy = target_point[1] - (self.entity.y + self.entity.height)
         
         # 检查头顶空间
-        head_space = not any(self.game_map.is_solid(
-            self.entity.x + x, 
-            self.entity.y - self.min_jump_height
-        ) for x in [0, self.entity.width])
+        head_space = not self.game_map.is_rect_solid(
+            self.entity.x, self.entity.y - self.min_jump_height, self.entity.width + 1, 1
+        )
         
         # 如果目标点在上方且有足够间，或者前有障碍物且有足够空间
         if head_space and (dy < -self.min_jump_height or has_obstacle):
@@ -1275,6 +1847,7 @@ class AI:
         elif new_state == AIState.SEARCH:
             # 进入搜索状态，初始化搜索参数
             self.search_timer = 0
+            self.search_spot = None
             if not self.last_known_target_pos:
                 self.last_known_target_pos = None
                 
@@ -1298,148 +1871,90 @@ class AI:
         elif new_state == AIState.SEARCH:
             self._try_taunt('search')
 
-    def render(self, screen, camera_offset=(0, 0)):
-        """渲染AI相的视觉效果"""
-        # 渲染路径
+    def render(self, overlay, camera_offset=(0, 0)):
+        """渲染AI相关的视觉效果到共享覆盖层
+        Args:
+            overlay: AIOverlay共享覆盖层
+            camera_offset: (camera_x, camera_y) 相机偏移
+        """
+        surface = overlay.surface
+        center = (
+            int(self.entity.x - camera_offset[0] + self.entity.width/2),
+            int(self.entity.y - camera_offset[1] + self.entity.height/2)
+        )
+        
+        # 渲染路径(半透明图形经由AIOverlay混合绘制)
         if self.path and len(self.path) > 1:
-            # 创建路径表面
-            path_surface = pygame.Surface(
-                (screen.get_width(), screen.get_height()),
-                pygame.SRCALPHA
-            )
+            points = [(int(x - camera_offset[0]), int(y - camera_offset[1]))
+                      for x, y in self.path]
             
             # 绘制路径线
-            for i in range(len(self.path) - 1):
-                pygame.draw.line(
-                    path_surface,
-                    (0, 255, 0, 40),  # 半透明绿色
-                    (int(self.path[i][0] - camera_offset[0]),
-                     int(self.path[i][1] - camera_offset[1])),
-                    (int(self.path[i+1][0] - camera_offset[0]),
-                     int(self.path[i+1][1] - camera_offset[1])),
-                    2  # 线宽
-                )
-                
-                # 在路径点绘制小圆点
-                pygame.draw.circle(
-                    path_surface,
+            overlay.draw_lines(
+                (0, 255, 0, 40),  # 半透明绿色
+                False,
+                points,
+                2  # 线宽
+            )
+            
+            # 在路径点绘制小圆点
+            for point in points[:-1]:
+                overlay.draw_circle(
                     (0, 255, 0, 60),  # 稍微不透明的绿色
-                    (int(self.path[i][0] - camera_offset[0]),
-                     int(self.path[i][1] - camera_offset[1])),
+                    point,
                     3  # 圆点半径
                 )
             
             # 绘制当前目标点（大一点的圆点）
-            if self.path_progress < len(self.path):
-                target_point = self.path[self.path_progress]
-                pygame.draw.circle(
-                    path_surface,
+            if self.path_progress < len(points):
+                overlay.draw_circle(
                     (255, 255, 0, 80),  # 半透明黄色
-                    (int(target_point[0] - camera_offset[0]),
-                     int(target_point[1] - camera_offset[1])),
+                    points[self.path_progress],
                     5  # 目标点半径
                 )
-            
-            # 将路径表面绘制到屏幕上
-            screen.blit(path_surface, (0, 0))
         
         # 渲染感知范围（仅在警戒或搜索状态下）
+        # 范围有几百像素，只画轮廓：半透明的大面积填充每个敌人都要混合接近整个屏幕
         if self.state in [AIState.ALERT, AIState.SEARCH, AIState.CHASE]:
-            # 创建一个大的透明表面用于渲染感知范围
-            vision_surface = pygame.Surface(
-                (self.detection_range * 3, self.detection_range * 3), 
-                pygame.SRCALPHA
-            )
-            
             # 渲染听觉范围（外圈）
-            pygame.draw.circle(
-                vision_surface,
-                (100, 100, 255, 15),  # 更透明的蓝色
-                (vision_surface.get_width()//2, vision_surface.get_height()//2),
-                int(self.detection_range * 1.5)
+            overlay.draw_circle(
+                (100, 100, 255, 40),  # 透明的蓝色
+                center,
+                self.detection_range * 1.5,
+                1
             )
             
             # 渲染视觉范围（内圈）
-            pygame.draw.circle(
-                vision_surface,
-                (255, 255, 100, 10),  # 更透明的黄色
-                (vision_surface.get_width()//2, vision_surface.get_height()//2),
-                self.detection_range
+            overlay.draw_circle(
+                (255, 255, 100, 40),  # 透明的黄色
+                center,
+                self.detection_range,
+                1
             )
             
             # 如果在战斗状态，添加红色警戒光环
             if self.in_combat:
-                pygame.draw.circle(
-                    vision_surface,
-                    (255, 0, 0, 8),  # 非常透明的红色
-                    (vision_surface.get_width()//2, vision_surface.get_height()//2),
-                    int(self.detection_range * 1.2),
+                overlay.draw_circle(
+                    (255, 0, 0, 40),  # 透明的红色
+                    center,
+                    self.detection_range * 1.2,
                     2
                 )
-            
-            # 将感知范围绘制到屏幕上
-            screen.blit(
-                vision_surface,
-                (self.entity.x - camera_offset[0] + self.entity.width/2 - vision_surface.get_width()//2,
-                 self.entity.y - camera_offset[1] + self.entity.height/2 - vision_surface.get_height()//2)
-            )
         
         # 渲染叫骂文本
-        if self.current_taunt and self.taunt_timer > 0:
-            # 计算透明度
-            alpha = int(255 * (self.taunt_timer / self.taunt_duration))
-            
-            # 计算浮动效果
-            self.taunt_offset_y = math.sin(pygame.time.get_ticks() * 0.005) * 5
-            
-            try:
-                # 创建文本表面
-                text_surface = self.font.render(self.current_taunt, True, (255, 255, 255))
-                text_rect = text_surface.get_rect()
-                
-                # 创建带透明度的背景
-                padding = 10
-                background_surface = pygame.Surface(
-                    (text_rect.width + padding * 2, text_rect.height + padding * 2),
-                    pygame.SRCALPHA
-                )
-                
-                # 根据AI状态选择背景颜色
-                if self.state == AIState.ALERT:
-                    bg_color = (200, 150, 0, int(alpha * 0.7))  # 警戒状态：橙色
-                elif self.state == AIState.CHASE:
-                    bg_color = (200, 50, 50, int(alpha * 0.7))  # 击态：红色
-                elif self.state == AIState.ATTACK:
-                    bg_color = (200, 0, 0, int(alpha * 0.7))    # 攻击状态：深红色
-                else:
-                    bg_color = (0, 0, 0, int(alpha * 0.7))      # 其他状态：黑色
-                
-                # 绘制圆��矩形背景
-                pygame.draw.rect(
-                    background_surface,
-                    bg_color,
-                    (0, 0, text_rect.width + padding * 2, text_rect.height + padding * 2),
-                    border_radius=10
-                )
-                
-                # 计算显示位置
-                text_x = self.entity.x - camera_offset[0] - text_rect.width / 2 + self.entity.width / 2
-                text_y = self.entity.y - camera_offset[1] - 60 + self.taunt_offset_y
-                
-                # 绘制背景和文本
-                screen.blit(background_surface, (text_x - padding, text_y - padding))
-                text_surface.set_alpha(alpha)
-                screen.blit(text_surface, (text_x, text_y))
-                
-            except Exception as e:
-                print(f"渲染文本错误: {e}")
+        self._render_taunt(overlay, camera_offset)
         
-        # 渲染锁定指示器
+        # 渲染锁定指示器，显示在AI头顶
         if self.target_locked:
-            # 创建锁定标记表面
+            overlay.mark(surface.blit(
+                self._get_lock_surface(),
+                (center[0] - 15, int(self.entity.y - camera_offset[1] - 40))
+            ))
+
+    @classmethod
+    def _get_lock_surface(cls):
+        """获取共享的锁定标记表面"""
+        if cls._lock_surface is None:
             lock_surface = pygame.Surface((30, 30), pygame.SRCALPHA)
-            
-            # 绘制锁定标记
             pygame.draw.circle(
                 lock_surface,
                 (255, 0, 0, 100),  # 半透明红色
@@ -1453,27 +1968,77 @@ class AI:
                 12,
                 2
             )
+            cls._lock_surface = lock_surface
+        return cls._lock_surface
+
+    def _render_taunt(self, overlay, camera_offset):
+        """渲染叫骂气泡"""
+        if not self.current_taunt or self.taunt_timer <= 0:
+            return
             
-            # 显示在AI头顶
-            screen.blit(
-                lock_surface,
-                (self.entity.x - camera_offset[0] + self.entity.width/2 - 15,
-                 self.entity.y - camera_offset[1] - 40)
+        # 计算透明度
+        alpha = int(255 * (self.taunt_timer / self.taunt_duration))
+        
+        # 计算浮动效果
+        self.taunt_offset_y = math.sin(pygame.time.get_ticks() * 0.005) * 5
+        
+        try:
+            # 文本表面只在叫骂内容变化时重新生成
+            if self._taunt_text != self.current_taunt:
+                self._taunt_surface = self.font.render(self.current_taunt, True, (255, 255, 255))
+                self._taunt_text = self.current_taunt
+            text_surface = self._taunt_surface
+            text_rect = text_surface.get_rect()
+            
+            # 根据AI状态选择背景颜色
+            # 背景按颜色和大小缓存，淡出时只改变整体透明度
+            if self.state == AIState.ALERT:
+                bg_color = (200, 150, 0, 178)  # 警戒状态：橙色
+            elif self.state == AIState.CHASE:
+                bg_color = (200, 50, 50, 178)  # 追击状态：红色
+            elif self.state == AIState.ATTACK:
+                bg_color = (200, 0, 0, 178)    # 攻击状态：深红色
+            else:
+                bg_color = (0, 0, 0, 178)      # 其他状态：黑色
+            
+            # 计算显示位置
+            padding = 10
+            text_x = self.entity.x - camera_offset[0] - text_rect.width / 2 + self.entity.width / 2
+            text_y = self.entity.y - camera_offset[1] - 60 + self.taunt_offset_y
+            
+            # 混合绘制圆角矩形背景
+            overlay.draw_rect(
+                bg_color,
+                (int(text_x - padding), int(text_y - padding),
+                 text_rect.width + padding * 2, text_rect.height + padding * 2),
+                border_radius=10,
+                alpha=alpha
             )
+            
+            # 绘制文本
+            text_surface.set_alpha(alpha)
+            overlay.mark(overlay.surface.blit(text_surface, (text_x, text_y)))
+            
+        except Exception as e:
+            print(f"渲染文本错误: {e}")
 
-    def render_debug(self, screen, camera_offset=(0, 0)):
-        """渲染调试信息"""
+    def render_debug(self, overlay, camera_offset=(0, 0)):
+        """渲染调试信息到共享覆盖层"""
         if not hasattr(self.game_map, 'game') or not self.game_map.game.debug:
             return
         
+        surface = overlay.surface
+        center = (
+            int(self.entity.x - camera_offset[0] + self.entity.width/2),
+            int(self.entity.y - camera_offset[1] + self.entity.height/2)
+        )
+        
         # 渲染听觉范围（最大感知范围）
         alert_range = self.detection_range * 1.5
-        pygame.draw.circle(
-            screen,
+        overlay.draw_circle(
             (100, 100, 255, 40),  # 更透明的蓝色
-            (int(self.entity.x - camera_offset[0] + self.entity.width/2),
-             int(self.entity.y - camera_offset[1] + self.entity.height/2)),
-            int(alert_range),
+            center,
+            alert_range,
             1
         )
         
@@ -1481,14 +2046,12 @@ class AI:
         vision_points = self._get_vision_cone_points(camera_offset)
         if vision_points:
             # 绘制视觉锥形
-            pygame.draw.polygon(
-                screen,
+            overlay.draw_polygon(
                 (255, 255, 0, 25),  # 更透明的黄色
                 vision_points
             )
             # 绘制视觉锥形边界
-            pygame.draw.lines(
-                screen,
+            overlay.draw_lines(
                 (255, 255, 0, 40),  # 更透明的黄色边界
                 True,  # 闭合多边形
                 vision_points,
@@ -1497,111 +2060,54 @@ class AI:
         
         # 渲染攻击范围
         attack_color = (255, 0, 0, 30) if self.attack_type == 'melee' else (255, 100, 100, 30)
-        pygame.draw.circle(
-            screen,
+        overlay.draw_circle(
             attack_color,
-            (int(self.entity.x - camera_offset[0] + self.entity.width/2),
-             int(self.entity.y - camera_offset[1] + self.entity.height/2)),
-            int(self.attack_range),
+            center,
+            self.attack_range,
             1
         )
         
         # 渲染路径
-        if self.path:
-            for i in range(len(self.path) - 1):
-                pygame.draw.line(
-                    screen,
-                    (0, 255, 0, 40),  # 更透明的绿色
-                    (int(self.path[i][0] - camera_offset[0]),
-                     int(self.path[i][1] - camera_offset[1])),
-                    (int(self.path[i+1][0] - camera_offset[0]),
-                     int(self.path[i+1][1] - camera_offset[1])),
-                    1
-                )
+        if self.path and len(self.path) > 1:
+            overlay.draw_lines(
+                (0, 255, 0, 40),  # 更透明的绿色
+                False,
+                [(int(x - camera_offset[0]), int(y - camera_offset[1])) for x, y in self.path],
+                1
+            )
                 
-        # 渲染状态文本
-        font = pygame.font.Font(None, 24)
-        state_text = font.render(
-            f"State: {self.state.value}",
-            True,
-            (255, 255, 255)
-        )
-        screen.blit(
+        # 渲染状态文本(按状态缓存)
+        state_text = AI._state_text_cache.get(self.state)
+        if state_text is None:
+            font = self.game_map.game.view.get_font(24)
+            state_text = font.render(f"State: {self.state.value}", True, (255, 255, 255))
+            AI._state_text_cache[self.state] = state_text
+        overlay.mark(surface.blit(
             state_text,
             (self.entity.x - camera_offset[0] - 30,
              self.entity.y - camera_offset[1] - 40)
-        )
+        ))
         
         # 渲染生命值条
         health_ratio = getattr(self.entity, 'health', 100) / 100
         health_width = 40
         health_height = 4
-        pygame.draw.rect(
-            screen,
+        overlay.mark(pygame.draw.rect(
+            surface,
             (255, 0, 0),
             (self.entity.x - camera_offset[0],
              self.entity.y - camera_offset[1] - 10,
              health_width,
              health_height)
-        )
+        ))
         pygame.draw.rect(
-            screen,
+            surface,
             (0, 255, 0),
             (self.entity.x - camera_offset[0],
              self.entity.y - camera_offset[1] - 10,
              health_width * health_ratio,
              health_height)
         )
-        
-        # 渲染叫骂文本
-        if self.current_taunt and self.taunt_timer > 0:
-            # 计算透明度
-            alpha = int(255 * (self.taunt_timer / self.taunt_duration))
-            
-            # 计算浮动效果
-            self.taunt_offset_y = math.sin(pygame.time.get_ticks() * 0.005) * 5
-            
-            try:
-                # 创建文本表面
-                text_surface = self.font.render(self.current_taunt, True, (255, 255, 255))
-                text_rect = text_surface.get_rect()
-                
-                # 创建带透明度的背景
-                padding = 10
-                background_surface = pygame.Surface(
-                    (text_rect.width + padding * 2, text_rect.height + padding * 2),
-                    pygame.SRCALPHA
-                )
-                
-                # 根据AI状态选择背景颜色
-                if self.state == AIState.ALERT:
-                    bg_color = (200, 150, 0, int(alpha * 0.7))  # 警戒状态：橙色
-                elif self.state == AIState.CHASE:
-                    bg_color = (200, 50, 50, int(alpha * 0.7))  # 追击状态：红色
-                elif self.state == AIState.ATTACK:
-                    bg_color = (200, 0, 0, int(alpha * 0.7))    # 攻击状态：深红色
-                else:
-                    bg_color = (0, 0, 0, int(alpha * 0.7))      # 其他状态：黑色
-                
-                # 绘制圆角矩形背景
-                pygame.draw.rect(
-                    background_surface,
-                    bg_color,
-                    (0, 0, text_rect.width + padding * 2, text_rect.height + padding * 2),
-                    border_radius=10
-                )
-                
-                # 计算显示位置
-                text_x = self.entity.x - camera_offset[0] - text_rect.width / 2 + self.entity.width / 2
-                text_y = self.entity.y - camera_offset[1] - 60 + self.taunt_offset_y
-                
-                # 绘制背景和文本
-                screen.blit(background_surface, (text_x - padding, text_y - padding))
-                text_surface.set_alpha(alpha)
-                screen.blit(text_surface, (text_x, text_y))
-                
-            except Exception as e:
-                print(f"渲染文本错误: {e}")
 
     def _update_chase(self, dt, perception_info):
         """更新追击状态"""
@@ -1637,6 +2143,15 @@ class AI:
                 # 接近时减速
                 speed_factor = 0.7
                 
+            # 玩家附近已聚集同伴时，转向敌人较少的一侧包抄
+            player = self._get_player()
+            if dist > self.attack_range * 2 and player is not None:
+                # 目标位置是玩家左上角，影响图按身体中心查询
+                flank_pos = self._get_flank_position(
+                    (target_pos[0] + player.width / 2, target_pos[1] + player.height / 2))
+                if flank_pos is not None:
+                    dx = flank_pos[0] - self.entity.x
+                    
             # 设置移动方向和速度
             self.target_vx = math.copysign(self.move_speed * speed_factor, dx)
             
@@ -1663,15 +2178,21 @@ class AI:
         else:
             # 非锁定状态: 更谨慎的追击
             # 使用上一次看到玩家的位置
+            # 优先沿共享流场追击，到达最后已知位置后切换到搜索状态
+            if self.last_known_target_pos and self._follow_flow_field(
+                    self.last_known_target_pos, self.move_speed * 0.8):
+                if not self.path:
+                    self.state = AIState.SEARCH
+                return
             if self.last_known_target_pos:
                 # 更新路径到最后已知位置
                 if not self.path or self.path_update_timer <= 0:
-                    self.path = self.path_finding.find_path(
-                        (self.entity.x, self.entity.y),
-                        self.last_known_target_pos
-                    )
-                    self.path_update_timer = self.path_update_interval
-                    self.path_progress = 0
+                    if self._request_path(self.last_known_target_pos):
+                        self.path_update_timer = self.path_update_interval
+                    elif not self.path:
+                        # 第一条路径到达前直接朝目标移动
+                        self._steer_towards(self.last_known_target_pos, self.move_speed * 0.8)
+                        return
                 else:
                     self.path_update_timer -= dt
                     
@@ -1824,37 +2345,42 @@ class AI:
         Returns:
             list: 视觉锥形的顶点列表
         """
-        # 计算视觉锥形的起点（实体中心）
-        center_x = self.entity.x + self.entity.width/2 - camera_offset[0]
-        center_y = self.entity.y + self.entity.height/2 - camera_offset[1]
-        
-        # 根据实体朝向确定基准角度
-        base_angle = 0 if self.entity.vx >= 0 else math.pi
-        
-        # 计算视觉锥形的两个边界角度
-        half_angle = self.vision_angle / 2
-        angle1 = base_angle - half_angle
-        angle2 = base_angle + half_angle
-        
-        # 计算视觉锥形的顶点
-        points = [(center_x, center_y)]  # 起点（实体中心）
-        
-        # 添加锥形边缘的点
-        num_points = 8  # 边缘的点数，增加可以使锥形更平滑
-        for i in range(num_points + 1):
-            angle = angle1 + (angle2 - angle1) * i / num_points
-            x = center_x + math.cos(angle) * self.vision_distance
-            y = center_y + math.sin(angle) * self.vision_distance
-            points.append((x, y))
-        
-        return points
+        # 计算视觉锥形的起点（实体中心，取整后同一朝向的锥形只差平移，可以复用缓存的图形）
+        center_x = int(self.entity.x + self.entity.width/2 - camera_offset[0])
+        center_y = int(self.entity.y + self.entity.height/2 - camera_offset[1])
+        
+        # 顶点相对中心的偏移只取决于朝向，按朝向缓存
+        facing_right = self.entity.vx >= 0
+        cache_key = (facing_right, self.vision_angle, self.vision_distance)
+        offsets = AI._vision_cone_cache.get(cache_key)
+        if offsets is None:
+            # 根据实体朝向确定基准角度
+            base_angle = 0 if facing_right else math.pi
+            
+            # 计算视觉锥形的两个边界角度
+            half_angle = self.vision_angle / 2
+            angle1 = base_angle - half_angle
+            angle2 = base_angle + half_angle
+            
+            offsets = [(0, 0)]  # 起点（实体中心）
+            
+            # 添加锥形边缘的点
+            num_points = 8  # 边缘的点数，增加可以使锥形更平滑
+            for i in range(num_points + 1):
+                angle = angle1 + (angle2 - angle1) * i / num_points
+                offsets.append((math.cos(angle) * self.vision_distance,
+                                math.sin(angle) * self.vision_distance))
+            AI._vision_cone_cache[cache_key] = offsets
+        
+        return [(center_x + dx, center_y + dy) for dx, dy in offsets]
 
     def _update_combat_state(self, dt, perception_info):
         """更新战斗状态"""
         current_time = time.time()
         
         # 检查是否应该进入战斗状态
-        if perception_info['can_see_player'] or perception_info['can_sense_player']:
+        if (perception_info['can_see_player'] or perception_info['can_sense_player'] or
+                (self.in_combat and perception_info['heard_player'])):
             if not self.in_combat:
                 # 进入战斗状态
                 self.in_combat = True
@@ -1906,28 +2432,7 @@ class AI:
 
     def _evaluate_behavior_tree(self, perception_info):
         """评估行为树"""
-        class BehaviorNode:
-            def evaluate(self, ai, info):
-                return False
-        
-        class HealthCheck(BehaviorNode):
-            def evaluate(self, ai, info):
-                health_ratio = getattr(ai.entity, 'health', 100) / 100
-                return health_ratio < ai.thresholds['health_retreat']
-        
-        class RangeCheck(BehaviorNode):
-            def evaluate(self, ai, info):
-                return info['distance'] <= ai.attack_range
-        
-        # 定义行为节点
-        behavior_tree = [
-            (HealthCheck(), AIState.RETREAT),
-            (RangeCheck(), AIState.ATTACK),
-            (lambda: True, AIState.CHASE)  # 默认行为
-        ]
-        
-        # 评估行为树
-        for node, state in behavior_tree:
+        for node, state in BEHAVIOR_TREE:
             if node.evaluate(self, perception_info):
                 return state
                 
@@ -1942,15 +2447,18 @@ class AI:
         current = 0
         
         while current < len(path) - 1:
-            # 尝试找到可以直接到达的最远点
-            for i in range(len(path) - 1, current, -1):
-                if self._has_line_of_sight(path[current], path[i]):
-                    smoothed.append(path[i])
-                    current = i
-                    break
+            # 一次批量检查当前点到后面所有点的视线，取可以直接到达的最远点
+            targets = path[current + 1:]
+            blocked = self.game_map.raycast_batch(
+                [path[current][0]] * len(targets), [path[current][1]] * len(targets),
+                [point[0] for point in targets], [point[1] for point in targets]
+            )[0]
+            visible = np.flatnonzero(~blocked)
+            if len(visible):
+                current += int(visible[-1]) + 1
             else:
                 current += 1
-                smoothed.append(path[current])
+            smoothed.append(path[current])
         
         return smoothed
 
@@ -1966,3 +2474,204 @@ class AI:
                 self.entity.facing_right = dx > 0
                 return True
         return False
+
+    def simulate_coarse(self, dt):
+        """粗略模拟(不做感知、视线和寻路)
+        结果只取决于当前状态和dt，同样的输入总是得到同样的结果，
+        既用于外围的低频更新，也用于实体被唤醒时的追赶。
+        状态切换发生在步长中间时，只把切换之后剩下的时间用于巡逻，
+        因此一次大步长和多次小步长的结果相同。
+        Args:
+            dt: 经过的时间(秒)
+        """
+        if dt <= 0:
+            return
+        # 冷却按游戏时钟计时，这里不需要递减
+        self.taunt_timer = 0
+        self.current_taunt = None
+        self.lunge_timer = 0
+        self.is_lunging = False
+        self.target_locked = False
+        self.alert_level = max(0, self.alert_level - 15 * dt)
+        
+        # 脱战(不触发叫骂，保持确定性)；free_time是本步中不在战斗中的时间
+        free_time = dt
+        if self.in_combat:
+            free_time = max(0.0, self.combat_timer + dt - self.combat_timeout)
+            self.combat_timer += dt
+            if self.combat_timer >= self.combat_timeout:
+                self.in_combat = False
+                self.combat_timer = 0
+                self.alert_level = max(0, self.alert_level - 50)
+        
+        # 进入巡逻之前的时间计入原状态，之后的时间用于推进巡逻
+        if self.state == AIState.PATROL:
+            patrol_time = dt
+        elif self.state == AIState.IDLE:
+            # 空闲等待结束后开始巡逻(与完整更新中的idle_wait一致)
+            patrol_time = min(dt, max(0.0, dt - self.idle_wait))
+            self.idle_wait -= dt
+        elif not self.in_combat:
+            patrol_time = free_time
+        else:
+            patrol_time = 0.0
+            
+        if self.state != AIState.PATROL:
+            if patrol_time > 0:
+                self.state = AIState.PATROL
+                self.state_timer = 0
+                self.current_patrol_index = 0
+                self.path = []
+            else:
+                self.state_timer += dt
+                
+        if self.state == AIState.PATROL:
+            if getattr(self, 'patrol_points', None):
+                self._advance_patrol(patrol_time)
+            else:
+                self.state_timer += patrol_time
+            
+        self.target_vx = 0
+        self.entity.vx = 0
+        self.entity.vy = 0
+
+    def _get_walkable_range(self):
+        """脚下可行走区段内实体左上角x的范围
+        区段在第一个被墙挡住或没有地面的格子处结束。
+        Returns:
+            tuple: (最小x, 最大x)，不站在表面上时为None
+        """
+        surface_index = getattr(self.game_map, 'surface_index', None)
+        if surface_index is None:
+            return None
+        entity = self.entity
+        tile_size = self.game_map.tile_size
+        row = surface_index.stand_row(entity.y, entity.height)
+        headroom = max(1, int(math.ceil(entity.height / tile_size)))
+        # 跨在台阶边缘时以脚下有地面的那一列为准
+        for col in range(int(entity.x // tile_size), int((entity.x + entity.width - 1) // tile_size) + 1):
+            span = surface_index.span_at(col, row, headroom)
+            if span is not None:
+                break
+        else:
+            return None
+        _, first_col, last_col = span
+        return first_col * tile_size, (last_col + 1) * tile_size - entity.width
+
+    def _advance_patrol(self, dt):
+        """按巡逻速度和停留时间解析地推进巡逻进度(与_update_patrol的节奏一致，只做水平移动)
+        移动限制在脚下的可行走区段内，到不了的巡逻点在区段边缘视为到达。
+        """
+        walkable = self._get_walkable_range()
+        if walkable is None:
+            # 不在可站立的表面上(如空中)，原地不动，计时照常推进
+            self.state_timer += dt
+            return
+        min_x, max_x = walkable
+        speed = self.move_speed * 0.6
+        points = self.patrol_points
+        index = self.current_patrol_index % len(points)
+        x = min(max(self.entity.x, min_x), max_x)
+        elapsed = self.state_timer   # 本次推进前在当前巡逻点的计时
+        remaining = dt
+        
+        while remaining > 1e-6:
+            target_x = min(max(points[index][0], min_x), max_x)
+            dx = target_x - x
+            if abs(dx) > 20:
+                # 走到距离巡逻点20像素以内
+                travel = (abs(dx) - 20) / speed
+                if remaining < travel:
+                    x += math.copysign(speed * remaining, dx)
+                    elapsed += remaining
+                    break
+                x = target_x - math.copysign(20, dx)
+                elapsed += travel
+                remaining -= travel
+            else:
+                # 在巡逻点停留
+                wait = max(0, 0.5 - elapsed)
+                if remaining < wait:
+                    elapsed += remaining
+                    break
+                remaining -= wait
+                elapsed = 0
+                index = (index + 1) % len(points)
+                
+        if not self.game_map.is_rect_solid(x, self.entity.y, self.entity.width, self.entity.height):
+            self.entity.x = x
+        self.current_patrol_index = index
+        self.state_timer = elapsed
+
+    def get_lod_state(self):
+        """导出可序列化的AI状态(不引用实体和地图，可用于存档或重建实体)
+        Returns:
+            dict: 可序列化的状态
+        """
+        return {
+            'x': self.entity.x,
+            'y': self.entity.y,
+            'health': getattr(self.entity, 'health', 100),
+            'state': self.state.name,
+            'state_timer': self.state_timer,
+            'patrol_index': getattr(self, 'current_patrol_index', 0),
+            'alert_level': self.alert_level,
+            'in_combat': self.in_combat,
+            'combat_timer': self.combat_timer,
+            # 冷却保存游戏时钟上的到期时刻，恢复前经过的时间照样计入冷却
+            'attack_ready_at': self._attack_ready_at,
+            'jump_ready_at': self._jump_ready_at,
+            'taunt_ready_at': self._taunt_ready_at,
+        }
+
+    def set_lod_state(self, data):
+        """从导出的状态恢复
+        Args:
+            data: get_lod_state导出的状态
+        """
+        self.entity.x = data['x']
+        self.entity.y = data['y']
+        self.entity.vx = 0
+        self.entity.vy = 0
+        if hasattr(self.entity, 'health'):
+            self.entity.health = data['health']
+        self.state = AIState[data['state']]
+        self.state_timer = data['state_timer']
+        self.current_patrol_index = data['patrol_index']
+        self.alert_level = data['alert_level']
+        self.in_combat = data['in_combat']
+        self.combat_timer = data['combat_timer']
+        self._attack_ready_at = data['attack_ready_at']
+        self._jump_ready_at = data['jump_ready_at']
+        self._taunt_ready_at = data['taunt_ready_at']
+
+    def release_transient_state(self):
+        """休眠时释放临时数据(路径、叫骂表面等)"""
+        if self.path_service is not None:
+            self.path_service.cancel(self)
+        self.path = []
+        self.path_progress = 0
+        self.target_vx = 0
+        self.search_spot = None
+        self.current_taunt = None
+        self.taunt_timer = 0
+        self._taunt_text = None
+        self._taunt_surface = None
+
+
+# 原型中的只读配置以属性的形式暴露给AI，读取方式与原来的实例属性相同
+for _field in AIArchetype.FIELDS:
+    setattr(AI, _field, property(attrgetter('archetype.' + _field)))
+del _field
+
+# 各状态的行为更新函数，只创建一次
+AI_STATE_HANDLERS = {
+    AIState.IDLE: AI._update_idle,
+    AIState.PATROL: AI._update_patrol,
+    AIState.CHASE: AI._update_chase,
+    AIState.ATTACK: AI._update_attack,
+    AIState.RETREAT: AI._update_retreat,
+    AIState.SEARCH: AI._update_search,
+    AIState.ALERT: AI._update_alert,
+    AIState.STUNNED: lambda ai, dt, perception_info: ai._update_stunned(dt),
+}
@@ -1,51 +1,285 @@
 import pygame
 import os
+import numpy as np
 
-class Animation:
-    def __init__(self, name, frames, frame_duration=100, loop=True):
+# 进程内共享的精灵表和动画帧缓存，所有AnimationManager共用
+_sprite_sheets = {}   # (路径, colorkey) -> 精灵表Surface
+_frame_store = {}     # (路径, 行, 列数, 宽, 高, 缩放尺寸, colorkey) -> 帧元组
+_clip_store = {}      # (名称, 帧缓存键, 帧时长, 是否循环) -> AnimationClip
+
+
+def load_sprite_sheet(path, colorkey=None):
+    """加载精灵表(每个文件只解码一次)"""
+    cache_key = (path, colorkey)
+    sprite_sheet = _sprite_sheets.get(cache_key)
+    if sprite_sheet is None:
+        sprite_sheet = pygame.image.load(path).convert_alpha()
+        if colorkey is not None:
+            sprite_sheet.set_colorkey(colorkey)
+        _sprite_sheets[cache_key] = sprite_sheet
+    return sprite_sheet
+
+
+def get_frames(path, row, columns, width, height, scale, colorkey=None):
+    """获取切分并缩放好的帧(共享只读，不要修改返回的Surface)
+    Args:
+        path: 精灵表路径
+        row: 行号
+        columns: 列数
+        width, height: 每帧大小
+        scale: 缩放后的尺寸 (width, height)
+        colorkey: 透明色
+    Returns:
+        tuple: 帧Surface元组
+    """
+    cache_key = (path, row, columns, width, height, tuple(scale), colorkey)
+    frames = _frame_store.get(cache_key)
+    if frames is not None:
+        return frames
+        
+    sprite_sheet = load_sprite_sheet(path, colorkey)
+    frames = []
+    for col in range(columns):
+        frame = pygame.Surface((width, height), pygame.SRCALPHA)
+        src_rect = (col * width, row * height, width, height)
+        frame.blit(sprite_sheet, (0, 0), src_rect)
+        
+        if colorkey is not None:
+            frame.set_colorkey(colorkey)
+        
+        # 缩放到指定大小
+        if (width, height) != tuple(scale):
+            frame = pygame.transform.scale(frame, scale)
+        
+        frames.append(frame)
+        
+    frames = tuple(frames)
+    _frame_store[cache_key] = frames
+    return frames
+
+
+def clear_sprite_cache():
+    """清空共享的精灵缓存"""
+    _sprite_sheets.clear()
+    _frame_store.clear()
+    _clip_store.clear()
+
+
+class AnimationClip:
+    """动画片段：帧和播放参数，在实体之间共享"""
+    __slots__ = ('name', 'frames', 'frame_duration', 'loop', 'events')
+    
+    def __init__(self, name, frames, frame_duration=100, loop=True, events=None):
         """
-        初始化动画
-        frames: 动画帧列表
+        events: 时间轴事件 {帧序号: [事件名, ...]}，播放到该帧时触发
         """
         self.name = name
-        self.frames = frames
+        self.frames = tuple(frames)
         self.frame_duration = frame_duration
         self.loop = loop
+        self.events = events or {}
+
+
+class AnimationClock:
+    """批量动画时钟
+
+    所有正在播放的动画的开始时间、帧时长、帧数和循环标志保存在数组中，
+    每次tick用一次向量运算算出全部当前帧:
+        帧序号 = (当前时间 - 开始时间) // 帧时长
+    帧序号由开始时间直接算出，不会随帧率累积误差。
+    """
+    def __init__(self, capacity=64):
+        self.now = 0                # 最近一次tick的时间(毫秒)
+        self._last_tick = None
+        self.size = 0               # 已分配的最高槽位
+        self._free_slots = []
+        self._clips = {}            # 槽位 -> 正在播放的AnimationClip
+        self._listeners = {}        # 槽位 -> 事件回调 callback(事件名)
         
-        self.current_frame = 0
-        self.last_update = 0
-        self.finished = False
-    
-    def update(self, current_time):
-        if self.finished and not self.loop:
-            return
+        self.start_time = np.zeros(0, dtype=np.float64)
+        self.frame_duration = np.ones(0, dtype=np.float64)
+        self.frame_count = np.ones(0, dtype=np.int64)
+        self.loop = np.zeros(0, dtype=bool)
+        self.active = np.zeros(0, dtype=bool)
+        self.has_events = np.zeros(0, dtype=bool)
+        self.frame_index = np.zeros(0, dtype=np.int64)
+        self.finished = np.zeros(0, dtype=bool)
+        self._grow(capacity)
+        
+    def _grow(self, capacity):
+        """扩容所有数组"""
+        def resized(array, fill):
+            new_array = np.full(capacity, fill, dtype=array.dtype)
+            new_array[:len(array)] = array
+            return new_array
             
-        if current_time - self.last_update > self.frame_duration:
-            self.current_frame += 1
-            if self.current_frame >= len(self.frames):
-                if self.loop:
-                    self.current_frame = 0
-                else:
-                    self.current_frame = len(self.frames) - 1
-                    self.finished = True
-            self.last_update = current_time
+        self.start_time = resized(self.start_time, 0)
+        self.frame_duration = resized(self.frame_duration, 1)
+        self.frame_count = resized(self.frame_count, 1)
+        self.loop = resized(self.loop, False)
+        self.active = resized(self.active, False)
+        self.has_events = resized(self.has_events, False)
+        self.frame_index = resized(self.frame_index, 0)
+        self.finished = resized(self.finished, False)
+        
+    def register(self):
+        """分配一个播放槽位
+        Returns:
+            int: 槽位索引
+        """
+        if self._free_slots:
+            return self._free_slots.pop()
+        if self.size >= len(self.start_time):
+            self._grow(max(64, len(self.start_time) * 2))
+        slot = self.size
+        self.size += 1
+        return slot
+        
+    def release(self, slot):
+        """释放槽位"""
+        self.active[slot] = False
+        self.has_events[slot] = False
+        self._clips.pop(slot, None)
+        self._listeners.pop(slot, None)
+        self._free_slots.append(slot)
+        
+    def set_listener(self, slot, callback):
+        """设置槽位的时间轴事件回调"""
+        if callback is None:
+            self._listeners.pop(slot, None)
+        else:
+            self._listeners[slot] = callback
+        clip = self._clips.get(slot)
+        self.has_events[slot] = bool(clip and clip.events and callback)
+        
+    def play(self, slot, clip, start_time=None):
+        """在槽位上从头播放动画片段"""
+        self.start_time[slot] = self.now if start_time is None else start_time
+        self.frame_duration[slot] = max(clip.frame_duration, 1)
+        self.frame_count[slot] = max(len(clip.frames), 1)
+        self.loop[slot] = clip.loop
+        self.active[slot] = True
+        self.frame_index[slot] = 0
+        self.finished[slot] = False
+        self._clips[slot] = clip
+        
+        callback = self._listeners.get(slot)
+        self.has_events[slot] = bool(clip.events and callback)
+        if self.has_events[slot]:
+            for name in clip.events.get(0, ()):
+                callback(name)
+        
+    def tick(self, current_time):
+        """一次计算所有动画的当前帧
+        Args:
+            current_time: 当前时间(毫秒)
+        """
+        if current_time == self._last_tick:
+            return
+        self._last_tick = current_time
+        self.now = current_time
+        
+        n = self.size
+        if n == 0:
+            return
+        active = self.active[:n]
+        count = self.frame_count[:n]
+        
+        steps = (current_time - self.start_time[:n]) // self.frame_duration[:n]
+        steps = np.maximum(steps, 0).astype(np.int64)
+        
+        # 循环动画取模，非循环动画停在最后一帧
+        new_index = np.where(self.loop[:n], steps % count, np.minimum(steps, count - 1))
+        new_index = np.where(active, new_index, self.frame_index[:n])
+        
+        # 只对帧发生变化且带事件的槽位进入Python逻辑
+        if self._listeners:
+            changed = np.nonzero((new_index != self.frame_index[:n]) & self.has_events[:n])[0]
+            for slot in changed:
+                self._fire_events(int(slot), int(self.frame_index[slot]), int(new_index[slot]))
+        
+        self.frame_index[:n] = new_index
+        self.finished[:n] = active & ~self.loop[:n] & (steps >= count)
+        
+    def _fire_events(self, slot, old_index, new_index):
+        """触发从old_index之后到new_index之间经过的所有帧的事件"""
+        clip = self._clips.get(slot)
+        callback = self._listeners.get(slot)
+        if clip is None or callback is None:
+            return
+        frame_count = len(clip.frames)
+        if new_index > old_index:
+            passed = range(old_index + 1, new_index + 1)
+        else:
+            # 循环回到开头
+            passed = list(range(old_index + 1, frame_count)) + list(range(0, new_index + 1))
+        for frame in passed:
+            for name in clip.events.get(frame, ()):
+                callback(name)
+
+
+# 默认的共享动画时钟，由游戏循环每帧tick一次
+default_clock = AnimationClock()
+
+
+class Animation:
+    """动画句柄，播放游标保存在AnimationClock的槽位中"""
+    __slots__ = ('clip', 'clock', 'slot')
+    
+    def __init__(self, clip, clock, slot):
+        """
+        初始化动画
+        clip: 共享的AnimationClip
+        clock: 所属的AnimationClock
+        slot: 播放槽位
+        """
+        self.clip = clip
+        self.clock = clock
+        self.slot = slot
+    
+    @property
+    def name(self):
+        return self.clip.name
+    
+    @property
+    def frames(self):
+        return self.clip.frames
+    
+    @property
+    def frame_duration(self):
+        return self.clip.frame_duration
+    
+    @property
+    def loop(self):
+        return self.clip.loop
+    
+    @property
+    def current_frame(self):
+        return min(int(self.clock.frame_index[self.slot]), len(self.clip.frames) - 1)
+    
+    @property
+    def finished(self):
+        return bool(self.clock.finished[self.slot])
     
     def get_current_frame(self):
-        return self.frames[self.current_frame]
+        return self.clip.frames[self.current_frame]
     
     def reset(self):
-        self.current_frame = 0
-        self.finished = False
+        self.clock.play(self.slot, self.clip)
 
 class AnimationManager:
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, clock=None):
         self.animations = {}
         self.current_animation = None
         self.scale = (64, 128)
         self.debug = debug
+        
+        # 播放游标保存在共享时钟的槽位中，由时钟统一批量推进
+        self.clock = clock or default_clock
+        self.slot = self.clock.register()
     
     def load_animation(self, name, sprite_sheet_path, row, columns, width, height,  
-                      frame_duration=100, loop=True, colorkey=None):
+                      frame_duration=100, loop=True, colorkey=None, events=None):
         """
         加载动画
         name: 动画名称
@@ -54,39 +288,29 @@ class AnimationManager:
         columns: 列数
         width: 每帧宽度
         height: 每帧高度
+        events: 时间轴事件 {帧序号: [事件名, ...]}
         """
         try:
-            # 加载精灵表
-            sprite_sheet = pygame.image.load(sprite_sheet_path).convert_alpha()
+            # 从共享缓存获取帧，同一精灵表只解码一次
+            frames = get_frames(sprite_sheet_path, row, columns, width, height,
+                                self.scale, colorkey)
             if self.debug:
                 print(f"\nLoading animation: {name}")
-                print(f"Sprite sheet size: {sprite_sheet.get_size()}")
-            
-            if colorkey is not None:
-                sprite_sheet.set_colorkey(colorkey)
-            
-            frames = []
-            
-            # 从指定行加载帧
-            for col in range(columns):
-                frame = pygame.Surface((width, height), pygame.SRCALPHA)
-                src_rect = (col * width, row * height, width, height)
-                frame.blit(sprite_sheet, (0, 0), src_rect)
-                
-                if colorkey is not None:
-                    frame.set_colorkey(colorkey)
-                
-                # 缩放到指定大小
-                if (width, height) != self.scale:
-                    frame = pygame.transform.scale(frame, self.scale)
-                
-                frames.append(frame)
-                if self.debug:
+                print(f"Sprite sheet size: "
+                      f"{load_sprite_sheet(sprite_sheet_path, colorkey).get_size()}")
+                for col, frame in enumerate(frames):
                     print(f"Frame loaded: {name}, col:{col}, row:{row}, "
                           f"size: {frame.get_size()}")
             
-            # 创建动画对象
-            self.animations[name] = Animation(name, frames, frame_duration, loop)
+            # 动画片段在实体之间共享，这里只创建播放状态
+            clip_key = (name, sprite_sheet_path, row, columns, width, height,
+                        tuple(self.scale), colorkey, frame_duration, loop,
+                        tuple(sorted((k, tuple(v)) for k, v in (events or {}).items())))
+            clip = _clip_store.get(clip_key)
+            if clip is None:
+                clip = AnimationClip(name, frames, frame_duration, loop, events)
+                _clip_store[clip_key] = clip
+            self.animations[name] = Animation(clip, self.clock, self.slot)
             
             # 如果是第一个加载的动画，设为当前动画
             if not self.current_animation:
@@ -119,9 +343,20 @@ class AnimationManager:
         return True
     
     def update(self, current_time):
-        """更新当前动画"""
-        if self.current_animation:
-            self.current_animation.update(current_time)
+        """推进时钟(同一时间多次调用只计算一次)
+        
+        游戏循环通常直接每帧调用一次clock.tick，不需要逐个实体调用此方法
+        """
+        self.clock.tick(current_time)
+    
+    def on_event(self, callback):
+        """设置时间轴事件回调 callback(事件名)"""
+        self.clock.set_listener(self.slot, callback)
+    
+    def release(self):
+        """释放时钟槽位(实体销毁时调用)"""
+        self.clock.release(self.slot)
+        self.current_animation = None
     
     def get_current_frame(self):
         """获取当前帧"""
@@ -1,12 +1,17 @@
 import pygame
 
 class Enemy:
+    WIDTH = 40
+    HEIGHT = 60
+    GRAVITY = 800          # 重力加速度
+    MAX_FALL_SPEED = 800   # 最大下落速度
+
     def __init__(self, game_map, x, y):
         self.game_map = game_map
         self.x = x
         self.y = y
-        self.width = 40
-        self.height = 60
+        self.width = self.WIDTH
+        self.height = self.HEIGHT
         self.vx = 0
         self.vy = 0
         self.color = (255, 0, 0)  # 红色
@@ -23,14 +28,14 @@ class Enemy:
         
     def _snap_to_ground(self):
         """将实体对齐到地面"""
-        # 向下检测直到找到地面
-        test_y = self.y
-        while test_y < self.game_map.level_height:
-            if self.game_map.is_solid(self.x + self.width/2, test_y + self.height):
-                self.y = test_y
-                self.on_ground = True
-                return
-            test_y += self.game_map.tile_size/2  # 每次检测半个砖块的距离
+        # 在表面索引中查找脚下的第一个地面
+        surfaces = self.game_map.surface_index
+        col = int((self.x + self.width / 2) // self.game_map.tile_size)
+        row = surfaces.find_surface(col, surfaces.stand_row(self.y, self.height))
+        if row is not None:
+            self.y = surfaces.stand_y(row, self.height)
+            self.on_ground = True
+            return
             
         # 如果没找到地面，至少确保不会超出地图
         self.y = min(self.y, self.game_map.level_height - self.height - self.game_map.tile_size)
@@ -39,16 +44,22 @@ class Enemy:
         """更新敌人状态"""
         # 应用重力
         if not self.on_ground:
-            self.vy += 800 * dt  # 重力加速度
+            self.vy += self.GRAVITY * dt
             
         # 限制最大下落速度
-        max_fall_speed = 800
-        self.vy = min(self.vy, max_fall_speed)
+        self.vy = min(self.vy, self.MAX_FALL_SPEED)
         
         # 分别更新水平和垂直位置，并进行碰撞检测
         self._update_x(dt)
         self._update_y(dt)
         
+        # 同步空间哈希
+        self.game_map.spatial_hash.move_object(self, self.get_rect())
+        
+    def get_rect(self):
+        """获取包围盒 (x, y, width, height)"""
+        return (self.x, self.y, self.width, self.height)
+        
     def _update_x(self, dt):
         """更新水平位置并处理碰撞"""
         # 保存原始位置
@@ -97,7 +108,8 @@ class Enemy:
         # 生成检查点
         check_points = []
         for i in range(self.collision_points):
-            y_offset = (self.height / (self.collision_points - 1)) * i
+            # 最低的检查点取脚底向上一个像素，避免把脚下的地面当成墙
+            y_offset = min((self.height / (self.collision_points - 1)) * i, self.height - 1)
             check_points.append((check_x, self.y + y_offset))
         
         # 检查所有点
@@ -144,57 +156,71 @@ class Enemy:
         
     def render(self, camera_offset=(0, 0)):
         """渲染敌人"""
-        screen_x = int(self.x - camera_offset[0])
-        screen_y = int(self.y - camera_offset[1])
+        # 渲染目标可能低于窗口分辨率，按比例换算屏幕坐标和尺寸
+        scale = self.game.render_scale
+        screen_x = int((self.x - camera_offset[0]) * scale)
+        screen_y = int((self.y - camera_offset[1]) * scale)
+        width = int(self.width * scale)
+        height = int(self.height * scale)
         
         # 只在屏幕范围内渲染
         screen_width = self.game.screen.get_width()
         screen_height = self.game.screen.get_height()
         
-        if (-self.width <= screen_x <= screen_width and 
-            -self.height <= screen_y <= screen_height):
+        if (-width <= screen_x <= screen_width and 
+            -height <= screen_y <= screen_height):
             
             # 绘制敌人主体
             pygame.draw.rect(
                 self.game.screen,
                 self.color,
-                (screen_x, screen_y, self.width, self.height)
+                (screen_x, screen_y, width, height)
             )
             
             # 绘制边框
             pygame.draw.rect(
                 self.game.screen,
                 (200, 0, 0),  # 深红色边框
-                (screen_x, screen_y, self.width, self.height),
-                2
+                (screen_x, screen_y, width, height),
+                max(1, int(2 * scale))
             )
             
             # 添加简单的面部特征
             eye_color = (255, 255, 255)  # 白色眼睛
-            eye_size = 8
+            eye_size = max(1, int(8 * scale))
             # 左眼
             pygame.draw.circle(
                 self.game.screen,
                 eye_color,
-                (screen_x + self.width//3, screen_y + self.height//3),
+                (screen_x + width//3, screen_y + height//3),
                 eye_size
             )
             # 右眼
             pygame.draw.circle(
                 self.game.screen,
                 eye_color,
-                (screen_x + 2*self.width//3, screen_y + self.height//3),
+                (screen_x + 2*width//3, screen_y + height//3),
                 eye_size
             )
             
-            # 渲染AI的叫骂文本
+            # 渲染AI的叫骂文本(AI覆盖层按窗口分辨率绘制)
             if hasattr(self, 'ai'):
-                self.ai.render(self.game.screen, camera_offset)
+                self.ai.render(self.game.ai_overlay, camera_offset)
     def take_damage(self, amount):
         """受到伤害"""
         self.health -= amount
         if self.health <= 0:
+            # 死亡爆散
+            if hasattr(self.game, 'particles'):
+                self.game.particles.emit_burst(
+                    self.x + self.width / 2, self.y + self.height / 2, self.color
+                )
+            # 死亡的声响会惊动附近的敌人
+            noise = getattr(self.game_map, 'noise', None)
+            if noise:
+                noise.emit(self.x + self.width / 2, self.y + self.height / 2, 1.0, source='enemy')
             # 通知游戏移除此敌人
             if self in self.game.enemies:
                 self.game.enemies.remove(self)
-                self.game.view.remove_from_layer('playground', self) 
\ No newline at end of file
+                self.game.view.remove_from_layer('playground', self)
+                self.game_map.spatial_hash.remove_object(self) 
\ No newline at end of file
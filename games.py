@@ -3,9 +3,21 @@ import json
 import os
 import random
 import math
+import numpy as np
 from player import Player
 from enemy import Enemy
-from ai import AI
+from ai import AI, AIArchetype, AIOverlay, AIScheduler
+from hud import HUDCompositor
+from animation import default_clock
+from timers import default_timers
+from particles import ParticleSystem
+from projectiles import ProjectileStore
+from simulation import SimulationLOD, SimulationTier
+from navigation import NavGraph, PathService
+from surfaces import SurfaceIndex
+from visibility import FieldOfView
+from noise import NoiseField
+from influence import InfluenceMap
 
 
 def lerp(start, end, t):
@@ -27,7 +39,10 @@ class GameBase:
         pygame.init()
         self.running = True
         self.paused = False
-        self.screen = pygame.display.set_mode((1280, 720))
+        self.display = pygame.display.set_mode((1280, 720))  # 窗口表面
+        self.screen = self.display  # 渲染目标(可以是更低分辨率的离屏表面)
+        self.render_scale = 1.0     # 渲染目标相对窗口的缩放比例
+        self.smooth_scaling = True  # 放大到窗口时是否使用平滑缩放
         pygame.display.set_caption(caption)
         self.clock = pygame.time.Clock()
         self.fps = 60
@@ -79,8 +94,13 @@ class GameBase:
             self.render()
 
             pygame.display.flip()
+        self.shutdown()
         pygame.quit()
 
+    def shutdown(self):
+        """游戏循环结束后释放资源(子类重写)"""
+        pass
+
 
 class GameView:
     """游戏视图类，处理游戏的显示部分"""
@@ -92,6 +112,35 @@ class GameView:
         self._cached_images = {}
         self._cached_backgrounds = {}  # 添加背景图片缓存
         self.render_layers = {}  # 添加渲染层级字典
+        self.render_scale = 1.0  # 世界坐标到渲染目标的缩放比例
+        self._cached_scaled = {}  # 按渲染比例缩放后的精灵缓存
+        
+    def set_target(self, screen, render_scale=1.0):
+        """切换渲染目标
+        Args:
+            screen: 新的渲染目标表面
+            render_scale: 世界坐标到渲染目标的缩放比例
+        """
+        self.screen = screen
+        self.render_scale = render_scale
+        # 缩放结果依赖渲染比例，需要重新生成
+        self._cached_backgrounds.clear()
+        self._cached_scaled.clear()
+        
+    def get_scaled(self, surface):
+        """获取按当前渲染比例缩放的表面(带缓存)"""
+        if self.render_scale == 1.0:
+            return surface
+        scaled = self._cached_scaled.get(surface)
+        if scaled is None:
+            width, height = surface.get_size()
+            scaled = pygame.transform.smoothscale(
+                surface,
+                (max(1, round(width * self.render_scale)),
+                 max(1, round(height * self.render_scale)))
+            )
+            self._cached_scaled[surface] = scaled
+        return scaled
         
     def add_to_layer(self, layer_name, drawable, z_index=0):
         """添加可绘制对象到指定层
@@ -123,6 +172,12 @@ class GameView:
         """清空屏幕"""
         self.screen.fill(color or self.background_color)
 
+    def get_font(self, size):
+        """获取缓存的默认字体"""
+        if size not in self._cached_fonts:
+            self._cached_fonts[size] = pygame.font.Font(None, size)
+        return self._cached_fonts[size]
+
     def draw_text(self, text, position, color=(0, 0, 0), size=32, centered=False):
         """绘制文本
         Args:
@@ -132,10 +187,7 @@ class GameView:
             size: 字体大
             centered: 是否居中绘制
         """
-        if size not in self._cached_fonts:
-            self._cached_fonts[size] = pygame.font.Font(None, size)
-
-        font = self._cached_fonts[size]
+        font = self.get_font(size)
         text_surface = font.render(text, True, color)
 
         if centered:
@@ -188,6 +240,9 @@ class GameView:
         """
         cache_key = (filename, scale_mode, scale_factor)
         if cache_key not in self._cached_backgrounds:
+            # original模式按图片原始大小绘制，需要跟随渲染比例缩放
+            if scale_mode == 'original':
+                scale_factor *= self.render_scale
             try:
                 path = os.path.join("assets", "backgrounds", filename)
                 _, ext = os.path.splitext(filename)
@@ -260,9 +315,9 @@ class GameView:
         screen_width, screen_height = self.screen.get_size()
         bg_width, bg_height = background.get_size()
         
-        # 计算视差偏移
-        parallax_x = int(camera_offset[0] * parallax_factor)
-        parallax_y = int(camera_offset[1] * parallax_factor)
+        # 计算视差偏移(相机偏移是世界坐标，需要换算到渲染目标)
+        parallax_x = int(camera_offset[0] * parallax_factor * self.render_scale)
+        parallax_y = int(camera_offset[1] * parallax_factor * self.render_scale)
         
         if tile_mode == 'none':
             # 计算单个背景的位
@@ -337,48 +392,161 @@ class ObjectPool:
 
 
 class SpatialHash:
-    """空间哈希分区"""
+    """动态空间哈希分区
+
+    记录每个对象的包围盒和占用的网格范围，对象移动时只在跨越网格时更新网格集合，
+    查询代价只与查询区域内的对象密度有关。
+    """
     def __init__(self, cell_size=64):
         self.cell_size = cell_size
         self.grid = {}
+        self._objects = {}   # obj -> [包围盒(left, top, right, bottom), 网格范围, 插入序号]
+        self._sequence = 0
+        
+    def __len__(self):
+        return len(self._objects)
+        
+    def __contains__(self, obj):
+        return obj in self._objects
         
     def _get_cell(self, x, y):
         """获取坐标所在的网格单元"""
-        return (int(x / self.cell_size), int(y / self.cell_size))
+        return (int(x // self.cell_size), int(y // self.cell_size))
+    
+    def _get_bounds(self, rect):
+        """将Rect或(x, y, w, h)元组转换为包围盒"""
+        x, y, width, height = rect
+        return (x, y, x + width, y + height)
+    
+    def _get_cell_range(self, bounds):
+        """获取包围盒覆盖的网格范围"""
+        cell_size = self.cell_size
+        return (int(bounds[0] // cell_size), int(bounds[1] // cell_size),
+                int(bounds[2] // cell_size), int(bounds[3] // cell_size))
+    
+    def _insert_cells(self, obj, cells):
+        grid = self.grid
+        for x in range(cells[0], cells[2] + 1):
+            for y in range(cells[1], cells[3] + 1):
+                bucket = grid.get((x, y))
+                if bucket is None:
+                    grid[(x, y)] = bucket = set()
+                bucket.add(obj)
+    
+    def _remove_cells(self, obj, cells):
+        grid = self.grid
+        for x in range(cells[0], cells[2] + 1):
+            for y in range(cells[1], cells[3] + 1):
+                bucket = grid.get((x, y))
+                if bucket is not None:
+                    bucket.discard(obj)
+                    if not bucket:
+                        del grid[(x, y)]
     
     def add_object(self, obj, rect):
-        """添加对象到空间分区"""
-        cell_start = self._get_cell(rect.left, rect.top)
-        cell_end = self._get_cell(rect.right, rect.bottom)
-        
-        for x in range(cell_start[0], cell_end[0] + 1):
-            for y in range(cell_start[1], cell_end[1] + 1):
-                cell = (x, y)
-                if cell not in self.grid:
-                    self.grid[cell] = set()
-                self.grid[cell].add(obj)
+        """添加对象到空间分区(已存在时等同于move_object)
+        Args:
+            obj: 对象
+            rect: 包围盒，Rect或(x, y, w, h)
+        """
+        if obj in self._objects:
+            self.move_object(obj, rect)
+            return
+        bounds = self._get_bounds(rect)
+        cells = self._get_cell_range(bounds)
+        self._insert_cells(obj, cells)
+        self._objects[obj] = [bounds, cells, self._sequence]
+        self._sequence += 1
+        
+    def move_object(self, obj, rect):
+        """更新对象位置，只在跨越网格时修改网格集合(未登记的对象忽略)"""
+        entry = self._objects.get(obj)
+        if entry is None:
+            return
+        bounds = self._get_bounds(rect)
+        cells = self._get_cell_range(bounds)
+        entry[0] = bounds
+        if cells != entry[1]:
+            self._remove_cells(obj, entry[1])
+            self._insert_cells(obj, cells)
+            entry[1] = cells
+            
+    def remove_object(self, obj):
+        """从空间分区移除对象"""
+        entry = self._objects.pop(obj, None)
+        if entry is not None:
+            self._remove_cells(obj, entry[1])
+            
+    def clear(self):
+        """清空空间分区"""
+        self.grid.clear()
+        self._objects.clear()
                 
     def get_nearby_objects(self, rect):
-        """获取指定区域附近的对"""
-        cell_start = self._get_cell(rect.left, rect.top)
-        cell_end = self._get_cell(rect.right, rect.bottom)
-        
+        """获取指定区域覆盖的网格中的对象(粗略结果)"""
+        cells = self._get_cell_range(self._get_bounds(rect))
+        grid = self.grid
         nearby = set()
-        for x in range(cell_start[0], cell_end[0] + 1):
-            for y in range(cell_start[1], cell_end[1] + 1):
-                cell = (x, y)
-                if cell in self.grid:
-                    nearby.update(self.grid[cell])
+        for x in range(cells[0], cells[2] + 1):
+            for y in range(cells[1], cells[3] + 1):
+                bucket = grid.get((x, y))
+                if bucket:
+                    nearby.update(bucket)
         return nearby
+    
+    def query_rect(self, rect):
+        """查询包围盒与区域相交的对象
+        Args:
+            rect: 查询区域，Rect或(x, y, w, h)
+        Returns:
+            list: 按插入顺序排列的对象列表
+        """
+        left, top, right, bottom = self._get_bounds(rect)
+        objects = self._objects
+        result = []
+        for obj in self.get_nearby_objects(rect):
+            entry = objects[obj]
+            b = entry[0]
+            if b[0] < right and b[2] > left and b[1] < bottom and b[3] > top:
+                result.append((entry[2], obj))
+        result.sort(key=lambda item: item[0])
+        return [obj for _, obj in result]
+    
+    def query_radius(self, x, y, radius):
+        """查询包围盒与圆形区域相交的对象
+        Args:
+            x, y: 圆心
+            radius: 半径
+        Returns:
+            list: 按插入顺序排列的对象列表
+        """
+        objects = self._objects
+        radius_sq = radius * radius
+        result = []
+        for obj in self.get_nearby_objects((x - radius, y - radius, radius * 2, radius * 2)):
+            entry = objects[obj]
+            b = entry[0]
+            # 圆心到包围盒的最近距离
+            dx = max(b[0] - x, 0, x - b[2])
+            dy = max(b[1] - y, 0, y - b[3])
+            if dx * dx + dy * dy < radius_sq:
+                result.append((entry[2], obj))
+        result.sort(key=lambda item: item[0])
+        return [obj for _, obj in result]
 
 
 class Game(GameBase):
     """主游戏类，继承自GameBase"""
 
-    def __init__(self):
+    def __init__(self, render_resolution=None):
+        """
+        render_resolution: 内部渲染分辨率，如(640, 360)或(960, 540)，
+            None表示直接按窗口分辨率渲染
+        """
         super().__init__("My Game")  # 设置游戏标题
         self.view = GameView(self.screen)
         self.gamemap = gamemap(self)
+        self.particles = ParticleSystem(self)  # 火花、扬尘、爆散等粒子效果
         # 创建玩家，位置在第一关的左侧
         self.player = Player(self.gamemap, 100, 300)
         self.load_maps()
@@ -393,7 +561,13 @@ class Game(GameBase):
         self.camera_deadzone = 50  # 添加死区
         self.camera_vx = 0  # 添加相机速度
         self.camera_vy = 0  # 添加相机速度
+        self.shake_intensity = 0  # 相机震动
+        self.shake_duration = 0
+        self.shake_timer = 0
+        self.shake_offset = (0, 0)  # 震动偏移，只作用于渲染
         self.object_pool = ObjectPool()
+        self.animation_clock = default_clock  # 所有动画共享的批量时钟
+        self.timers = default_timers  # 冷却和计时共享的游戏时钟(暂停时不推进)
         
         # 定义背景层级顺序
         self.background_layers = [
@@ -404,6 +578,11 @@ class Game(GameBase):
             'foreground',        # 前景层
             'ui'                 # UI层
         ]
+        self.ui_layers = ['ui']  # 这些层在放大到窗口之后按窗口分辨率绘制
+        
+        # 可选的内部渲染分辨率(F4切换)，用清晰度换取帧率
+        self.render_resolutions = [None, (960, 540), (640, 360)]
+        self.set_render_resolution(render_resolution)
         
         # 加载背景 - 添加层级名称
         self.backgrounds = {
@@ -419,6 +598,11 @@ class Game(GameBase):
         # 将玩家地图添加到游戏层
         self.view.add_to_layer('playground', self.gamemap, 0)
         self.view.add_to_layer('playground', self.player, 1)
+        self.view.add_to_layer('playground', self.particles, 2)
+        
+        # AI覆盖层(路径、感知范围、叫骂、调试图形)每帧在UI层合成一次
+        self.ai_overlay = AIOverlay(self)
+        self.view.add_to_layer('ui', self.ai_overlay, 0)
         
         # 添加debug信息配置
         self.debug_info = {
@@ -448,9 +632,15 @@ class Game(GameBase):
         # 初始化敌人
         self.enemies = []
         self.active_enemies = []  # 添加活跃敌人列表
+        self.simulation = SimulationLOD(self)  # 敌人模拟层级
+        self.ai_scheduler = AIScheduler(budget_ms=2.0)  # AI思考调度器
         self._spawn_enemies()
         
-        self.projectiles = []  # 存储所有投射物
+        self.projectiles = ProjectileStore(self)  # 存储所有投射物
+        
+        # HUD合成器(按窗口分辨率绘制)
+        self.hud = HUDCompositor(self.display.get_size())
+        self._setup_hud()
         
     def _setup_background_layers(self):
         """设置背景层级"""
@@ -498,6 +688,28 @@ class Game(GameBase):
             )
             self.view.add_to_layer(layer, renderer, z_index)
             
+    def set_render_resolution(self, resolution):
+        """设置内部渲染分辨率
+        Args:
+            resolution: (width, height)，None或与窗口相同时直接渲染到窗口
+        """
+        if resolution is None or tuple(resolution) == self.display.get_size():
+            self.screen = self.display
+        else:
+            self.screen = pygame.Surface(resolution).convert()
+        self.render_resolution = resolution
+        self.render_scale = self.screen.get_width() / self.display.get_width()
+        self.view.set_target(self.screen, self.render_scale)
+        
+    def _present_world(self):
+        """将内部渲染结果缩放到窗口"""
+        if self.screen is self.display:
+            return
+        if self.smooth_scaling and self.screen.get_bitsize() >= 24:
+            pygame.transform.smoothscale(self.screen, self.display.get_size(), self.display)
+        else:
+            pygame.transform.scale(self.screen, self.display.get_size(), self.display)
+
     def load_maps(self):
         """加载地图数据"""
         try:
@@ -527,6 +739,10 @@ class Game(GameBase):
         path = os.path.join(self.assets_dir, filename)
         return pygame.image.load(path).convert_alpha()
 
+    def shutdown(self):
+        """停止后台寻路工作者"""
+        self.gamemap.path_service.close()
+
     def on_event(self, event):
         """处理游戏特定事件"""
         if event.type == pygame.KEYDOWN:
@@ -536,6 +752,13 @@ class Game(GameBase):
                 self.current_map = max(1, self.current_map - 1)
             elif event.key == pygame.K_RIGHT:
                 self.current_map = min(len(self.maps), self.current_map + 1)
+            elif event.key == pygame.K_F4:
+                # 循环切换内部渲染分辨率
+                index = self.render_resolutions.index(self.render_resolution) \
+                    if self.render_resolution in self.render_resolutions else -1
+                self.set_render_resolution(
+                    self.render_resolutions[(index + 1) % len(self.render_resolutions)]
+                )
             # 只处理数字键切换不同类型的调试信息
             elif self.debug and pygame.K_1 <= event.key <= pygame.K_6:
                 debug_keys = list(self.debug_info.keys())
@@ -547,42 +770,67 @@ class Game(GameBase):
     def update(self):
         """更新游戏状态"""
         if not self.paused:
+            # 推进游戏时钟，只触发到期的计时器
+            self.timers.advance(self.dt)
+            
+            # 推进声音场，本帧发出的声音从当前时间开始计时
+            self.gamemap.noise.update(self.dt)
+            
             # 更新玩家
             self.player.update(self.dt)
             
+            # 一次批量推进所有动画
+            self.animation_clock.tick(pygame.time.get_ticks())
+            
             # 更新敌人和AI
             player_pos = (self.player.x, self.player.y)
             screen_rect = pygame.Rect(
                 self.camera_x - 100,  # 扩大一点检测范围
                 self.camera_y - 100,
-                self.screen.get_width() + 200,
-                self.screen.get_height() + 200
+                self.display.get_width() + 200,
+                self.display.get_height() + 200
             )
             
-            # 更新活跃敌人列表
-            self.active_enemies = [
-                enemy for enemy in self.enemies
-                if screen_rect.collidepoint(enemy.x, enemy.y)
-            ]
+            # 划分模拟层级，相机附近的敌人完整更新，外围环带粗略模拟，远处休眠
+            self.active_enemies = self.simulation.update(self.dt, screen_rect)
             
             # 更新敌人
             enemies_to_remove = []
             for enemy in self.active_enemies:
                 try:
                     enemy.update(self.dt)
-                    enemy.ai.update(self.dt, player_pos)
                 except Exception as e:
                     print(f"敌人AI更新错误: {e}")
                     enemies_to_remove.append(enemy)
             
+            # 分发后台寻路结果
+            self.gamemap.path_service.update()
+            
+            # 玩家换格子时重新计算视野，敌人的视线判断直接查表
+            self.gamemap.player_fov.update(player_pos)
+            
+            # 衰减并扩散影响图，AI的撤退、搜索和包抄决策直接查询
+            self.gamemap.influence.update(self.dt, self.player, self.active_enemies)
+            
+            # AI思考按预算分时执行，行动每帧执行
+            enemies_to_remove.extend(self.ai_scheduler.update(
+                self.dt, player_pos,
+                [enemy for enemy in self.active_enemies if enemy not in enemies_to_remove]
+            ))
+            
             # 移除出错的敌人
             for enemy in enemies_to_remove:
                 if enemy in self.enemies:
                     self.enemies.remove(enemy)
                     self.view.remove_from_layer('playground', enemy)
+                    self.gamemap.spatial_hash.remove_object(enemy)
             
             # 更新相机
             self._update_camera()
+            self._apply_camera_shake()
+            
+            # 更新粒子
+            self.particles.update(self.dt)
             
             # 检查玩家与敌人的碰撞
             self._check_enemy_collisions()
@@ -592,8 +840,9 @@ class Game(GameBase):
 
     def _update_camera(self):
         """更新相机位置，使用更平滑的跟随系"""
-        screen_width = self.screen.get_width()
-        screen_height = self.screen.get_height()
+        # 相机的可视范围(世界坐标)始终等于窗口大小，与内部渲染分辨率无关
+        screen_width = self.display.get_width()
+        screen_height = self.display.get_height()
         
         # 计算玩家中心点
         player_center_x = self.player.x + self.player.width / 2
@@ -643,112 +892,171 @@ class Game(GameBase):
         self.shake_timer = 0
         
     def _apply_camera_shake(self):
-        """应用相机震动"""
+        """应用相机震动(偏移只用于渲染，不影响相机跟随)"""
         if self.shake_timer < self.shake_duration:
             self.shake_timer += self.dt
-            shake_offset_x = random.uniform(-1, 1) * self.shake_intensity
-            shake_offset_y = random.uniform(-1, 1) * self.shake_intensity
-            self.camera_x += shake_offset_x
-            self.camera_y += shake_offset_y
+            # 震动强度随时间衰减
+            falloff = 1.0 - self.shake_timer / self.shake_duration
+            shake_offset_x = random.uniform(-1, 1) * self.shake_intensity * falloff
+            shake_offset_y = random.uniform(-1, 1) * self.shake_intensity * falloff
+            self.shake_offset = (shake_offset_x, shake_offset_y)
+        else:
+            self.shake_offset = (0, 0)
 
     def render(self):
         """渲染游戏画面"""
         self.view.clear_screen()
         
-        # 按层级顺序渲染
+        # 按层级顺序渲染世界(渲染到内部分辨率的目标上)
+        camera_offset = (self.camera_x + self.shake_offset[0],
+                         self.camera_y + self.shake_offset[1])
         for layer_name in self.background_layers:
-            if layer_name in self.view.render_layers:
-                for _, drawable in self.view.render_layers[layer_name]:
-                    drawable.render((self.camera_x, self.camera_y))
+            if layer_name in self.ui_layers:
+                continue
+            for _, drawable in self.view.render_layers.get(layer_name, ()):
+                drawable.render(camera_offset)
         
-        # 渲染血量条
-        self._render_health_bar()
+        # 渲染投射物
+        self.projectiles.render(camera_offset)
         
-        # 渲染AI调试信息
-        if self.debug and self.debug_info.get('ai'):
-            for enemy in self.enemies:
-                enemy.ai.render_debug(self.screen, (self.camera_x, self.camera_y))
+        # 放大到窗口，之后的UI按窗口分辨率绘制
+        self._present_world()
+        for layer_name in self.ui_layers:
+            for _, drawable in self.view.render_layers.get(layer_name, ()):
+                drawable.render(camera_offset)
         
-        # 渲染其他调试信息
-        if self.debug:
-            self._render_debug_info()
+        # 渲染HUD(血量条、受伤闪屏、调试信息)
+        self._update_hud()
+        self.hud.render(self.display)
+    
+    def _setup_hud(self):
+        """注册HUD元素"""
+        self.hud.add_element(
+            'health_bar',
+            self._get_health_bar_value,
+            self._draw_health_bar
+        )
         
-        # 渲染投射物
-        for projectile in self.projectiles:
-            screen_x = int(projectile['x'] - self.camera_x)
-            screen_y = int(projectile['y'] - self.camera_y)
-            pygame.draw.circle(
-                self.screen,
-                (255, 100, 100),  # 红色投射物
-                (screen_x, screen_y),
-                projectile['radius']
+        # 调试信息分组: (分组名, 行数, 刷新间隔秒)
+        self.debug_sections = [
+            ('fps', 2, 0.25),         # FPS以4Hz刷新
+            ('player', 3, 0.1),
+            ('camera', 2, 0.25),      # 相机读数以4Hz刷新
+            ('level', 3, 0.5),
+            ('memory', 3, 0.5),
+            ('background', 2, 0.5),
+        ]
+        for name, _, interval in self.debug_sections:
+            self.hud.add_element(
+                f'debug_{name}',
+                lambda name=name: self._get_debug_section_value(name),
+                self._draw_debug_lines,
+                interval
             )
     
-    def _render_debug_info(self):
-        """渲染调试信息"""
-        y_offset = 10
-        line_height = 20
+    def _update_hud(self):
+        """更新HUD元素的值和受伤闪屏"""
+        current_time = pygame.time.get_ticks() / 1000.0
         
-        debug_lines = []
+        for name, _, _ in self.debug_sections:
+            self.hud.set_enabled(f'debug_{name}', self.debug and self.debug_info[name])
+        self.hud.update(current_time)
         
+        # 如果玩家受伤，显示红色边缘效果
+        alpha = 0
+        now = self.timers.now
+        if self.player.invincible_time > now:
+            alpha = ((self.player.invincible_time - now) 
+                     / self.player.invincible_duration) * 128
+        self.hud.set_flash(alpha)
+    
+    def _get_debug_section_value(self, name):
+        """获取调试信息分组的显示位置和文本"""
+        y_offset = 40  # 位于血量条下方
+        line_height = 20
+        for section, line_count, _ in self.debug_sections:
+            if section == name:
+                break
+            if self.debug_info[section]:
+                y_offset += line_count * line_height
+        return y_offset, tuple(self._get_debug_lines(name))
+    
+    def _get_debug_lines(self, name):
+        """获取指定分组的调试文本"""
         # FPS信息
-        if self.debug_info['fps']:
-            current_fps = int(self.clock.get_fps())
-            debug_lines.append(f"FPS: {current_fps}")
+        if name == 'fps':
+            stats = self.ai_scheduler.stats
+            return [
+                f"FPS: {int(self.clock.get_fps())}",
+                f"AI Think: {stats['thinks']} run, {stats['pending']} deferred, {stats['think_ms']:.1f}ms"
+            ]
             
         # 玩家信息
-        if self.debug_info['player']:
-            debug_lines.extend([
+        if name == 'player':
+            return [
                 f"Player Pos: ({int(self.player.x)}, {int(self.player.y)})",
                 f"Velocity: ({int(self.player.vx)}, {int(self.player.vy)})",
                 f"On Ground: {self.player.on_ground}"
-            ])
+            ]
             
-        # 机信息
-        if self.debug_info['camera']:
-            debug_lines.extend([
+        # 相机信息
+        if name == 'camera':
+            return [
                 f"Camera: ({int(self.camera_x)}, {int(self.camera_y)})",
                 f"Camera V: ({int(self.camera_vx)}, {int(self.camera_vy)})"
-            ])
+            ]
             
         # 关卡信息
-        if self.debug_info['level']:
+        if name == 'level':
             current_level = self.gamemap.get_current_level_index(self.player.x)
             total_levels = len(self.gamemap.levels)
-            debug_lines.extend([
+            return [
                 f"Level: {current_level + 1}/{total_levels}",
-                f"World Width: {self.gamemap.world_width}px"
-            ])
+                f"World Width: {self.gamemap.world_width}px",
+                f"Enemies full/coarse/dormant: {self._get_tier_counts()}"
+            ]
             
         # 内存使用信息
-        if self.debug_info['memory']:
-            cached_images = len(self.view._cached_images)
-            cached_backgrounds = len(self.view._cached_backgrounds)
-            cached_fonts = len(self.view._cached_fonts)
-            debug_lines.extend([
-                f"Cached Images: {cached_images}",
-                f"Cached Backgrounds: {cached_backgrounds}",
-                f"Cached Fonts: {cached_fonts}"
-            ])
+        if name == 'memory':
+            return [
+                f"Cached Images: {len(self.view._cached_images)}",
+                f"Cached Backgrounds: {len(self.view._cached_backgrounds)}",
+                f"Cached Fonts: {len(self.view._cached_fonts)}"
+            ]
             
         # 背景信息
-        if self.debug_info['background']:
+        if name == 'background':
             active_layers = sum(1 for layer in self.background_layers 
                               if layer in self.view.render_layers)
             total_drawables = sum(len(layer) for layer in self.view.render_layers.values())
-            debug_lines.extend([
+            return [
                 f"Active Layers: {active_layers}/{len(self.background_layers)}",
                 f"Total Drawables: {total_drawables}"
-            ])
-        
-        # 渲染所有调试信息
-        for i, line in enumerate(debug_lines):
-            self.view.draw_text(
-                line,
-                (10, y_offset + i * line_height),
-                (255, 0, 0),  # 红色
-                24
-            )
+            ]
+            
+        return []
+    
+    def _get_tier_counts(self):
+        """统计各模拟层级的敌人数量"""
+        tiers = list(self.simulation.tiers.values())
+        full = sum(1 for tier in tiers if tier == SimulationTier.FULL)
+        return f"{full}/{len(tiers) - full}/{len(self.enemies) - len(tiers)}"
+    
+    def _draw_debug_lines(self, surface, value):
+        """将调试文本绘制到HUD表面
+        Returns:
+            pygame.Rect: 绘制区域
+        """
+        y_offset, lines = value
+        line_height = 20
+        font = self.view.get_font(24)
+        
+        dirty_rect = None
+        for i, line in enumerate(lines):
+            text_surface = font.render(line, True, (255, 0, 0))  # 红色
+            rect = surface.blit(text_surface, (10, y_offset + i * line_height))
+            dirty_rect = rect if dirty_rect is None else dirty_rect.union(rect)
+        return dirty_rect
             
     def _spawn_enemies(self):
         """生成敌人，优化生成逻辑"""
@@ -806,6 +1114,7 @@ class Game(GameBase):
                                 # 添加敌人
                                 self.enemies.append(enemy)
                                 self.view.add_to_layer('playground', enemy, 1)
+                                self.gamemap.spatial_hash.add_object(enemy, enemy.get_rect())
                                 spawned_positions.append((x, y))
                                 break
                             except Exception as e:
@@ -832,28 +1141,24 @@ class Game(GameBase):
 
     def _check_enemy_collisions(self):
         """检查玩家与敌人的碰撞"""
-        player_rect = pygame.Rect(
-            self.player.x + 10,  # 缩小碰撞箱，使碰撞更精确
-            self.player.y + 5,
-            self.player.width - 20,
-            self.player.height - 10
-        )
-        
-        current_time = pygame.time.get_ticks() / 1000.0
+        current_time = self.timers.now
         
         # 如果玩家在无敌时间内，不处理碰撞
         if current_time < self.player.invincible_time:
             return
         
-        for enemy in self.enemies[:]:  # 使用切片创建副本以避免修改迭代中的列表
-            enemy_rect = pygame.Rect(
-                enemy.x + 5,  # 缩小敌人碰撞箱
-                enemy.y + 5,
-                enemy.width - 10,
-                enemy.height - 10
-            )
-            
-            if player_rect.colliderect(enemy_rect):
+        # 缩小碰撞箱，使碰撞更精确
+        left = self.player.x + 10
+        top = self.player.y + 5
+        right = left + self.player.width - 20
+        bottom = top + self.player.height - 10
+        
+        # 只检查空间哈希中与玩家相邻的敌人(查询结果是新列表，可以安全地移除敌人)
+        nearby = self.gamemap.spatial_hash.query_rect((left, top, right - left, bottom - top))
+        for enemy in nearby:
+            # 缩小敌人碰撞箱
+            if (enemy.x + 5 < right and enemy.x + enemy.width - 5 > left and
+                    enemy.y + 5 < bottom and enemy.y + enemy.height - 5 > top):
                 # 计算碰撞点和方向
                 player_center_x = self.player.x + self.player.width / 2
                 player_center_y = self.player.y + self.player.height / 2
@@ -863,7 +1168,7 @@ class Game(GameBase):
                 # 如果玩家从上方���撞敌人
                 if (self.player.vy > 0 and  # 玩家正在下落
                     self.player.y + self.player.height < enemy.y + enemy.height * 0.25):  # 更严格的上方判定
-                    # 击败敌人
+                    # 击败敌人(死亡爆散在Enemy.take_damage中发射)
                     enemy.take_damage(100)
                     # 玩家弹跳
                     self.player.vy = -400  # 减小弹跳高度
@@ -880,6 +1185,13 @@ class Game(GameBase):
                     dx = player_center_x - enemy_center_x
                     dy = player_center_y - enemy_center_y
                     
+                    # 在接触点发射击中火花
+                    self.particles.emit_sparks(
+                        (player_center_x + enemy_center_x) / 2,
+                        (player_center_y + enemy_center_y) / 2,
+                        1 if dx > 0 else -1
+                    )
+                    
                     # 确定击退方向（从敌人到玩家的方向）
                     knockback_direction = -1 if dx > 0 else 1  # 反转方向
                     
@@ -926,65 +1238,27 @@ class Game(GameBase):
         if not self.gamemap or not self.gamemap.levels:
             return []
         
-        level_data = self.gamemap.levels[level_index]
-        level_width = len(level_data[0]) * self.gamemap.tile_size
-        level_start_x = level_index * level_width
+        tile_size = self.gamemap.tile_size
+        min_area_width = 3 * tile_size  # 最小区域宽度
         
-        # 找出所有可能的生成区域
+        # 最低的地面上方至少有两格空间的连续列
         valid_areas = []
-        current_area_start = None
-        min_area_width = 3 * self.gamemap.tile_size  # 最小区域宽度
-        
-        # 遍历每一列
-        for x in range(len(level_data[0])):
-            world_x = level_start_x + x * self.gamemap.tile_size
-            
-            # 检查这一列是否适合生成敌人
-            is_valid = False
-            for y in range(len(level_data) - 1, -1, -1):
-                if level_data[y][x] in [self.gamemap.WALL, self.gamemap.PLATFORM]:
-                    # 检查上方是否有足够空间
-                    if y > 1 and all(level_data[y-i][x] == self.gamemap.EMPTY for i in range(1, 3)):
-                        is_valid = True
-                    break
-            
-            # 处理区域
-            if is_valid:
-                if current_area_start is None:
-                    current_area_start = world_x
-            elif current_area_start is not None:
-                area_width = world_x - current_area_start
-                if area_width >= min_area_width:
-                    valid_areas.append((current_area_start, world_x))
-                current_area_start = None
-        
-        # 处理最后一个区域
-        if current_area_start is not None:
-            area_width = level_start_x + level_width - current_area_start
-            if area_width >= min_area_width:
-                valid_areas.append((current_area_start, level_start_x + level_width))
+        for first_col, last_col in self.gamemap.surface_index.get_ground_runs(level_index, 2):
+            start_x = first_col * tile_size
+            end_x = (last_col + 1) * tile_size
+            if end_x - start_x >= min_area_width:
+                valid_areas.append((start_x, end_x))
         
         return valid_areas
 
-    def _render_health_bar(self):
-        """渲染玩家血量条"""
-        # 血量条位置和大小
+    def _get_health_bar_value(self):
+        """获取血量条的显示状态"""
         bar_width = 200
-        bar_height = 20
-        x = 10
-        y = 10
         
         # 计算当前血量比例
         health_ratio = self.player.health / self.player.max_health
         current_width = int(bar_width * health_ratio)
         
-        # 绘制背景（深灰色）
-        pygame.draw.rect(
-            self.screen,
-            (50, 50, 50),
-            (x, y, bar_width, bar_height)
-        )
-        
         # 根据血量比例选择颜色
         if health_ratio > 0.7:
             color = (0, 255, 0)  # 绿色
@@ -992,39 +1266,53 @@ class Game(GameBase):
             color = (255, 255, 0)  # 黄色
         else:
             color = (255, 0, 0)  # 红色
+            
+        health_text = f"{int(self.player.health)}/{self.player.max_health}"
+        return current_width, color, health_text
+        
+    def _draw_health_bar(self, surface, value):
+        """将玩家血量条绘制到HUD表面
+        Returns:
+            pygame.Rect: 绘制区域
+        """
+        current_width, color, health_text = value
+        
+        # 血量条位置和大小
+        bar_width = 200
+        bar_height = 20
+        x = 10
+        y = 10
+        
+        # 绘制背景（深灰色）
+        pygame.draw.rect(
+            surface,
+            (50, 50, 50),
+            (x, y, bar_width, bar_height)
+        )
         
         # 绘制当前血量（有颜色的部分）
         if current_width > 0:
             pygame.draw.rect(
-                self.screen,
+                surface,
                 color,
                 (x, y, current_width, bar_height)
             )
         
         # 绘制边框
         pygame.draw.rect(
-            self.screen,
+            surface,
             (200, 200, 200),
             (x, y, bar_width, bar_height),
             2
         )
         
         # 显示具体数值
-        health_text = f"{int(self.player.health)}/{self.player.max_health}"
-        font = pygame.font.Font(None, 24)
-        text_surface = font.render(health_text, True, (255, 255, 255))
+        text_surface = self.view.get_font(24).render(health_text, True, (255, 255, 255))
         text_rect = text_surface.get_rect()
         text_rect.center = (x + bar_width // 2, y + bar_height // 2)
-        self.screen.blit(text_surface, text_rect)
+        surface.blit(text_surface, text_rect)
         
-        # 如果玩家受伤，显示红色边缘效果
-        if self.player.invincible_time > pygame.time.get_ticks() / 1000.0:
-            alpha = int(((self.player.invincible_time - pygame.time.get_ticks() / 1000.0) 
-                        / self.player.invincible_duration) * 128)
-            damage_surface = pygame.Surface((self.screen.get_width(), self.screen.get_height()))
-            damage_surface.fill((255, 0, 0))
-            damage_surface.set_alpha(alpha)
-            self.screen.blit(damage_surface, (0, 0))
+        return pygame.Rect(x, y, bar_width, bar_height)
 
     def spawn_projectile(self, x, y, vx, vy, damage, source):
         """生成投射物
@@ -1034,64 +1322,71 @@ class Game(GameBase):
             damage: 伤害值
             source: 来源('player' or 'enemy')
         """
-        projectile = {
-            'x': x, 'y': y,
-            'vx': vx, 'vy': vy,
-            'damage': damage,
-            'source': source,
-            'radius': 5,  # 投射物大小
-            'lifetime': 2.0  # 存活时间
-        }
-        self.projectiles.append(projectile)
+        self.projectiles.spawn(x, y, vx, vy, damage, source)
         
     def _update_projectiles(self, dt):
         """更新所有投射物"""
-        for projectile in self.projectiles[:]:
-            # 更新位置
-            projectile['x'] += projectile['vx'] * dt
-            projectile['y'] += projectile['vy'] * dt
-            projectile['lifetime'] -= dt
+        # 批量积分、扫掠碰撞并删除撞墙或过期的投射物
+        impacts = self.projectiles.update(dt)
+        for x, y, source in impacts.tolist():
+            self.particles.emit_sparks(x, y, count=6)
+            # 敌人的投射物撞墙不会暴露玩家的位置
+            self.gamemap.noise.emit(x, y, 0.6, 'player' if source == ProjectileStore.SOURCE_PLAYER else 'enemy')
             
-            # 检查碰撞
-            if self.gamemap.is_solid(projectile['x'], projectile['y']):
-                self.projectiles.remove(projectile)
-                continue
-                
-            # 检查生命周期
-            if projectile['lifetime'] <= 0:
-                self.projectiles.remove(projectile)
+        # 检查与敌人和玩家的碰撞
+        self._check_projectile_enemy_collisions()
+        self._check_projectile_player_collision()
+        
+    def _check_projectile_enemy_collisions(self):
+        """检查玩家投射物是否击中敌人(通过空间哈希只检查投射物附近的敌人)"""
+        projectiles = self.projectiles
+        spatial_hash = self.gamemap.spatial_hash
+        hits = []
+        for index in projectiles.find_source('player').tolist():
+            x = float(projectiles.x[index])
+            y = float(projectiles.y[index])
+            nearby = spatial_hash.query_radius(x, y, float(projectiles.radius[index]))
+            if not nearby:
                 continue
-                
-            # 检查与玩家的碰撞
-            if projectile['source'] == 'enemy':
-                if self._check_projectile_player_collision(projectile):
-                    self.projectiles.remove(projectile)
+            enemy = nearby[0]
+            enemy.take_damage(float(projectiles.damage[index]))
+            self.particles.emit_sparks(x, y, 1 if projectiles.vx[index] > 0 else -1)
+            hits.append(index)
+        if hits:
+            projectiles.remove_many(hits)
                     
-    def _check_projectile_player_collision(self, projectile):
-        """检查投射物是否击中玩家"""
-        if pygame.time.get_ticks() / 1000.0 < self.player.invincible_time:
+    def _check_projectile_player_collision(self):
+        """检查敌人投射物是否击中玩家"""
+        if self.timers.now < self.player.invincible_time:
             return False
             
         # 简单的圆形碰撞检测
-        dx = projectile['x'] - (self.player.x + self.player.width/2)
-        dy = projectile['y'] - (self.player.y + self.player.height/2)
-        dist = math.sqrt(dx * dx + dy * dy)
-        
-        if dist < projectile['radius'] + self.player.width/2:
-            # 击中玩家
-            self.player.take_damage(projectile['damage'])
-            
-            # 计算击退
-            knockback_x = dx / dist * 300
-            knockback_y = -200
-            self.player.vx = knockback_x
-            self.player.vy = knockback_y
-            
-            # 设置无敌时间
-            self.player.invincible_time = pygame.time.get_ticks() / 1000.0 + 0.5
-            return True
+        center_x = self.player.x + self.player.width/2
+        center_y = self.player.y + self.player.height/2
+        hits = self.projectiles.find_hits(center_x, center_y, self.player.width/2, 'enemy')
+        if len(hits) == 0:
+            return False
             
-        return False
+        # 击中玩家(之后进入无敌时间，同一帧只结算一发)
+        index = hits[0]
+        projectiles = self.projectiles
+        px, py = float(projectiles.x[index]), float(projectiles.y[index])
+        self.player.take_damage(float(projectiles.damage[index]))
+        self.particles.emit_sparks(px, py, 1 if projectiles.vx[index] > 0 else -1)
+        
+        # 计算击退
+        dx = px - center_x
+        dy = py - center_y
+        dist = max(math.sqrt(dx * dx + dy * dy), 1e-6)
+        knockback_x = dx / dist * 300
+        knockback_y = -200
+        self.player.vx = knockback_x
+        self.player.vy = knockback_y
+        
+        # 设置无敌时间
+        self.player.invincible_time = self.timers.now + 0.5
+        projectiles.remove(index)
+        return True
 
 
 class gamemap:
@@ -1174,9 +1469,38 @@ class gamemap:
             self.BRICK: {'health': 3},         # 砖块耐久度
         }
 
+        # 整个世界的砖块网格 [行, 列]，供批量查询使用
+        self.tile_grid = self._build_tile_grid()
+        self.solid_grid = np.isin(self.tile_grid, (self.WALL, self.PLATFORM))
+        self._solid_rows = self.solid_grid.tolist()   # 标量查询用的列表副本
+        self._build_solid_table()
+        
+        self.tile_version = 0        # 砖块每次变化时递增
+        self.tile_listeners = []     # 砖块变化回调 listener(col, row)
+        
         self.spatial_hash = SpatialHash(self.tile_size)
+        self.surface_index = SurfaceIndex(self)  # 可站立表面索引
+        self.tile_listeners.append(self.surface_index.on_tile_changed)
+        # 敌人导航图，跳跃边按最弱的跳跃和最慢的速度验证，所有原型都能跟上
+        archetypes = AIArchetype.all()
+        self.nav_graph = NavGraph(
+            self, Enemy.WIDTH, Enemy.HEIGHT,
+            jump_force=max(archetype.jump_force for archetype in archetypes),
+            gravity=Enemy.GRAVITY,
+            max_fall_speed=Enemy.MAX_FALL_SPEED,
+            run_speed=min(archetype.move_speed for archetype in archetypes),
+        )
+        self.nav_graph.build()
+        self.tile_listeners.append(self.nav_graph.on_tile_changed)
+        self.path_service = PathService(self.nav_graph)  # 后台寻路服务
+        # 以玩家为中心的视野，覆盖所有原型中最大的检测距离
+        self.player_fov = FieldOfView(self, max(archetype.detection_range for archetype in archetypes))
+        # 共享的声音场，响度为1的声音传到所有原型中最大的听觉范围
+        self.noise = NoiseField(self, max(archetype.hearing_range for archetype in archetypes))
+        self.influence = InfluenceMap(self)  # 威胁、玩家出没和敌人密度影响图
         self._tile_cache = {}
         self._solid_cache = {}
+        self._tile_surfaces = {}  # 预渲染的砖块表面 (类型, 尺寸) -> Surface
 
     def _create_default_levels(self):
         """创建默认关卡数据，确保关卡之间可以无缝连"""
@@ -1242,6 +1566,211 @@ class gamemap:
             print(f"加载地图文件失败: {e}")
             return None
 
+    def _build_tile_grid(self):
+        """将所有关卡横向拼接为一个世界网格"""
+        return np.hstack([np.asarray(level, dtype=np.int8) for level in self.levels])
+
+    def is_solid_array(self, xs, ys):
+        """批量检查多个世界坐标是否为实心砖块
+        Args:
+            xs, ys: 坐标数组
+        Returns:
+            np.ndarray: 布尔数组(边界外视为墙)
+        """
+        tile_x = np.floor_divide(xs, self.tile_size).astype(np.int64)
+        tile_y = np.floor_divide(ys, self.tile_size).astype(np.int64)
+        rows, cols = self.solid_grid.shape
+        inside = (tile_x >= 0) & (tile_x < cols) & (tile_y >= 0) & (tile_y < rows)
+        result = np.ones(tile_x.shape, dtype=bool)
+        result[inside] = self.solid_grid[tile_y[inside], tile_x[inside]]
+        return result
+
+    def raycast(self, x0, y0, x1, y1):
+        """沿线段做网格遍历(Amanatides-Woo)，每个经过的砖块只检查一次
+        Args:
+            x0, y0: 起点世界坐标
+            x1, y1: 终点世界坐标
+        Returns:
+            tuple: 第一个实心砖块 (列, 行, 距起点的距离)；没有遮挡时为None(边界外视为墙)
+        """
+        tile_size = self.tile_size
+        solid_rows = self._solid_rows
+        rows, cols = self.solid_grid.shape
+        dx = x1 - x0
+        dy = y1 - y0
+        length = math.hypot(dx, dy)
+        col = int(x0 // tile_size)
+        row = int(y0 // tile_size)
+        end_col = int(x1 // tile_size)
+        end_row = int(y1 // tile_size)
+
+        # t为线段参数(0到1)，t_max为下一次穿过竖直/水平网格线时的t，t_delta为穿过一整格的t
+        step_col = 1 if dx > 0 else -1
+        step_row = 1 if dy > 0 else -1
+        if dx:
+            t_max_x = ((col + (dx > 0)) * tile_size - x0) / dx
+            t_delta_x = tile_size / abs(dx)
+        else:
+            t_max_x = t_delta_x = math.inf
+        if dy:
+            t_max_y = ((row + (dy > 0)) * tile_size - y0) / dy
+            t_delta_y = tile_size / abs(dy)
+        else:
+            t_max_y = t_delta_y = math.inf
+
+        t = 0.0
+        for _ in range(abs(end_col - col) + abs(end_row - row) + 1):
+            if not (0 <= row < rows and 0 <= col < cols) or solid_rows[row][col]:
+                return (col, row, t * length)
+            if t_max_x < t_max_y:
+                t = t_max_x
+                t_max_x += t_delta_x
+                col += step_col
+            else:
+                t = t_max_y
+                t_max_y += t_delta_y
+                row += step_row
+        return None
+
+    def raycast_batch(self, x0, y0, x1, y1):
+        """批量网格遍历，所有射线同步前进一格
+        Args:
+            x0, y0: 起点坐标数组
+            x1, y1: 终点坐标数组
+        Returns:
+            tuple: (是否被遮挡, 遮挡砖块列, 遮挡砖块行, 距离)数组；没有遮挡的射线距离为线段长度
+        """
+        tile_size = self.tile_size
+        x0 = np.asarray(x0, dtype=np.float64)
+        y0 = np.asarray(y0, dtype=np.float64)
+        dx = np.asarray(x1, dtype=np.float64) - x0
+        dy = np.asarray(y1, dtype=np.float64) - y0
+        length = np.hypot(dx, dy)
+        col = np.floor_divide(x0, tile_size).astype(np.int64)
+        row = np.floor_divide(y0, tile_size).astype(np.int64)
+        end_col = np.floor_divide(x0 + dx, tile_size).astype(np.int64)
+        end_row = np.floor_divide(y0 + dy, tile_size).astype(np.int64)
+
+        step_col = np.where(dx > 0, 1, -1)
+        step_row = np.where(dy > 0, 1, -1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_max_x = np.where(dx != 0, ((col + (dx > 0)) * tile_size - x0) / dx, np.inf)
+            t_max_y = np.where(dy != 0, ((row + (dy > 0)) * tile_size - y0) / dy, np.inf)
+            t_delta_x = np.where(dx != 0, tile_size / np.abs(dx), np.inf)
+            t_delta_y = np.where(dy != 0, tile_size / np.abs(dy), np.inf)
+
+        count = len(x0)
+        t = np.zeros(count)
+        hit = np.zeros(count, dtype=bool)
+        hit_col = np.zeros(count, dtype=np.int64)
+        hit_row = np.zeros(count, dtype=np.int64)
+        distance = length.copy()
+        active = np.ones(count, dtype=bool)
+        rows, cols = self.solid_grid.shape
+        max_steps = int((np.abs(end_col - col) + np.abs(end_row - row)).max(initial=0)) + 1
+
+        for _ in range(max_steps):
+            idx = np.flatnonzero(active)
+            if len(idx) == 0:
+                break
+            c = col[idx]
+            r = row[idx]
+            inside = (c >= 0) & (c < cols) & (r >= 0) & (r < rows)
+            solid = np.ones(len(idx), dtype=bool)
+            solid[inside] = self.solid_grid[r[inside], c[inside]]
+
+            # 记录遮挡，到达终点所在格子的射线结束
+            blocked = idx[solid]
+            hit[blocked] = True
+            hit_col[blocked] = c[solid]
+            hit_row[blocked] = r[solid]
+            distance[blocked] = t[blocked] * length[blocked]
+            finished = solid | ((c == end_col[idx]) & (r == end_row[idx]))
+            active[idx[finished]] = False
+
+            # 其余射线前进一格
+            idx = idx[~finished]
+            move_x = t_max_x[idx] < t_max_y[idx]
+            along_x = idx[move_x]
+            along_y = idx[~move_x]
+            t[along_x] = t_max_x[along_x]
+            t_max_x[along_x] += t_delta_x[along_x]
+            col[along_x] += step_col[along_x]
+            t[along_y] = t_max_y[along_y]
+            t_max_y[along_y] += t_delta_y[along_y]
+            row[along_y] += step_row[along_y]
+
+        return hit, hit_col, hit_row, distance
+
+    def _build_solid_table(self):
+        """构建实心砖块的二维前缀和表
+        solid_table[r][c]为第0..r-1行、第0..c-1列中实心砖块的数量，矩形计数只需要四次查表。
+        """
+        rows, cols = self.solid_grid.shape
+        self.solid_table = np.zeros((rows + 1, cols + 1), dtype=np.int32)
+        self.solid_table[1:, 1:] = self.solid_grid.cumsum(axis=0).cumsum(axis=1)
+        self._solid_table_rows = self.solid_table.tolist()   # 标量查询用的列表副本
+
+    def count_solid_tiles(self, col0, row0, col1, row1):
+        """统计格子矩形(含两端)内实心砖块的数量
+        Args:
+            col0, row0: 左上角格子
+            col1, row1: 右下角格子
+        Returns:
+            int: 实心砖块数(边界外的格子视为墙)
+        """
+        if col1 < col0 or row1 < row0:
+            return 0
+        rows, cols = self.solid_grid.shape
+        total = (col1 - col0 + 1) * (row1 - row0 + 1)
+        left, top = max(col0, 0), max(row0, 0)
+        right, bottom = min(col1, cols - 1), min(row1, rows - 1)
+        if right < left or bottom < top:
+            return total
+        table = self._solid_table_rows
+        inside = (table[bottom + 1][right + 1] - table[top][right + 1]
+                  - table[bottom + 1][left] + table[top][left])
+        return inside + total - (right - left + 1) * (bottom - top + 1)
+
+    def is_rect_solid(self, x, y, width, height):
+        """检查像素矩形内是否有实心砖块
+        Args:
+            x, y: 左上角世界坐标
+            width, height: 大小，覆盖(x, y)到(x + width - 1, y + height - 1)的所有点
+        Returns:
+            bool: 是否有实心砖块(边界外视为墙)
+        """
+        tile_size = self.tile_size
+        return self.count_solid_tiles(
+            int(x // tile_size), int(y // tile_size),
+            int((x + width - 1) // tile_size), int((y + height - 1) // tile_size)
+        ) > 0
+
+    def set_tile(self, col, row, tile):
+        """修改世界网格中的砖块
+        Args:
+            col, row: 世界网格坐标
+            tile: 新的砖块类型
+        """
+        rows, cols = self.tile_grid.shape
+        if not (0 <= col < cols and 0 <= row < rows) or self.tile_grid[row, col] == tile:
+            return
+        level_cols = len(self.levels[0][0])
+        self.levels[col // level_cols][row][col % level_cols] = tile
+        self.tile_grid[row, col] = tile
+        solid = tile in (self.WALL, self.PLATFORM)
+        if solid != self.solid_grid[row, col]:
+            # 只有右下方的前缀和受影响
+            self.solid_grid[row, col] = solid
+            self._solid_rows[row][col] = solid
+            self.solid_table[row + 1:, col + 1:] += 1 if solid else -1
+            self._solid_table_rows[row + 1:] = self.solid_table[row + 1:].tolist()
+        self._tile_cache.clear()
+        self._solid_cache.clear()
+        self.tile_version += 1
+        for listener in self.tile_listeners:
+            listener(col, row)
+
     def get_current_level_index(self, x):
         """根据x坐标获取当前关卡索引"""
         return int(x // self.level_width)
@@ -1279,8 +1808,10 @@ class gamemap:
 
     def render_level(self, camera_offset=(0, 0)):
         """渲染可见范围内的关卡"""
-        screen_width = self.game.screen.get_width()
-        screen_height = self.game.screen.get_height()
+        # 渲染目标相对世界坐标的缩放比例
+        scale = self.game.render_scale
+        screen_width = self.game.screen.get_width() / scale
+        screen_height = self.game.screen.get_height() / scale
         camera_x, camera_y = camera_offset
         
         # 增加缓冲区，防止突然的视野变化
@@ -1299,6 +1830,10 @@ class gamemap:
         end_level = min(len(self.levels), 
                        self.get_current_level_index(visible_rect.right) + 1)
         
+        # 按渲染比例缩放后的砖块大小
+        draw_size = max(1, round(self.tile_size * scale))
+        screen = self.game.screen
+        
         # 渲染每个可见的关卡
         for level_index in range(start_level, end_level):
             level_data = self.levels[level_index]
@@ -1318,22 +1853,37 @@ class gamemap:
 
             # 更新渲染砖块的部分
             for y in range(start_y, end_y):
+                screen_y = int((y * self.tile_size - camera_y) * scale)
                 for x in range(start_x, end_x):
                     tile = level_data[y][x]
                     if tile != self.EMPTY:
-                        screen_x = level_offset_x + x * self.tile_size - camera_x
-                        screen_y = y * self.tile_size - camera_y
-                        self.render_tile(tile, screen_x, screen_y)
+                        screen_x = int((level_offset_x + x * self.tile_size - camera_x) * scale)
+                        screen.blit(self._get_tile_surface(tile, draw_size), (screen_x, screen_y))
+
+    def _get_tile_surface(self, tile, size):
+        """获取预渲染的砖块表面(按类型和尺寸缓存)"""
+        cache_key = (tile, size)
+        surface = self._tile_surfaces.get(cache_key)
+        if surface is None:
+            surface = pygame.Surface((self.tile_size, self.tile_size), pygame.SRCALPHA)
+            self.render_tile(tile, 0, 0, surface)
+            if size != self.tile_size:
+                surface = pygame.transform.smoothscale(surface, (size, size))
+            self._tile_surfaces[cache_key] = surface
+        return surface
 
-    def render_tile(self, tile, screen_x, screen_y):
+    def render_tile(self, tile, screen_x, screen_y, surface=None):
         """渲染单个砖块
         Args:
             tile: 砖块类型
             screen_x: 屏幕X坐标
             screen_y: 屏幕Y坐标
+            surface: 目标表面，默认为游戏屏幕
         """
         if tile == self.EMPTY:
             return
+        if surface is None:
+            surface = self.game.screen
             
         main_rect = pygame.Rect(
             screen_x, screen_y,
@@ -1349,12 +1899,12 @@ class gamemap:
                 (screen_x, screen_y + self.tile_size)  # 左下
             ]
             pygame.draw.polygon(
-                self.game.screen,
+                surface,
                 self.tile_colors[tile],
                 spike_points
             )
             pygame.draw.polygon(
-                self.game.screen,
+                surface,
                 self.tile_border_colors[tile],
                 spike_points,
                 2
@@ -1369,12 +1919,12 @@ class gamemap:
                 (screen_x + 15, screen_y + 10)  # 左上
             ]
             pygame.draw.polygon(
-                self.game.screen,
+                surface,
                 self.tile_colors[tile],
                 bounce_points
             )
             pygame.draw.polygon(
-                self.game.screen,
+                surface,
                 self.tile_border_colors[tile],
                 bounce_points,
                 2
@@ -1390,36 +1940,36 @@ class gamemap:
                 wave_points.append((x, y))
             wave_points.append((screen_x + self.tile_size, screen_y + self.tile_size))
             pygame.draw.polygon(
-                self.game.screen,
+                surface,
                 self.tile_colors[tile],
                 wave_points
             )
             
         elif tile == self.WATER:
             # 绘制水面（半透明）
-            surface = pygame.Surface((self.tile_size, self.tile_size), pygame.SRCALPHA)
-            pygame.draw.rect(surface, (*self.tile_colors[tile][:3], 128), 
+            water_surface = pygame.Surface((self.tile_size, self.tile_size), pygame.SRCALPHA)
+            pygame.draw.rect(water_surface, (*self.tile_colors[tile][:3], 128), 
                            (0, 0, self.tile_size, self.tile_size))
-            self.game.screen.blit(surface, main_rect)
+            surface.blit(water_surface, main_rect)
             
         elif tile == self.GLASS:
             # 绘制玻璃（半透明带边框）
-            surface = pygame.Surface((self.tile_size, self.tile_size), pygame.SRCALPHA)
-            pygame.draw.rect(surface, self.tile_colors[tile], 
+            glass_surface = pygame.Surface((self.tile_size, self.tile_size), pygame.SRCALPHA)
+            pygame.draw.rect(glass_surface, self.tile_colors[tile], 
                            (0, 0, self.tile_size, self.tile_size))
-            pygame.draw.rect(surface, self.tile_border_colors[tile], 
+            pygame.draw.rect(glass_surface, self.tile_border_colors[tile], 
                            (0, 0, self.tile_size, self.tile_size), 2)
-            self.game.screen.blit(surface, main_rect)
+            surface.blit(glass_surface, main_rect)
             
         elif tile == self.BRICK:
             # 绘制砖块（带纹理）
-            self.game.view.draw_rect(self.tile_colors[tile], main_rect)
+            pygame.draw.rect(surface, self.tile_colors[tile], main_rect)
             # 绘制砖块纹理
             brick_height = self.tile_size // 4
             for i in range(4):
                 y = screen_y + i * brick_height
                 pygame.draw.line(
-                    self.game.screen,
+                    surface,
                     self.tile_border_colors[tile],
                     (screen_x, y),
                     (screen_x + self.tile_size, y),
@@ -1427,7 +1977,7 @@ class gamemap:
                 )
                 if i % 2 == 0:
                     pygame.draw.line(
-                        self.game.screen,
+                        surface,
                         self.tile_border_colors[tile],
                         (screen_x + self.tile_size//2, y),
                         (screen_x + self.tile_size//2, y + brick_height),
@@ -1436,8 +1986,8 @@ class gamemap:
             
         else:
             # 默认砖块渲染
-            self.game.view.draw_rect(self.tile_colors[tile], main_rect)
-            self.game.view.draw_rect(self.tile_border_colors[tile], main_rect, 2)
+            pygame.draw.rect(surface, self.tile_colors[tile], main_rect)
+            pygame.draw.rect(surface, self.tile_border_colors[tile], main_rect, 2)
             
             # 添加高光效果
             highlight_rect = pygame.Rect(
@@ -1446,7 +1996,7 @@ class gamemap:
                 self.tile_size - 4,
                 self.tile_size - 4
             )
-            self.game.view.draw_rect(self.tile_highlight_colors[tile], highlight_rect)
+            pygame.draw.rect(surface, self.tile_highlight_colors[tile], highlight_rect)
 
     def is_solid(self, x, y):
         """检查指定位置是否为实心砖块"""
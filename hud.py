@@ -0,0 +1,131 @@
+import pygame
+
+
+_UNSET = object()  # 元素尚未绘制时的占位值
+
+
+class HUDElement:
+    """HUD元素，缓存上一次的值，只有值变化时才重新绘制"""
+    def __init__(self, name, value_func, draw_func, refresh_interval=0.0):
+        """
+        name: 元素名称
+        value_func: 返回元素当前值的函数(值需可比较)
+        draw_func: 绘制函数 draw_func(surface, value)，返回绘制区域Rect
+        refresh_interval: 最小刷新间隔(秒)，0表示每帧检查
+        """
+        self.name = name
+        self.value_func = value_func
+        self.draw_func = draw_func
+        self.refresh_interval = refresh_interval
+        self.enabled = True
+
+        self.value = _UNSET
+        self.rect = None          # 上一次绘制占用的区域
+        self.next_refresh = 0     # 下次允许刷新的时间
+
+
+class HUDCompositor:
+    """HUD合成器
+
+    HUD内容保存在一张常驻的透明表面上，每个元素只在其值变化时
+    (或达到限定的刷新频率时)重绘自己的区域，每帧只需一次blit。
+    """
+    def __init__(self, size):
+        self.size = size
+        self.surface = pygame.Surface(size, pygame.SRCALPHA)
+        self.elements = []
+        self._elements_by_name = {}
+        self._bounds = None       # 所有元素占用区域的并集
+
+        # 预分配的受伤闪屏覆盖层
+        self.flash_surface = pygame.Surface(size)
+        self.flash_surface.fill((255, 0, 0))
+        self._flash_alpha = 0
+
+    def add_element(self, name, value_func, draw_func, refresh_interval=0.0):
+        """添加HUD元素
+        Args:
+            name: 元素名称
+            value_func: 取值函数
+            draw_func: 绘制函数，返回绘制区域Rect
+            refresh_interval: 最小刷新间隔(秒)
+        Returns:
+            HUDElement对象
+        """
+        element = HUDElement(name, value_func, draw_func, refresh_interval)
+        self.elements.append(element)
+        self._elements_by_name[name] = element
+        return element
+
+    def set_enabled(self, name, enabled):
+        """启用或隐藏指定元素"""
+        element = self._elements_by_name.get(name)
+        if element is None or element.enabled == enabled:
+            return
+        element.enabled = enabled
+        if not enabled:
+            self._clear_element(element)
+            element.value = _UNSET
+        else:
+            element.next_refresh = 0
+
+    def invalidate(self, name=None):
+        """强制元素在下次更新时重绘"""
+        targets = self.elements if name is None else [self._elements_by_name[name]]
+        for element in targets:
+            element.value = _UNSET
+            element.next_refresh = 0
+
+    def _clear_element(self, element):
+        """清除元素上一次绘制的区域"""
+        if element.rect:
+            self.surface.fill((0, 0, 0, 0), element.rect)
+            element.rect = None
+            self._recompute_bounds()
+
+    def _recompute_bounds(self):
+        """重新计算内容区域"""
+        rects = [e.rect for e in self.elements if e.rect]
+        self._bounds = rects[0].unionall(rects[1:]) if rects else None
+
+    def update(self, current_time):
+        """检查元素的值，只重绘变化的元素
+        Args:
+            current_time: 当前时间(秒)
+        """
+        changed = []
+        for element in self.elements:
+            if not element.enabled or current_time < element.next_refresh:
+                continue
+            element.next_refresh = current_time + element.refresh_interval
+
+            value = element.value_func()
+            if value != element.value:
+                changed.append((element, value))
+
+        if not changed:
+            return
+
+        # 先清除所有旧区域再统一重绘，避免元素移动后互相擦除
+        for element, _ in changed:
+            if element.rect:
+                self.surface.fill((0, 0, 0, 0), element.rect)
+        for element, value in changed:
+            element.value = value
+            element.rect = element.draw_func(self.surface, value)
+        self._recompute_bounds()
+
+    def set_flash(self, alpha):
+        """设置受伤闪屏透明度(0表示关闭)"""
+        alpha = max(0, min(255, int(alpha)))
+        if alpha != self._flash_alpha:
+            self._flash_alpha = alpha
+            if alpha:
+                self.flash_surface.set_alpha(alpha)
+
+    def render(self, screen):
+        """将HUD合成到屏幕上"""
+        if self._flash_alpha:
+            screen.blit(self.flash_surface, (0, 0))
+        if self._bounds:
+            screen.blit(self.surface, self._bounds.topleft, self._bounds)
@@ -0,0 +1,229 @@
+import math
+import numpy as np
+
+
+class InfluenceMap:
+    """低分辨率影响图
+
+    按砖块分辨率维护三层影响：玩家威胁(threat)、玩家近期出没(presence)和敌人密度(density)。
+    威胁和出没每帧用向量运算整体衰减并向相邻格扩散一步(取最大值)，实心砖块阻挡扩散；
+    敌人密度是累加的：每个敌人对曼哈顿距离d以内的格子贡献falloff^d，敌人自己所在格为1。
+    AI做撤退方向、搜索地点和包抄位置等决策时只需查询这些图，不必反复寻路。
+    """
+    LAYERS = ('threat', 'presence', 'density')
+
+    def __init__(self, game_map, threat_decay=2.0, presence_decay=0.15,
+                 threat_falloff=0.8, presence_falloff=0.6, density_falloff=0.5,
+                 density_spread=2):
+        """
+        game_map: 游戏地图
+        threat_decay: 威胁每秒的衰减速率
+        presence_decay: 出没痕迹每秒的衰减速率(较慢，作为玩家行踪的记忆)
+        threat_falloff, presence_falloff: 扩散到相邻格时保留的比例
+        density_falloff: 敌人密度每远一格保留的比例
+        density_spread: 敌人密度影响的范围(曼哈顿距离，格)
+        """
+        self.game_map = game_map
+        self.tile_size = game_map.tile_size
+        self.rows, self.cols = game_map.solid_grid.shape
+        self.threat_decay = threat_decay
+        self.presence_decay = presence_decay
+        self.threat_falloff = threat_falloff
+        self.presence_falloff = presence_falloff
+        self.density_falloff = density_falloff
+        self.density_spread = density_spread
+
+        shape = (self.rows, self.cols)
+        self.threat = np.zeros(shape, dtype=np.float32)
+        self.presence = np.zeros(shape, dtype=np.float32)
+        self.density = np.zeros(shape, dtype=np.float32)
+        self._neighbors = np.zeros(shape, dtype=np.float32)   # 扩散用的缓冲区
+        self._counts = np.zeros(shape, dtype=np.float32)      # 每格的敌人数
+        # 密度核：(行偏移, 列偏移, 权重)
+        self._density_kernel = [
+            (d_row, d_col, density_falloff ** (abs(d_row) + abs(d_col)))
+            for d_row in range(-density_spread, density_spread + 1)
+            for d_col in range(-density_spread, density_spread + 1)
+            if abs(d_row) + abs(d_col) <= density_spread
+        ]
+        self._tile_version = None
+        self._refresh_masks()
+
+    def _refresh_masks(self):
+        """按当前砖块计算可扩散和可站立的格子"""
+        solid = self.game_map.solid_grid
+        self.open = ~solid
+        # 可站立：自身不是实心且下方是实心
+        below = np.ones_like(solid)
+        below[:-1] = solid[1:]
+        self.standable = self.open & below
+        self._open_float = self.open.astype(np.float32)
+        self._tile_version = self.game_map.tile_version
+
+    def _spread(self, layer, falloff):
+        """向上下左右扩散一步：每格取自身和相邻格最大值乘以保留比例中的较大者"""
+        neighbors = self._neighbors
+        neighbors.fill(0)
+        np.maximum(neighbors[1:], layer[:-1], out=neighbors[1:])
+        np.maximum(neighbors[:-1], layer[1:], out=neighbors[:-1])
+        np.maximum(neighbors[:, 1:], layer[:, :-1], out=neighbors[:, 1:])
+        np.maximum(neighbors[:, :-1], layer[:, 1:], out=neighbors[:, :-1])
+        neighbors *= falloff
+        np.maximum(layer, neighbors, out=layer)
+        layer *= self._open_float
+
+    def _cell(self, x, y):
+        """世界坐标所在的格子 (列, 行)，超出地图时为None"""
+        col = int(x // self.tile_size)
+        row = int(y // self.tile_size)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return col, row
+        return None
+
+    def update(self, dt, player, enemies):
+        """衰减、标记并扩散所有影响层
+        Args:
+            dt: 帧时间
+            player: 玩家(为None时只衰减)
+            enemies: 活跃敌人列表
+        """
+        if self._tile_version != self.game_map.tile_version:
+            self._refresh_masks()
+
+        self.threat *= math.exp(-self.threat_decay * dt)
+        self.presence *= math.exp(-self.presence_decay * dt)
+        if player is not None:
+            center_x = player.x + player.width / 2
+            # 威胁标记在玩家身体中心，出没痕迹标记在脚下所在格
+            cell = self._cell(center_x, player.y + player.height / 2)
+            if cell:
+                self.threat[cell[1], cell[0]] = 1.0
+            cell = self._cell(center_x, player.y + player.height - 1)
+            if cell:
+                self.presence[cell[1], cell[0]] = 1.0
+        self._spread(self.threat, self.threat_falloff)
+        self._spread(self.presence, self.presence_falloff)
+
+        # 敌人密度每帧按当前位置重建(累加，附近的敌人越多越大)
+        density = self.density
+        density.fill(0)
+        if enemies:
+            tile_size = self.tile_size
+            positions = np.array([(enemy.x + enemy.width / 2, enemy.y + enemy.height / 2)
+                                  for enemy in enemies], dtype=np.float64)
+            cols = (positions[:, 0] // tile_size).astype(np.int64)
+            rows = (positions[:, 1] // tile_size).astype(np.int64)
+            inside = (cols >= 0) & (cols < self.cols) & (rows >= 0) & (rows < self.rows)
+            counts = self._counts
+            counts.fill(0)
+            np.add.at(counts, (rows[inside], cols[inside]), 1.0)
+            self._add_kernel(density, counts)
+            density *= self._open_float
+
+    def _add_kernel(self, out, counts):
+        """把每格的敌人数按密度核累加到out(按偏移平移整张数组)"""
+        rows, cols = self.rows, self.cols
+        for d_row, d_col, weight in self._density_kernel:
+            src_rows = slice(max(0, -d_row), rows - max(0, d_row))
+            dst_rows = slice(max(0, d_row), rows - max(0, -d_row))
+            src_cols = slice(max(0, -d_col), cols - max(0, d_col))
+            dst_cols = slice(max(0, d_col), cols - max(0, -d_col))
+            out[dst_rows, dst_cols] += weight * counts[src_rows, src_cols]
+
+    def sample(self, layer, x, y):
+        """查询某个位置的影响值
+        Args:
+            layer: 影响层名称('threat'、'presence'或'density')
+            x, y: 世界坐标
+        """
+        cell = self._cell(x, y)
+        if cell is None:
+            return 0.0
+        return float(getattr(self, layer)[cell[1], cell[0]])
+
+    def retreat_direction(self, x, y):
+        """沿威胁下降的方向撤退
+        Args:
+            x, y: 撤退者身体中心的世界坐标
+        Returns:
+            int: -1向左，1向右，0表示两侧威胁相同(或都被墙挡住)
+        """
+        cell = self._cell(x, y)
+        if cell is None:
+            return 0
+        col, row = cell
+        threat = self.threat
+        # 被墙挡住的一侧视为无法撤退
+        left = threat[row, col - 1] if col > 0 and self.open[row, col - 1] else np.inf
+        right = threat[row, col + 1] if col + 1 < self.cols and self.open[row, col + 1] else np.inf
+        if left == right:
+            return 0
+        return -1 if left < right else 1
+
+    def _window(self, col, row, radius):
+        """以格子为中心的方形窗口切片"""
+        row0, row1 = max(0, row - radius), min(self.rows, row + radius + 1)
+        col0, col1 = max(0, col - radius), min(self.cols, col + radius + 1)
+        return row0, row1, col0, col1
+
+    def find_search_spot(self, x, y, radius=6, min_presence=0.05):
+        """在某位置附近找玩家近期出没最多的可站立格子
+        Args:
+            x, y: 搜索中心的世界坐标
+            radius: 搜索半径(格)
+            min_presence: 低于该值的痕迹忽略
+        Returns:
+            tuple: 格子 (列, 行)，找不到时为None
+        """
+        cell = self._cell(x, y)
+        if cell is None:
+            return None
+        row0, row1, col0, col1 = self._window(cell[0], cell[1], radius)
+        scores = np.where(self.standable[row0:row1, col0:col1],
+                          self.presence[row0:row1, col0:col1], 0)
+        index = int(scores.argmax())
+        row, col = divmod(index, col1 - col0)
+        if scores[row, col] < min_presence:
+            return None
+        return col0 + col, row0 + row
+
+    def find_flank_spot(self, target_x, target_y, from_x, from_y, radius=4, density_weight=0.5):
+        """在目标附近找一个受威胁覆盖、敌人较少且离自己较近的可站立格子
+        Args:
+            target_x, target_y: 目标(玩家)身体中心的世界坐标
+            from_x, from_y: 包抄者身体中心的世界坐标
+            radius: 搜索半径(格)
+            density_weight: 敌人密度的惩罚权重
+        Returns:
+            tuple: 格子 (列, 行)，找不到时为None
+        """
+        cell = self._cell(target_x, target_y)
+        if cell is None:
+            return None
+        row0, row1, col0, col1 = self._window(cell[0], cell[1], radius)
+        threat = self.threat[row0:row1, col0:col1]
+        rows, cols = np.mgrid[row0:row1, col0:col1]
+        tile_size = self.tile_size
+        travel = np.hypot((cols + 0.5) * tile_size - from_x,
+                          (rows + 0.5) * tile_size - from_y) / (tile_size * radius * 4)
+        scores = threat - density_weight * self.density[row0:row1, col0:col1] - travel
+        scores = np.where(self.standable[row0:row1, col0:col1] & (threat > 0), scores, -np.inf)
+        index = int(scores.argmax())
+        row, col = divmod(index, col1 - col0)
+        if not np.isfinite(scores[row, col]):
+            return None
+        return col0 + col, row0 + row
+
+    def clear_area(self, layer, x, y, radius=1):
+        """清除某位置附近的影响(如已经搜索过的地点)"""
+        cell = self._cell(x, y)
+        if cell is None:
+            return
+        row0, row1, col0, col1 = self._window(cell[0], cell[1], radius)
+        getattr(self, layer)[row0:row1, col0:col1] = 0
+
+    def cell_position(self, cell, width, height):
+        """站在格子上的实体左上角坐标"""
+        col, row = cell
+        return (col * self.tile_size + (self.tile_size - width) / 2,
+                (row + 1) * self.tile_size - height)
@@ -0,0 +1,1046 @@
+import atexit
+import copy
+import heapq
+import math
+import os
+import queue
+import signal
+import threading
+import time
+from collections import OrderedDict
+
+
+class Waypoint(tuple):
+    """路径点(x, y)，kind记录到达该点的移动方式('start', 'walk', 'drop', 'jump')"""
+    def __new__(cls, x, y, kind='walk'):
+        point = super().__new__(cls, (x, y))
+        point.kind = kind
+        return point
+
+
+class NavGraph:
+    """平台跳跃导航图
+
+    节点是实体可以站立的砖块格(脚下是实心砖块且身体所在的格子为空)，
+    边分为行走、走下边缘后下落、以及跳跃弧线三类。跳跃弧线按实体碰撞箱、
+    起跳速度和重力逐步模拟验证，只有真正能落到目标节点上的弧线才会成为边。
+    节点和边按关卡构建(可以预先构建，也可以在第一次用到时构建)，砖块变化时只重建附近的列。
+    节点编号与砖块编号一致(行 * 列数 + 列)，搜索使用扁平数组。
+    起点和终点在不同关卡时交给ClusterGraph分层搜索。
+    """
+    WALK = 'walk'
+    DROP = 'drop'
+    JUMP = 'jump'
+
+    def __init__(self, game_map, width, height, jump_force, gravity, max_fall_speed, run_speed,
+                 max_iterations=2000, max_time_ms=3.0):
+        """
+        game_map: 游戏地图
+        width, height: 实体碰撞箱大小(Enemy.WIDTH, Enemy.HEIGHT)
+        jump_force: 起跳速度(所有AI原型都能跳到的jump_force)
+        gravity: 重力加速度(Enemy.GRAVITY)
+        max_fall_speed: 最大下落速度(Enemy.MAX_FALL_SPEED)
+        run_speed: 跳跃时的水平速度上限(所有AI原型都能达到的move_speed)
+        max_iterations: 单次搜索最多展开的节点数
+        max_time_ms: 单次搜索的时间预算(毫秒)
+        """
+        self.game_map = game_map
+        self.tile_size = game_map.tile_size
+        self.width = width
+        self.height = height
+        self.jump_force = jump_force
+        self.gravity = gravity
+        self.max_fall_speed = max_fall_speed
+        self.run_speed = run_speed
+        self.jump_speeds = (0.5, 1.0)      # 模拟的水平速度(相对run_speed)
+        self.sim_step = 1 / 30.0
+        self.max_iterations = max_iterations
+        self.max_time_ms = max_time_ms
+
+        self.rows, self.cols = game_map.solid_grid.shape
+        self.level_count = len(game_map.levels)
+        self.level_cols = self.cols // self.level_count
+        # 跳跃弧线的最大水平距离(列)，决定砖块变化时需要重建的范围
+        air_time = -2 * jump_force / gravity + 0.5
+        self.jump_reach = int(math.ceil(run_speed * air_time / self.tile_size)) + 1
+
+        size = self.rows * self.cols
+        self._solid = game_map.solid_grid.tolist()
+        self._pad = 4   # 跳跃最高不超过两格，水平和下方都有边界墙挡住
+        self._small_box = width <= self.tile_size and height <= self.tile_size
+        self._build_padded()
+        self.is_node = [False] * size
+        self.edges = [None] * size         # 节点编号 -> [(目标编号, 代价, 类型)]
+        self.built_levels = set()
+        self.version = 0                   # 节点或边每次变化时递增
+        self.max_flow_fields = 4
+        self._reset_caches()
+
+        self.last_result = None   # 'found' / 'partial' / 'failed'
+        self.stats = {
+            'searches': 0,
+            'expanded': 0,
+            'last_expanded': 0,
+            'last_ms': 0.0,
+            'partial': 0,
+            'failed': 0,
+            'nodes': 0,
+            'edges': 0,
+            'flow_fields': 0,     # 计算流场的次数
+            'hierarchical': 0,    # 走抽象图的远距离搜索次数
+        }
+
+    def _reset_caches(self):
+        """创建搜索缓冲区和派生数据的缓存"""
+        size = self.rows * self.cols
+        # 搜索缓冲区(按代数标记复用)
+        self._g = [0.0] * size
+        self._parent = [-1] * size
+        self._parent_kind = [None] * size
+        self._seen = [0] * size
+        self._closed = [0] * size
+        self._generation = 0
+
+        self._reverse_edges = None         # 反向邻接表(按version缓存)
+        self._reverse_version = -1
+        self._flow_fields = OrderedDict()  # 目标节点 -> FlowField
+        self.clusters = ClusterGraph(self)  # 跨关卡的抽象图
+
+    def snapshot(self):
+        """创建不引用游戏地图的副本
+        副本有自己的砖块网格和搜索缓冲区，可以交给工作线程或进程只读地寻路。
+        Returns:
+            NavGraph: 副本
+        """
+        graph = copy.copy(self)
+        graph.game_map = None
+        graph._solid = [row[:] for row in self._solid]
+        graph._build_padded()
+        graph.is_node = self.is_node[:]
+        graph.edges = self.edges[:]   # 每个节点的边列表只会整体替换，可以共用
+        graph.built_levels = set(self.built_levels)
+        graph.stats = dict(self.stats)
+        graph._reset_caches()
+        return graph
+
+    # ------------------------------------------------------------------
+    # 构建
+    # ------------------------------------------------------------------
+    def _is_blocked(self, row, col):
+        """格子是否实心(边界外视为墙)"""
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return self._solid[row][col]
+        return True
+
+    def _build_padded(self):
+        """四周加几圈墙的实心网格，碰撞箱检测时不用逐格判断边界"""
+        pad = self._pad
+        border = [True] * (self.cols + pad * 2)
+        self._padded = ([border] * pad +
+                        [[True] * pad + row + [True] * pad for row in self._solid] +
+                        [border] * pad)
+
+    def _box_blocked(self, x, y):
+        """碰撞箱是否与实心砖块重叠"""
+        tile_size = self.tile_size
+        pad = self._pad
+        left = int(x // tile_size) + pad
+        right = int((x + self.width - 1) // tile_size) + pad
+        top = int(y // tile_size) + pad
+        bottom = int((y + self.height - 1) // tile_size) + pad
+        if top < 0:
+            return True   # 超出地图上方很远
+        padded = self._padded
+        if self._small_box:
+            # 碰撞箱不超过一个砖块，最多覆盖2x2个格子
+            upper = padded[top]
+            lower = padded[bottom]
+            return upper[left] or upper[right] or lower[left] or lower[right]
+        for row in range(top, bottom + 1):
+            cells = padded[row]
+            for col in range(left, right + 1):
+                if cells[col]:
+                    return True
+        return False
+
+    def _compute_node(self, row, col):
+        """判断格子是否可以站立"""
+        if row + 1 >= self.rows or not self._is_blocked(row + 1, col):
+            return False
+        x, y = self.get_stand_position(row, col)
+        return not self._box_blocked(x, y)
+
+    def get_stand_position(self, row, col):
+        """站在节点上时实体左上角的世界坐标"""
+        return (col * self.tile_size + (self.tile_size - self.width) / 2,
+                (row + 1) * self.tile_size - self.height)
+
+    def _level_columns(self, level):
+        start = level * self.level_cols
+        return range(start, min(self.cols, start + self.level_cols))
+
+    def _ensure_level(self, level):
+        """确保关卡的节点和边已经构建"""
+        if level in self.built_levels or not 0 <= level < self.level_count:
+            return
+        self.built_levels.add(level)
+        columns = self._level_columns(level)
+        # 先确定本关及相邻列的节点，边可能跨越关卡边界
+        for col in range(max(0, columns.start - self.jump_reach),
+                         min(self.cols, columns.stop + self.jump_reach)):
+            for row in range(self.rows):
+                self.is_node[row * self.cols + col] = self._compute_node(row, col)
+        for col in columns:
+            self._build_column_edges(col)
+        self._update_counts()
+
+    def build(self):
+        """预先构建所有关卡"""
+        for level in range(self.level_count):
+            self._ensure_level(level)
+
+    def _build_column_edges(self, col):
+        """重建一列所有节点的出边"""
+        cols = self.cols
+        for row in range(self.rows):
+            node = row * cols + col
+            self.edges[node] = self._compute_edges(row, col) if self.is_node[node] else None
+
+    def _compute_edges(self, row, col):
+        """计算节点的所有出边"""
+        cols = self.cols
+        best = {}   # 目标 -> (代价, 类型)，同一目标只保留最便宜的边
+
+        def add(target, cost, kind):
+            if target not in best or cost < best[target][0]:
+                best[target] = (cost, kind)
+
+        for direction in (-1, 1):
+            side = col + direction
+            if 0 <= side < cols:
+                side_node = row * cols + side
+                if self._node_at(row, side):
+                    add(side_node, 1.0, self.WALK)
+                elif not self._box_blocked(*self._side_position(row, col, direction)):
+                    # 走下边缘后沿旁边一列下落
+                    landing = self._find_landing(row, side)
+                    if landing is not None:
+                        add(landing * cols + side, 1.0 + 0.5 * (landing - row), self.DROP)
+
+            for speed in self.jump_speeds:
+                target = self._simulate_jump(row, col, direction * speed * self.run_speed)
+                if target is None or target == row * cols + col:
+                    continue
+                target_row, target_col = divmod(target, cols)
+                if target_row == row and abs(target_col - col) <= 1:
+                    continue   # 走过去就行
+                add(target, 2.0 + abs(target_col - col) + abs(target_row - row) * 0.5, self.JUMP)
+
+        return [(target, cost, kind) for target, (cost, kind) in best.items()]
+
+    def _node_at(self, row, col):
+        """节点是否存在(所在关卡尚未构建时直接计算)"""
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            return False
+        return self.is_node[row * self.cols + col] or self._compute_node(row, col)
+
+    def _side_position(self, row, col, direction):
+        """走出边缘、完全进入旁边一列时的位置"""
+        x, y = self.get_stand_position(row, col)
+        return x + direction * self.tile_size, y
+
+    def _find_landing(self, row, col):
+        """沿一列下落，返回落地节点所在的行"""
+        for landing in range(row + 1, self.rows):
+            if self._is_blocked(landing, col):
+                return None
+            if self._node_at(landing, col):
+                return landing
+        return None
+
+    def _simulate_jump(self, row, col, vx):
+        """按实体物理模拟一次跳跃
+        Args:
+            row, col: 起跳节点
+            vx: 水平速度
+        Returns:
+            int: 落地节点编号，无法落到节点上时为None
+        """
+        dt = self.sim_step
+        x, y = self.get_stand_position(row, col)
+        start_y = y
+        vy = self.jump_force
+        max_drop = self.tile_size * 4
+        tile_size = self.tile_size
+
+        for _ in range(int(3.0 / dt)):
+            # 水平移动，撞墙时停在原地(速度保持，之后可能越过墙头)
+            new_x = x + vx * dt
+            if not self._box_blocked(new_x, y):
+                x = new_x
+
+            vy = min(vy + self.gravity * dt, self.max_fall_speed)
+            new_y = y + vy * dt
+            if self._box_blocked(x, new_y):
+                if vy < 0:
+                    vy = 0   # 撞到天花板
+                    continue
+                # 落地：站在碰撞箱底部所在砖块的上一行
+                stand_row = int((new_y + self.height - 1) // tile_size) - 1
+                for land_x in (x + self.width / 2, x, x + self.width - 1):
+                    land_col = int(land_x // tile_size)
+                    if self._node_at(stand_row, land_col):
+                        return stand_row * self.cols + land_col
+                return None
+            y = new_y
+            if y > start_y + max_drop:
+                return None
+        return None
+
+    def _update_counts(self):
+        self.version += 1
+        self.stats['nodes'] = sum(1 for node in self.is_node if node)
+        self.stats['edges'] = sum(len(edges) for edges in self.edges if edges)
+
+    def on_tile_changed(self, col, row):
+        """砖块变化时增量更新附近的节点和边"""
+        self._solid[row][col] = bool(self.game_map.solid_grid[row, col])
+        self._padded[row + self._pad][col + self._pad] = self._solid[row][col]
+        if not self.built_levels:
+            return
+        # 节点只取决于本列，能到达这一列的边都从jump_reach范围内出发
+        for rebuild_col in range(col - 1, col + 2):
+            if 0 <= rebuild_col < self.cols:
+                for node_row in range(self.rows):
+                    self.is_node[node_row * self.cols + rebuild_col] = self._compute_node(node_row, rebuild_col)
+        for source_col in range(max(0, col - self.jump_reach), min(self.cols, col + self.jump_reach + 1)):
+            if source_col // self.level_cols in self.built_levels:
+                self._build_column_edges(source_col)
+        self.clusters.invalidate(col - self.jump_reach, col + self.jump_reach)
+        self._update_counts()
+
+    # ------------------------------------------------------------------
+    # 搜索
+    # ------------------------------------------------------------------
+    def _nearest_node(self, x, y):
+        """找到实体位置(左上角)对应的节点，在空中时向下寻找落脚点"""
+        return self.node_at_feet(x + self.width / 2, y + self.height)
+
+    def node_at_feet(self, foot_x, foot_y):
+        """找到脚底位置对应的节点，在空中时向下寻找落脚点
+        Args:
+            foot_x, foot_y: 脚底中心的世界坐标
+        Returns:
+            int: 节点编号，找不到时为None
+        """
+        tile_size = self.tile_size
+        col = int(foot_x // tile_size)
+        row = int((foot_y - 1) // tile_size)
+        if not 0 <= col < self.cols:
+            return None
+        self._ensure_level(col // self.level_cols)
+        for node_row in range(max(0, row - 1), self.rows):
+            if self.is_node[node_row * self.cols + col]:
+                return node_row * self.cols + col
+            if node_row > row and self._is_blocked(node_row, col):
+                break
+        return None
+
+    def get_waypoint(self, node, kind='walk'):
+        """节点对应的路径点"""
+        row, col = divmod(node, self.cols)
+        x, y = self.get_stand_position(row, col)
+        return Waypoint(x, y, kind)
+
+    def _get_reverse_edges(self):
+        """反向邻接表：节点 -> [(来源节点, 代价, 类型)]"""
+        if self._reverse_version != self.version:
+            reverse = [None] * len(self.edges)
+            for source, edges in enumerate(self.edges):
+                if not edges:
+                    continue
+                for target, cost, kind in edges:
+                    if reverse[target] is None:
+                        reverse[target] = []
+                    reverse[target].append((source, cost, kind))
+            self._reverse_edges = reverse
+            self._reverse_version = self.version
+        return self._reverse_edges
+
+    def get_flow_field(self, target_pos):
+        """获取通往目标位置所在节点的共享流场
+        目标节点不变时直接复用，多个追击者共享同一个流场。
+        Args:
+            target_pos: 目标位置(实体左上角坐标)
+        Returns:
+            FlowField: 目标不在导航图上时为None
+        """
+        target = self._nearest_node(target_pos[0], target_pos[1])
+        if target is None:
+            return None
+        field = self._flow_fields.get(target)
+        if field is not None and field.version == self.version:
+            self._flow_fields.move_to_end(target)
+            return field
+        field = FlowField(self, target)
+        self.stats['flow_fields'] += 1
+        self._flow_fields[target] = field
+        self._flow_fields.move_to_end(target)
+        while len(self._flow_fields) > self.max_flow_fields:
+            self._flow_fields.popitem(last=False)
+        return field
+
+    def find_path(self, start, end):
+        """寻找路径
+        Args:
+            start: (x, y) 实体当前位置(左上角)
+            end: (x, y) 目标位置
+        Returns:
+            list: Waypoint列表(首个为起点)；目标不可达时为通往离目标最近节点的部分路径
+        """
+        started = time.perf_counter()
+        start_node = self._nearest_node(start[0], start[1])
+        goal_node = self._nearest_node(end[0], end[1])
+        if start_node is None:
+            self._record('failed', 0, started)
+            return []
+
+        # 起点和终点不在同一个关卡时先在抽象图上搜索，只细化当前关卡这一段
+        if goal_node is not None and self.clusters.cluster_of(start_node) != self.clusters.cluster_of(goal_node):
+            path = self.clusters.find_path(start, start_node, goal_node, started)
+            if path is not None:
+                return path
+
+        cols = self.cols
+        tile_size = self.tile_size
+        if goal_node is None:
+            end_col = int(end[0] // tile_size)
+            end_row = int(end[1] // tile_size)
+        else:
+            end_row, end_col = divmod(goal_node, cols)
+
+        self._generation += 1
+        generation = self._generation
+        g = self._g
+        parent = self._parent
+        parent_kind = self._parent_kind
+        seen = self._seen
+        closed = self._closed
+        edges = self.edges
+        built_levels = self.built_levels
+        level_cols = self.level_cols
+
+        start_row, start_col = divmod(start_node, cols)
+        g[start_node] = 0.0
+        parent[start_node] = -1
+        seen[start_node] = generation
+        best_node = start_node
+        best_h = abs(start_col - end_col) + abs(start_row - end_row)
+        frontier = [(best_h, best_h, start_node)]
+
+        heappop = heapq.heappop
+        heappush = heapq.heappush
+        deadline = started + self.max_time_ms / 1000.0
+        expanded = 0
+        found = False
+
+        while frontier:
+            _, h, current = heappop(frontier)
+            if closed[current] == generation:
+                continue
+            closed[current] = generation
+            if current == goal_node:
+                found = True
+                break
+            if h < best_h or (h == best_h and g[current] < g[best_node]):
+                best_node = current
+                best_h = h
+
+            expanded += 1
+            if expanded >= self.max_iterations:
+                break
+            if not expanded & 63 and time.perf_counter() > deadline:
+                break
+
+            if (current % cols) // level_cols not in built_levels:
+                self._ensure_level((current % cols) // level_cols)
+            current_g = g[current]
+            for target, cost, kind in edges[current] or ():
+                if closed[target] == generation:
+                    continue
+                new_g = current_g + cost
+                if seen[target] != generation or new_g < g[target]:
+                    seen[target] = generation
+                    g[target] = new_g
+                    parent[target] = current
+                    parent_kind[target] = kind
+                    target_row, target_col = divmod(target, cols)
+                    target_h = abs(target_col - end_col) + abs(target_row - end_row)
+                    heappush(frontier, (new_g + target_h, target_h, target))
+
+        if found:
+            target = goal_node
+            self._record('found', expanded, started)
+        elif best_node != start_node:
+            target = best_node
+            self._record('partial', expanded, started)
+        else:
+            self._record('failed', expanded, started)
+            return []
+
+        # 重建路径
+        path = []
+        current = target
+        while current != start_node:
+            row, col = divmod(current, cols)
+            x, y = self.get_stand_position(row, col)
+            path.append(Waypoint(x, y, parent_kind[current]))
+            current = parent[current]
+        path.append(Waypoint(start[0], start[1], 'start'))
+        path.reverse()
+        return path
+
+    def _record(self, result, expanded, started):
+        """记录搜索统计"""
+        self.last_result = result
+        stats = self.stats
+        stats['searches'] += 1
+        stats['expanded'] += expanded
+        stats['last_expanded'] = expanded
+        stats['last_ms'] = (time.perf_counter() - started) * 1000
+        if result != 'found':
+            stats[result] += 1
+
+
+def _serve_path_requests(requests, results):
+    """寻路工作者的主循环(在工作线程或进程中运行)
+    Args:
+        requests: 请求队列，消息为('graph', 导航图副本, 地图版本)或('path', 合并键, 起点, 终点)，None表示退出
+        results: 结果队列，消息为(合并键, 地图版本, [(x, y, 类型)], 搜索结果)
+    """
+    if threading.current_thread() is threading.main_thread():
+        # 在独立进程中运行：fork时继承了pygame(SDL)的信号处理函数，恢复默认处理，
+        # 否则terminate()和Ctrl+C无法结束工作者进程
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+    parent = os.getppid()
+    graph = None
+    version = None
+    while True:
+        try:
+            message = requests.get(timeout=1.0)
+        except queue.Empty:
+            # 游戏进程被强制结束时自行退出
+            if os.getppid() != parent:
+                return
+            continue
+        if message is None:
+            return
+        if message[0] == 'graph':
+            _, graph, version = message
+            continue
+        _, key, start, end = message
+        path = graph.find_path(start, end)
+        results.put((key, version, [(point[0], point[1], point.kind) for point in path], graph.last_result))
+
+
+class PathService:
+    """异步寻路服务
+
+    AI提交请求后继续沿旧路径走或直接朝目标移动，结果在一两帧后由update()分发。
+    起点和终点落在同一对节点上的请求合并为一次搜索。工作者在导航图的只读副本上寻路，
+    结果带有副本对应的地图版本，地图变化后旧副本算出的结果会被丢弃，进行中的请求在新副本上重新排队。
+
+    默认在独立进程中寻路：搜索是纯Python代码，放在线程里会和主循环争抢GIL。
+    实测每帧提交4个请求、主循环8毫秒时，线程工作者让主循环帧时间中位数从约9毫秒升到约11毫秒，
+    进程工作者的结果平均晚到不到一帧；地图变化时的副本序列化(约2毫秒)在队列的后台线程中进行。
+    """
+    def __init__(self, nav_graph, use_process=True, max_result_age=60):
+        """
+        nav_graph: 导航图(主线程使用的那份)
+        use_process: 在独立进程中寻路(False时使用线程，结果延迟更低但占用主循环的GIL)
+        max_result_age: 结果无人取走时保留的帧数
+        """
+        self.nav_graph = nav_graph
+        self.game_map = nav_graph.game_map
+        self.use_process = use_process
+        self.max_result_age = max_result_age
+
+        self.frame = 0
+        self.map_version = None   # 工作者当前副本对应的地图版本
+        self._worker = None
+        self._request_queue = None
+        self._result_queue = None
+        self._in_flight = {}      # 合并键 -> (起点, 终点)
+        self._waiting = {}        # 合并键 -> 等待该结果的请求者集合
+        self._requests = {}       # 请求者 -> (合并键, 起点)
+        self._ready = {}          # 请求者 -> (路径点列表, 完成时的帧号)
+        self.stats = {
+            'requests': 0,        # 提交的请求数
+            'coalesced': 0,       # 合并到进行中搜索的请求数
+            'completed': 0,       # 完成的搜索数
+            'stale': 0,           # 因地图版本过期丢弃的结果数
+        }
+
+    def _start(self):
+        """启动工作线程或进程"""
+        if self.use_process:
+            import multiprocessing
+            self._request_queue = multiprocessing.Queue()
+            self._result_queue = multiprocessing.Queue()
+            worker = multiprocessing.Process(
+                target=_serve_path_requests,
+                args=(self._request_queue, self._result_queue),
+                daemon=True
+            )
+        else:
+            self._request_queue = queue.Queue()
+            self._result_queue = queue.Queue()
+            worker = threading.Thread(
+                target=_serve_path_requests,
+                args=(self._request_queue, self._result_queue),
+                daemon=True
+            )
+        worker.start()
+        self._worker = worker
+        # 保证解释器退出前停止工作者(multiprocessing退出时会等待所有子进程)
+        atexit.register(self.close)
+
+    def _sync_graph(self):
+        """地图变化后把新的只读副本交给工作者"""
+        version = self.game_map.tile_version
+        if version == self.map_version:
+            return
+        if self._worker is None:
+            self._start()
+        self.map_version = version
+        self._request_queue.put(('graph', self.nav_graph.snapshot(), version))
+        # 之前排队的请求会在旧副本上完成并被丢弃，在新副本上重新排队
+        for key, (start, end) in self._in_flight.items():
+            self._request_queue.put(('path', key, start, end))
+
+    def _make_key(self, start, end):
+        """合并键：起点节点和终点节点(终点不在导航图上时用终点所在的格子)"""
+        nav = self.nav_graph
+        start_node = nav._nearest_node(start[0], start[1])
+        if start_node is None:
+            return None
+        goal_node = nav._nearest_node(end[0], end[1])
+        if goal_node is None:
+            goal_node = (int(end[0] // nav.tile_size), int(end[1] // nav.tile_size))
+        return (start_node, goal_node)
+
+    def request(self, requester, start, end):
+        """提交寻路请求，同一请求者在结果到达前重复提交相同的请求不会重复排队
+        Args:
+            requester: 请求者(用于取回结果)
+            start: 起点(实体左上角)
+            end: 终点
+        """
+        key = self._make_key(start, end)
+        previous = self._requests.get(requester)
+        if previous is not None:
+            if previous[0] == key:
+                return
+            self._forget(requester)
+        self._ready.pop(requester, None)
+        self.stats['requests'] += 1
+
+        if key is None:
+            # 起点不在导航图上，直接返回空路径
+            self._ready[requester] = ([], self.frame)
+            return
+        self._requests[requester] = (key, start)
+        waiting = self._waiting.get(key)
+        if waiting is not None:
+            waiting.add(requester)
+            self.stats['coalesced'] += 1
+            return
+        self._waiting[key] = {requester}
+        self._sync_graph()
+        self._in_flight[key] = (start, end)
+        self._request_queue.put(('path', key, start, end))
+
+    def poll(self, requester, position=None):
+        """取走请求者的结果
+        Args:
+            requester: 请求者
+            position: 请求者当前的位置(左上角)，给出时把路径裁剪到当前位置前方
+        Returns:
+            list: Waypoint列表；尚未完成时为None
+        """
+        ready = self._ready.pop(requester, None)
+        if ready is None:
+            return None
+        path = [Waypoint(x, y, kind) for x, y, kind in ready[0]]
+        if position is not None and path:
+            path = self._trim_path(path, position)
+        return path
+
+    @staticmethod
+    def _trim_path(path, position):
+        """结果到达前请求者已经移动，从离当前位置最近的节点开始走，不回头走向请求时的起点
+        只跳过步行连接的节点，跳跃和下落要照原路径执行。
+        Args:
+            path: Waypoint列表(首个为请求时的起点)
+            position: 当前位置(左上角)
+        Returns:
+            list: 以当前位置为起点的Waypoint列表
+        """
+        x, y = position
+        nodes = path[1:]
+        nearest = 0
+        if nodes:
+            best = math.hypot(nodes[0][0] - x, nodes[0][1] - y)
+            for index in range(1, len(nodes)):
+                if nodes[index].kind != NavGraph.WALK:
+                    break
+                distance = math.hypot(nodes[index][0] - x, nodes[index][1] - y)
+                if distance < best:
+                    nearest = index
+                    best = distance
+            # 已经走过最近的节点(位于它和下一个节点之间)时，以下一个节点为目标
+            following = nearest + 1
+            if following < len(nodes) and nodes[following].kind == NavGraph.WALK:
+                node_x = nodes[nearest][0]
+                if (x - node_x) * (nodes[following][0] - node_x) > 0:
+                    nearest = following
+        return [Waypoint(x, y, 'start')] + nodes[nearest:]
+
+    def is_pending(self, requester):
+        """请求者是否有进行中的请求"""
+        return requester in self._requests
+
+    def cancel(self, requester):
+        """取消请求者的请求并丢弃未取走的结果"""
+        self._forget(requester)
+        self._ready.pop(requester, None)
+
+    def _forget(self, requester):
+        """把请求者从等待列表中移除(搜索本身继续，结果可能被其他请求者用到)"""
+        previous = self._requests.pop(requester, None)
+        if previous is not None:
+            waiting = self._waiting.get(previous[0])
+            if waiting is not None:
+                waiting.discard(requester)
+
+    def update(self):
+        """分发已完成的结果(每帧调用一次)"""
+        self.frame += 1
+        if self._worker is None:
+            return
+        self._sync_graph()
+        while True:
+            try:
+                key, version, points, _ = self._result_queue.get_nowait()
+            except queue.Empty:
+                break
+            if version != self.map_version:
+                self.stats['stale'] += 1
+                continue
+            if self._in_flight.pop(key, None) is None:
+                continue
+            self.stats['completed'] += 1
+            for requester in self._waiting.pop(key, ()):
+                _, start = self._requests.pop(requester)
+                # 合并的请求共用路径，起点换成各自的位置
+                if points:
+                    points = [(start[0], start[1], 'start')] + points[1:]
+                self._ready[requester] = (points, self.frame)
+
+        # 丢弃长时间没有取走的结果
+        if self._ready:
+            expired = [requester for requester, (_, frame) in self._ready.items()
+                       if self.frame - frame > self.max_result_age]
+            for requester in expired:
+                del self._ready[requester]
+
+    def close(self):
+        """停止工作者(进程在超时后仍未退出时强制结束)"""
+        worker = self._worker
+        if worker is None:
+            return
+        self._worker = None
+        self.map_version = None
+        atexit.unregister(self.close)
+        self._request_queue.put(None)
+        worker.join(timeout=1.0)
+        if self.use_process:
+            if worker.is_alive():
+                worker.terminate()
+                worker.join(timeout=0.5)
+            if worker.is_alive():
+                worker.kill()
+                worker.join(timeout=0.5)
+            # 不等待队列的后台线程把剩余消息写完
+            self._request_queue.cancel_join_thread()
+            self._result_queue.cancel_join_thread()
+        self._in_flight.clear()
+        self._waiting.clear()
+        self._requests.clear()
+
+
+class FlowField:
+    """通往同一目标节点的距离场
+
+    从目标出发沿反向边做一次Dijkstra，记录每个节点到目标的代价和下一步，
+    所有追击同一目标的实体以O(1)查询下一步，不再各自寻路。
+    """
+    def __init__(self, nav_graph, target, max_cost=80.0):
+        """
+        nav_graph: 导航图
+        target: 目标节点
+        max_cost: 距离场的最大代价，超出范围的节点视为不可达
+        """
+        self.nav_graph = nav_graph
+        self.target = target
+        self.version = nav_graph.version
+        self.cost = {target: 0.0}
+        self.next_node = {}      # 节点 -> (下一节点, 移动方式)
+        
+        reverse = nav_graph._get_reverse_edges()
+        frontier = [(0.0, target)]
+        closed = set()
+        while frontier:
+            cost, node = heapq.heappop(frontier)
+            if node in closed:
+                continue
+            closed.add(node)
+            for source, edge_cost, kind in reverse[node] or ():
+                new_cost = cost + edge_cost
+                if new_cost > max_cost or source in closed:
+                    continue
+                if new_cost < self.cost.get(source, float('inf')):
+                    self.cost[source] = new_cost
+                    self.next_node[source] = (node, kind)
+                    heapq.heappush(frontier, (new_cost, source))
+
+    def next_step(self, node):
+        """获取下一步
+        Returns:
+            tuple: (下一节点, 移动方式)；已在目标或不可达时为None
+        """
+        return self.next_node.get(node)
+
+    def reaches(self, node):
+        """节点能否到达目标"""
+        return node in self.cost
+
+
+class _Cluster:
+    """抽象图中一个簇(关卡)的数据"""
+    __slots__ = ('index', 'exits', 'reverse', 'transits', 'entries')
+
+    def __init__(self, index):
+        self.index = index
+        self.exits = {}      # 出口节点 -> [(簇外目标节点, 代价, 类型)]
+        self.reverse = {}    # 簇内反向边：节点 -> [(来源节点, 代价, 类型)]
+        self.transits = {}   # 节点 -> [(出口节点, 簇内代价)]，按需计算并缓存
+        self.entries = {}    # 终点节点 -> {簇内节点: 到终点的代价}，按需计算并缓存
+
+
+class ClusterGraph:
+    """分层寻路用的抽象图
+
+    每个关卡是一个簇，穿过关卡之间敞开的边界列的边，两端节点就是抽象图的节点。
+    簇内从某个节点到各出口的代价由限制在簇内的Dijkstra计算并缓存。
+    远距离寻路先在抽象图上做A*，然后只细化实体所在簇的这一段(到出口并跨过边界)，
+    走完后再次寻路时从下一个簇继续。簇在第一次用到时构建，砖块变化时丢弃附近的簇，
+    因此一次搜索的代价只和路线经过的簇有关，与世界里一共有多少关卡无关。
+    """
+    GOAL = -1   # 抽象搜索中代表终点的虚拟节点
+
+    def __init__(self, nav_graph, max_iterations=5000, max_time_ms=None):
+        """
+        nav_graph: 导航图
+        max_iterations: 抽象搜索最多展开的节点数
+        max_time_ms: 单次搜索的时间预算(毫秒)，默认与导航图相同
+        """
+        self.nav_graph = nav_graph
+        self.cluster_cols = nav_graph.level_cols
+        self.max_iterations = max_iterations
+        self.max_time_ms = nav_graph.max_time_ms if max_time_ms is None else max_time_ms
+        self._clusters = {}   # 簇编号 -> _Cluster
+
+    def cluster_of(self, node):
+        """节点所在的簇"""
+        return (node % self.nav_graph.cols) // self.cluster_cols
+
+    def invalidate(self, first_col, last_col):
+        """丢弃覆盖这些列的簇，下次用到时重建"""
+        first = max(0, first_col) // self.cluster_cols
+        last = max(0, last_col) // self.cluster_cols
+        for index in range(first, last + 1):
+            self._clusters.pop(index, None)
+
+    def _get_cluster(self, index):
+        """获取簇，第一次用到时按导航图的边构建"""
+        cluster = self._clusters.get(index)
+        if cluster is not None:
+            return cluster
+        nav = self.nav_graph
+        nav._ensure_level(index)
+        cluster = _Cluster(index)
+        cols = nav.cols
+        for col in nav._level_columns(index):
+            for row in range(nav.rows):
+                node = row * cols + col
+                for target, cost, kind in nav.edges[node] or ():
+                    if self.cluster_of(target) == index:
+                        cluster.reverse.setdefault(target, []).append((node, cost, kind))
+                    else:
+                        cluster.exits.setdefault(node, []).append((target, cost, kind))
+        self._clusters[index] = cluster
+        return cluster
+
+    def _search_cluster(self, cluster, source, reverse=False):
+        """限制在簇内的Dijkstra
+        Args:
+            cluster: 簇
+            source: 起始节点
+            reverse: 沿反向边搜索(得到各节点到source的代价)
+        Returns:
+            tuple: (节点 -> 代价, 节点 -> (上一节点, 类型))
+        """
+        edges = self.nav_graph.edges
+        index = cluster.index
+        cluster_of = self.cluster_of
+        cost = {source: 0.0}
+        parent = {}
+        closed = set()
+        frontier = [(0.0, source)]
+        while frontier:
+            current_cost, node = heapq.heappop(frontier)
+            if node in closed:
+                continue
+            closed.add(node)
+            neighbours = cluster.reverse.get(node, ()) if reverse else edges[node] or ()
+            for other, edge_cost, kind in neighbours:
+                if other in closed or cluster_of(other) != index:
+                    continue
+                new_cost = current_cost + edge_cost
+                if new_cost < cost.get(other, float('inf')):
+                    cost[other] = new_cost
+                    parent[other] = (node, kind)
+                    heapq.heappush(frontier, (new_cost, other))
+        return cost, parent
+
+    def _get_transits(self, cluster, node):
+        """从簇内节点到本簇各出口的代价"""
+        transits = cluster.transits.get(node)
+        if transits is None:
+            cost, _ = self._search_cluster(cluster, node)
+            transits = [(exit_node, cost[exit_node]) for exit_node in cluster.exits
+                        if exit_node != node and exit_node in cost]
+            cluster.transits[node] = transits
+        return transits
+
+    def find_path(self, start, start_node, goal_node, started):
+        """在抽象图上寻路并细化第一段
+        Args:
+            start: 实体当前位置(左上角)
+            start_node: 起点节点
+            goal_node: 终点节点(与起点在不同的簇)
+            started: 搜索开始时间(用于统计)
+        Returns:
+            list: 从起点到本簇出口并跨过边界的Waypoint列表；超出预算时为通往离终点最近的
+                抽象节点的部分路径；抽象图上不可达时为None
+        """
+        nav = self.nav_graph
+        cols = nav.cols
+        goal = self.GOAL
+        start_cluster = self._get_cluster(self.cluster_of(start_node))
+        goal_cluster = self._get_cluster(self.cluster_of(goal_node))
+        start_cost, start_parent = self._search_cluster(start_cluster, start_node)
+        goal_cost = goal_cluster.entries.get(goal_node)
+        if goal_cost is None:
+            # 同一终点的后续各段复用
+            goal_cost = self._search_cluster(goal_cluster, goal_node, reverse=True)[0]
+            goal_cluster.entries[goal_node] = goal_cost
+        goal_col = goal_node % cols
+
+        g = {}
+        parent = {}   # 抽象节点 -> (上一抽象节点, 类型)，起点簇的出口为None
+        frontier = []
+        for exit_node in start_cluster.exits:
+            if exit_node in start_cost:
+                g[exit_node] = start_cost[exit_node]
+                parent[exit_node] = None
+                heapq.heappush(frontier, (g[exit_node] + abs(exit_node % cols - goal_col), exit_node))
+
+        closed = set()
+        deadline = started + self.max_time_ms / 1000.0
+        expanded = 0
+        found = False
+        over_budget = False
+        best_node = None
+        best_h = None
+        while frontier:
+            _, node = heapq.heappop(frontier)
+            if node in closed:
+                continue
+            closed.add(node)
+            if node == goal:
+                found = True
+                break
+            h = abs(node % cols - goal_col)
+            if best_node is None or h < best_h or (h == best_h and g[node] < g[best_node]):
+                best_node = node
+                best_h = h
+            expanded += 1
+            # 展开一个抽象节点可能要做一次簇内搜索，每次都检查时间
+            if expanded >= self.max_iterations or time.perf_counter() > deadline:
+                over_budget = True
+                break
+
+            cluster = self._get_cluster(self.cluster_of(node))
+            successors = [(other, cost, 'transit') for other, cost in self._get_transits(cluster, node)]
+            successors.extend(cluster.exits.get(node, ()))
+            if cluster is goal_cluster and node in goal_cost:
+                successors.append((goal, goal_cost[node], None))
+            node_g = g[node]
+            for other, cost, kind in successors:
+                if other in closed:
+                    continue
+                new_g = node_g + cost
+                if new_g < g.get(other, float('inf')):
+                    g[other] = new_g
+                    parent[other] = (node, kind)
+                    h = 0 if other == goal else abs(other % cols - goal_col)
+                    heapq.heappush(frontier, (new_g + h, other))
+
+        if found:
+            node = parent[goal][0]
+        elif over_budget and best_node is not None:
+            # 超出预算：朝离终点最近的抽象节点走
+            node = best_node
+        else:
+            return None
+
+        # 抽象路线(不含终点)，找到第一条离开起点簇的边
+        route = []
+        while node is not None:
+            route.append(node)
+            node = parent[node][0] if parent[node] else None
+        route.reverse()
+        start_index = start_cluster.index
+        exit_node, arrival = route[-1], None
+        for node, other in zip(route, route[1:]):
+            if self.cluster_of(other) != start_index:
+                exit_node, arrival = node, other
+                break
+        if arrival is None and exit_node == start_node:
+            return None
+        nav._record('found' if found else 'partial', expanded, started)
+        nav.stats['hierarchical'] += 1
+
+        # 只细化这一段：起点到出口沿簇内搜索的父节点，再跨过边界
+        path = [nav.get_waypoint(arrival, parent[arrival][1])] if arrival is not None else []
+        node = exit_node
+        while node != start_node:
+            previous, kind = start_parent[node]
+            path.append(nav.get_waypoint(node, kind))
+            node = previous
+        path.append(Waypoint(start[0], start[1], 'start'))
+        path.reverse()
+        return path
@@ -0,0 +1,120 @@
+import heapq
+
+
+class NoiseField:
+    """共享的声音场
+
+    每次发声(落地、奔跑、投射物撞墙、敌人死亡)只在砖块网格上做一次有界的扩散，
+    传播距离按格子累加，穿过实心砖块的代价更高。每个格子为每种发声者('player'或'enemy')
+    分别记录最近一段时间内听起来最近(最响)的声音：感知距离 = 传播距离 / 响度，以及声源位置，
+    敌人的响声不会盖住玩家的脚步声。AI查询自己所在格子即可判断能否听到，与听者数量无关。
+    """
+    SOURCES = ('player', 'enemy')
+
+    def __init__(self, game_map, max_range=300, wall_cost=4, duration=0.5):
+        """
+        game_map: 游戏地图
+        max_range: 响度为1的声音最远的传播距离(像素)，一般取AI听觉范围的最大值
+        wall_cost: 穿过一格实心砖块相当于穿过几格空地
+        duration: 声音在声音场中保留的时间(秒)
+        """
+        self.game_map = game_map
+        self.tile_size = game_map.tile_size
+        self.rows, self.cols = game_map.solid_grid.shape
+        self.max_range = max_range
+        self.wall_cost = wall_cost
+        self.duration = duration
+
+        size = self.rows * self.cols
+        self.time = 0.0
+        # 发声者 -> (格子编号 -> 感知距离, 格子编号 -> 声音到达的时间, 格子编号 -> 声源位置)
+        self._fields = {
+            source: ([0.0] * size, [float('-inf')] * size, [None] * size)
+            for source in self.SOURCES
+        }
+        self.stats = {'emits': 0, 'cells': 0}
+
+    def update(self, dt):
+        """推进声音场的时间，过期的声音在查询时忽略"""
+        self.time += dt
+
+    def emit(self, x, y, loudness=1.0, source='player'):
+        """发出声音并扩散到声音场
+        Args:
+            x, y: 声源位置(世界坐标)
+            loudness: 响度，1为传播max_range像素
+            source: 发声者('player'或'enemy')，AI只根据玩家发出的声音追踪玩家
+        """
+        if loudness <= 0:
+            return
+        tile_size = self.tile_size
+        rows, cols = self.rows, self.cols
+        col = int(x // tile_size)
+        row = int(y // tile_size)
+        if not (0 <= row < rows and 0 <= col < cols):
+            return
+
+        limit = self.max_range * loudness
+        wall_step = tile_size * self.wall_cost
+        solid = self.game_map._solid_rows
+        distance_field, stamp, origin_field = self._fields[source]
+        now = self.time
+        expired = now - self.duration
+        origin = (x, y)
+
+        start = row * cols + col
+        best = {start: 0.0}
+        queue = [(0.0, start)]
+        cells = 0
+        while queue:
+            distance, cell = heapq.heappop(queue)
+            if distance > best[cell]:
+                continue
+            cells += 1
+
+            # 只覆盖同一发声者已过期或听起来更远的声音
+            perceived = distance / loudness
+            if stamp[cell] < expired or perceived <= distance_field[cell]:
+                distance_field[cell] = perceived
+                stamp[cell] = now
+                origin_field[cell] = origin
+
+            cell_row, cell_col = divmod(cell, cols)
+            for next_row, next_col in ((cell_row - 1, cell_col), (cell_row + 1, cell_col),
+                                       (cell_row, cell_col - 1), (cell_row, cell_col + 1)):
+                if not (0 <= next_row < rows and 0 <= next_col < cols):
+                    continue
+                next_distance = distance + (wall_step if solid[next_row][next_col] else tile_size)
+                if next_distance > limit:
+                    continue
+                next_cell = next_row * cols + next_col
+                if next_distance < best.get(next_cell, limit + 1):
+                    best[next_cell] = next_distance
+                    heapq.heappush(queue, (next_distance, next_cell))
+
+        self.stats['emits'] += 1
+        self.stats['cells'] += cells
+
+    def sample(self, x, y, source='player'):
+        """查询某个位置听到的某种发声者的声音
+        Args:
+            x, y: 听者位置(世界坐标)
+            source: 发声者('player'或'enemy')
+        Returns:
+            tuple: (感知距离, 声源位置)，没有声音时为None
+        """
+        col = int(x // self.tile_size)
+        row = int(y // self.tile_size)
+        if not (0 <= row < self.rows and 0 <= col < self.cols):
+            return None
+        cell = row * self.cols + col
+        distance_field, stamp, origin_field = self._fields[source]
+        if self.time - stamp[cell] > self.duration:
+            return None
+        return distance_field[cell], origin_field[cell]
+
+    def clear(self):
+        """清除所有声音"""
+        size = self.rows * self.cols
+        for source, (distance_field, stamp, origin_field) in self._fields.items():
+            self._fields[source] = (distance_field, [float('-inf')] * size, origin_field)
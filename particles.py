@@ -0,0 +1,238 @@
+import pygame
+import numpy as np
+
+
+class ParticleSystem:
+    """基于数组的粒子系统
+
+    位置、速度、寿命、颜色和大小保存在预分配的NumPy数组中，
+    空闲槽位用栈管理，发射和更新都是批量向量运算，不产生逐粒子的Python对象。
+    """
+    def __init__(self, game, capacity=4096, gravity=1500, drag=1.5):
+        """
+        game: 游戏对象
+        capacity: 最大粒子数
+        gravity: 重力加速度
+        drag: 空气阻力系数(每秒速度衰减比例)
+        """
+        self.game = game
+        self.capacity = capacity
+        self.gravity = gravity
+        self.drag = drag
+        self.rng = np.random.default_rng()
+
+        # 粒子属性
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.y = np.zeros(capacity, dtype=np.float32)
+        self.vx = np.zeros(capacity, dtype=np.float32)
+        self.vy = np.zeros(capacity, dtype=np.float32)
+        self.life = np.zeros(capacity, dtype=np.float32)
+        self.max_life = np.ones(capacity, dtype=np.float32)
+        self.size = np.ones(capacity, dtype=np.int16)
+        self.color = np.zeros(capacity, dtype=np.int16)   # 调色板索引
+        self.gravity_scale = np.ones(capacity, dtype=np.float32)
+        self.collide = np.zeros(capacity, dtype=bool)
+        self.alive = np.zeros(capacity, dtype=bool)
+
+        # 空闲槽位栈
+        self._free = np.arange(capacity - 1, -1, -1, dtype=np.int32)
+        self._free_count = capacity
+
+        # 颜色调色板和预渲染的粒子精灵 (调色板索引, 大小, 透明度档位) -> Surface
+        self.palette = []
+        self._palette_index = {}
+        self._sprites = {}
+        self.alpha_levels = 4
+
+    @property
+    def count(self):
+        """当前存活的粒子数"""
+        return self.capacity - self._free_count
+
+    def _get_color_index(self, color):
+        """获取颜色在调色板中的索引"""
+        color = tuple(color)
+        index = self._palette_index.get(color)
+        if index is None:
+            index = len(self.palette)
+            self.palette.append(color)
+            self._palette_index[color] = index
+        return index
+
+    def emit(self, x, y, count, speed=(50, 200), angle=(0, 2 * np.pi),
+             life=(0.3, 0.8), size=(2, 4), colors=((255, 255, 255),),
+             gravity_scale=1.0, collide=True):
+        """批量发射粒子
+        Args:
+            x, y: 发射位置(世界坐标)
+            count: 粒子数量
+            speed: 速度范围 (min, max)
+            angle: 方向角范围 (min, max)，弧度，0为向右
+            life: 寿命范围(秒)
+            size: 大小范围(像素)
+            colors: 可选颜色列表，每个粒子随机取一种
+            gravity_scale: 重力系数
+            collide: 是否与地图碰撞
+        Returns:
+            int: 实际发射的粒子数
+        """
+        count = min(int(count), self._free_count)
+        if count <= 0:
+            return 0
+
+        # 从空闲栈顶取出槽位
+        self._free_count -= count
+        slots = self._free[self._free_count:self._free_count + count]
+
+        rng = self.rng
+        angles = rng.uniform(angle[0], angle[1], count)
+        speeds = rng.uniform(speed[0], speed[1], count)
+        lives = rng.uniform(life[0], life[1], count)
+        color_indices = np.array([self._get_color_index(c) for c in colors], dtype=np.int16)
+
+        self.x[slots] = x
+        self.y[slots] = y
+        self.vx[slots] = np.cos(angles) * speeds
+        self.vy[slots] = np.sin(angles) * speeds
+        self.life[slots] = lives
+        self.max_life[slots] = lives
+        self.size[slots] = rng.integers(size[0], size[1] + 1, count)
+        self.color[slots] = color_indices[rng.integers(0, len(color_indices), count)]
+        self.gravity_scale[slots] = gravity_scale
+        self.collide[slots] = collide
+        self.alive[slots] = True
+        return count
+
+    def emit_sparks(self, x, y, direction=0, count=12):
+        """击中火花
+        Args:
+            direction: 火花飞溅方向(1向右, -1向左, 0四散)
+        """
+        if direction > 0:
+            angle = (-np.pi / 3, np.pi / 3)
+        elif direction < 0:
+            angle = (np.pi * 2 / 3, np.pi * 4 / 3)
+        else:
+            angle = (0, 2 * np.pi)
+        return self.emit(
+            x, y, count,
+            speed=(150, 400), angle=angle, life=(0.15, 0.4), size=(2, 3),
+            colors=((255, 240, 150), (255, 200, 60), (255, 255, 255)),
+            gravity_scale=0.6
+        )
+
+    def emit_dust(self, x, y, strength=1.0, count=10):
+        """落地扬尘"""
+        return self.emit(
+            x, y, int(count * strength),
+            speed=(30, 120 * strength), angle=(np.pi * 1.05, np.pi * 1.95),
+            life=(0.25, 0.6), size=(3, 6),
+            colors=((180, 170, 150), (150, 140, 120), (200, 190, 170)),
+            gravity_scale=0.2
+        )
+
+    def emit_burst(self, x, y, color=(255, 0, 0), count=40):
+        """死亡爆散"""
+        dark = tuple(max(0, c - 80) for c in color)
+        return self.emit(
+            x, y, count,
+            speed=(100, 450), life=(0.4, 1.2), size=(3, 6),
+            colors=(color, dark, (255, 255, 255))
+        )
+
+    def clear(self):
+        """清除所有粒子"""
+        self.alive[:] = False
+        self._free = np.arange(self.capacity - 1, -1, -1, dtype=np.int32)
+        self._free_count = self.capacity
+
+    def update(self, dt):
+        """批量积分所有存活粒子"""
+        if self._free_count == self.capacity:
+            return
+
+        idx = np.flatnonzero(self.alive)
+
+        # 重力和阻力
+        vx = self.vx[idx]
+        vy = self.vy[idx] + self.gravity * self.gravity_scale[idx] * dt
+        damping = max(0.0, 1.0 - self.drag * dt)
+        vx *= damping
+        vy *= damping
+
+        old_x = self.x[idx]
+        old_y = self.y[idx]
+        new_x = old_x + vx * dt
+        new_y = old_y + vy * dt
+
+        # 与地图网格批量碰撞：撞到实心砖块的粒子按轴反弹
+        collide = self.collide[idx]
+        if collide.any():
+            gamemap = self.game.gamemap
+            hit_x = collide & gamemap.is_solid_array(new_x, old_y)
+            new_x = np.where(hit_x, old_x, new_x)
+            vx = np.where(hit_x, -vx * 0.3, vx)
+
+            hit_y = collide & gamemap.is_solid_array(new_x, new_y)
+            new_y = np.where(hit_y, old_y, new_y)
+            vx = np.where(hit_y, vx * 0.6, vx)   # 落地摩擦
+            vy = np.where(hit_y, -vy * 0.3, vy)
+
+        self.x[idx] = new_x
+        self.y[idx] = new_y
+        self.vx[idx] = vx
+        self.vy[idx] = vy
+
+        # 寿命结束的粒子归还到空闲栈
+        life = self.life[idx] - dt
+        self.life[idx] = life
+        dead = idx[life <= 0]
+        if len(dead):
+            self.alive[dead] = False
+            self._free[self._free_count:self._free_count + len(dead)] = dead
+            self._free_count += len(dead)
+
+    def _get_sprite(self, key):
+        """获取预渲染的粒子精灵"""
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            color_index, size, alpha_level = key
+            sprite = pygame.Surface((size, size))
+            sprite.fill(self.palette[color_index])
+            sprite.set_alpha(255 * alpha_level // self.alpha_levels)
+            self._sprites[key] = sprite
+        return sprite
+
+    def render(self, camera_offset=(0, 0)):
+        """批量绘制可见粒子"""
+        if self._free_count == self.capacity:
+            return
+
+        screen = self.game.screen
+        scale = self.game.render_scale
+        idx = np.flatnonzero(self.alive)
+
+        screen_x = ((self.x[idx] - camera_offset[0]) * scale).astype(np.int32)
+        screen_y = ((self.y[idx] - camera_offset[1]) * scale).astype(np.int32)
+        width, height = screen.get_size()
+        visible = (screen_x > -8) & (screen_x < width) & (screen_y > -8) & (screen_y < height)
+        if not visible.any():
+            return
+        idx = idx[visible]
+
+        # 大小按渲染比例缩放，透明度按剩余寿命分档
+        sizes = np.maximum(1, (self.size[idx] * scale).astype(np.int32))
+        alpha_levels = np.ceil(
+            self.life[idx] / self.max_life[idx] * self.alpha_levels
+        ).astype(np.int32).clip(1, self.alpha_levels)
+        half = sizes // 2
+
+        sprites = self._sprites
+        get_sprite = self._get_sprite
+        blits = []
+        for key, x, y in zip(zip(self.color[idx].tolist(), sizes.tolist(), alpha_levels.tolist()),
+                             (screen_x[visible] - half).tolist(),
+                             (screen_y[visible] - half).tolist()):
+            sprite = sprites.get(key) or get_sprite(key)
+            blits.append((sprite, (x, y)))
+        screen.blits(blits, doreturn=False)
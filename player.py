@@ -1,10 +1,12 @@
 import pygame
 from animation import AnimationManager
+from timers import default_timers
 
 class Player:
     """玩家类"""
     def __init__(self, gamemap, x, y):
         self.gamemap = gamemap
+        self.timers = default_timers  # 计时使用的游戏时钟(秒)
         # 位置和大小
         self.width = 64
         self.height = 128
@@ -34,12 +36,12 @@ class Player:
         self.max_air_speed = 400  # 保持现有最大空中速度
         
         # 新增缓冲跳跃机制
-        self.jump_buffer_time = 150  # 跳跃缓冲时间（毫秒）
-        self.jump_buffer_timer = 0
+        self.jump_buffer_time = 0.15  # 跳跃缓冲时间（秒）
+        self.jump_buffer_until = 0    # 跳跃缓冲的到期时刻
         
         # 新增土狼时间（Coyote Time）机制
-        self.coyote_time = 100  # 土狼时间（毫秒）
-        self.coyote_timer = 0
+        self.coyote_time = 0.1  # 土狼时间（秒）
+        self.coyote_until = 0   # 土狼时间的到期时刻
         self.just_left_ground = False
         
         # 添加行走/跑步速度阈值
@@ -49,18 +51,22 @@ class Player:
         
         # 跳跃优化参数
         self.jump_cut_threshold = -100  # 跳跃中断阈值
-        self.max_jump_hold_time = 100  # 最大跳跃按住时间(毫秒)
-        self.jump_hold_timer = 0  # 跳跃按住计时器
+        self.max_jump_hold_time = 0.1  # 最大跳跃按住时间(秒)
+        self.jump_hold_until = 0  # 长按跳跃的到期时刻
         self.is_jumping = False  # 是否正在跳跃
         
         # 添加生命值相关属性
         self.max_health = 100
         self.health = self.max_health
-        self.invincible_time = 0  # 无敌时间
+        self.invincible_time = 0  # 无敌的到期时刻(游戏时钟)
         self.invincible_duration = 1.0  # 受伤后的无敌持续时间
         self.health_regen_rate = 1  # 每秒回复的生命值
         self.health_regen_delay = 5.0  # 开始回血前的延迟时间
-        self.last_damage_time = 0  # 上次受伤时间
+        self.last_damage_time = 0  # 上次受伤时间(游戏时钟)
+        
+        # 脚步声
+        self.footstep_interval = 0.3  # 脚步声间隔(秒)
+        self.footstep_timer = 0
         
     def _load_animations(self):
         """加载所有动画"""
@@ -113,23 +119,23 @@ class Player:
         
     def update(self, dt):
         """更新玩家状态"""
-        current_time = pygame.time.get_ticks()
+        current_time = self.timers.now
         keys = pygame.key.get_pressed()
         
         # 更新土狼时间
         if not self.on_ground:
             if self.just_left_ground:
                 self.just_left_ground = False
-                self.coyote_timer = current_time
+                self.coyote_until = current_time + self.coyote_time
         
         # 优化跳跃处理
         jump_key_pressed = keys[pygame.K_SPACE] or keys[pygame.K_UP] or keys[pygame.K_w]
         
         if jump_key_pressed:
-            self.jump_buffer_timer = current_time
+            self.jump_buffer_until = current_time + self.jump_buffer_time
             if self.is_jumping:
                 # 处理长按跳跃
-                if current_time - self.jump_hold_timer < self.max_jump_hold_time:
+                if current_time < self.jump_hold_until:
                     self.vy = min(self.vy, self.jump_force * 0.85)  # 持续施加向上的力
         else:
             # 跳跃中断处理
@@ -138,16 +144,16 @@ class Player:
             self.is_jumping = False
         
         # 检查是否可以跳跃
-        can_jump = self.on_ground or (current_time - self.coyote_timer < self.coyote_time)
+        can_jump = self.on_ground or current_time < self.coyote_until
         
         # 处理跳跃触发
-        if current_time - self.jump_buffer_timer < self.jump_buffer_time and can_jump:
+        if current_time < self.jump_buffer_until and can_jump:
             self.vy = self.jump_force
             self.is_jumping = True
-            self.jump_hold_timer = current_time
+            self.jump_hold_until = current_time + self.max_jump_hold_time
             self.on_ground = False
-            self.jump_buffer_timer = 0
-            self.coyote_timer = 0
+            self.jump_buffer_until = 0
+            self.coyote_until = 0
         
         # 可变跳跃高度
         if not keys[pygame.K_SPACE] and not keys[pygame.K_UP] and not keys[pygame.K_w]:
@@ -203,20 +209,51 @@ class Player:
         self.vy = min(self.vy, max_fall_speed)
         
         # 更新位置并处理碰撞
+        was_on_ground = self.on_ground
+        fall_speed = self.vy
         self._move(dt)
         
-        # 更新动画状态
+        # 落地扬尘
+        if self.on_ground and not was_on_ground and fall_speed > 300:
+            self._on_land(fall_speed)
+            
+        # 在地面上移动时发出脚步声，跑步比行走响
+        self._update_footsteps(dt)
+        
+        # 更新动画状态(动画帧由游戏循环中的共享时钟统一推进)
         self._update_animation_state()
-        # 动画
-        self.animation_manager.update(pygame.time.get_ticks())
         
         # 处理生命值回复
-        current_time = pygame.time.get_ticks() / 1000.0
+        current_time = self.timers.now
         if (current_time - self.last_damage_time > self.health_regen_delay and 
             self.health < self.max_health):
             self.health = min(self.max_health, 
                             self.health + self.health_regen_rate * dt)
         
+    def _on_land(self, fall_speed):
+        """落地时的效果"""
+        strength = min(fall_speed / 800, 1.5)
+        particles = getattr(self.gamemap.game, 'particles', None)
+        if particles:
+            particles.emit_dust(self.x + self.width / 2, self.y + self.height - 2, strength)
+        noise = getattr(self.gamemap, 'noise', None)
+        if noise:
+            noise.emit(self.x + self.width / 2, self.y + self.height - 2, strength, source='player')
+            
+    def _update_footsteps(self, dt):
+        """在地面上移动时按间隔发出脚步声"""
+        if not self.on_ground or abs(self.vx) < 1:
+            self.footstep_timer = 0
+            return
+        self.footstep_timer -= dt
+        if self.footstep_timer > 0:
+            return
+        self.footstep_timer = self.footstep_interval
+        noise = getattr(self.gamemap, 'noise', None)
+        if noise:
+            loudness = 0.8 if abs(self.vx) >= self.run_speed else 0.3
+            noise.emit(self.x + self.width / 2, self.y + self.height - 2, loudness, source='player')
+        
     def _update_animation_state(self):
         """更新动画状态"""
         # 1. 空中状态
@@ -263,21 +300,13 @@ class Player:
         else:
             check_x = self.x
             
-        # 检查三个点（上中下）
-        check_points = [
-            (check_x, self.y),  # 上
-            (check_x, self.y + self.height / 2),  # 中
-            (check_x, self.y + self.height - 1)  # 下
-        ]
-        
-        for px, py in check_points:
-            if self.gamemap.is_solid(px, py):
-                if self.vx > 0:
-                    self.x = (px // self.gamemap.tile_size) * self.gamemap.tile_size - self.width
-                else:
-                    self.x = (px // self.gamemap.tile_size + 1) * self.gamemap.tile_size
-                self.vx = 0
-                break
+        # 检查前方整条边
+        if self.gamemap.is_rect_solid(check_x, self.y, 1, self.height):
+            if self.vx > 0:
+                self.x = (check_x // self.gamemap.tile_size) * self.gamemap.tile_size - self.width
+            else:
+                self.x = (check_x // self.gamemap.tile_size + 1) * self.gamemap.tile_size
+            self.vx = 0
     
     def _check_y_collision(self):
         """检查垂直方向的碰撞"""
@@ -289,45 +318,37 @@ class Player:
         else:
             check_y = self.y
             
-        # 检查三个点（左中右）
-        check_points = [
-            (self.x, check_y),  # 左
-            (self.x + self.width / 2, check_y),  # 中
-            (self.x + self.width - 1, check_y)  # 右
-        ]
-        
-        for px, py in check_points:
-            # 下落时检查实心块和平台，上升时只检查实心块
-            if (self.vy > 0 and self.gamemap.get_tile(px, py) in [self.gamemap.WALL, self.gamemap.PLATFORM]) or \
-               (self.vy < 0 and self.gamemap.is_solid(px, py)):
-                if self.vy > 0:
-                    self.y = (py // self.gamemap.tile_size) * self.gamemap.tile_size - self.height
-                    self.on_ground = True
-                else:
-                    self.y = (py // self.gamemap.tile_size + 1) * self.gamemap.tile_size
-                self.vy = 0
-                break
+        # 检查整条边(实心块和平台都算实心)
+        if self.vy != 0 and self.gamemap.is_rect_solid(self.x, check_y, self.width, 1):
+            if self.vy > 0:
+                self.y = (check_y // self.gamemap.tile_size) * self.gamemap.tile_size - self.height
+                self.on_ground = True
+            else:
+                self.y = (check_y // self.gamemap.tile_size + 1) * self.gamemap.tile_size
+            self.vy = 0
     
     def render(self, camera_offset=(0, 0)):
         """渲染玩家"""
-        screen_x = self.x - camera_offset[0]
-        screen_y = self.y - camera_offset[1]
+        game = self.gamemap.game
+        scale = game.render_scale
+        screen_x = (self.x - camera_offset[0]) * scale
+        screen_y = (self.y - camera_offset[1]) * scale
         
         # 获取当前动画帧
         current_frame = self.animation_manager.get_current_frame()
         if current_frame:
-            self.gamemap.game.screen.blit(current_frame, (screen_x, screen_y))
+            game.screen.blit(game.view.get_scaled(current_frame), (screen_x, screen_y))
         else:
             # 如果没有动画帧，使用默认的矩形
-            player_rect = pygame.Rect(screen_x, screen_y, self.width, self.height)
-            self.gamemap.game.view.draw_rect(self.color, player_rect) 
+            player_rect = pygame.Rect(screen_x, screen_y, self.width * scale, self.height * scale)
+            game.view.draw_rect(self.color, player_rect) 
         
     def take_damage(self, amount):
         """受到伤害
         Args:
             amount: 伤害值
         """
-        current_time = pygame.time.get_ticks() / 1000.0  # 转换为秒
+        current_time = self.timers.now
         
         # 检查是否处于无敌状态
         if current_time < self.invincible_time:
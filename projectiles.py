@@ -0,0 +1,196 @@
+import pygame
+import numpy as np
+
+
+class ProjectileStore:
+    """结构数组形式的投射物存储
+
+    所有投射物的属性保存在预分配数组的前count项中，删除时用末尾元素填补空位(swap-remove)，
+    积分、寿命、地图碰撞和与目标的距离检测都是批量向量运算。
+    """
+    SOURCE_PLAYER = 0
+    SOURCE_ENEMY = 1
+    SOURCES = {'player': SOURCE_PLAYER, 'enemy': SOURCE_ENEMY}
+
+    def __init__(self, game, capacity=256, radius=5, color=(255, 100, 100)):
+        """
+        game: 游戏对象
+        capacity: 初始容量(不够时自动扩容)
+        radius: 默认半径
+        color: 投射物颜色
+        """
+        self.game = game
+        self.count = 0
+        self.default_radius = radius
+        self.color = color
+        self._fields = ('x', 'y', 'vx', 'vy', 'damage', 'radius', 'lifetime', 'source')
+        self._allocate(capacity)
+
+        self._sprite = None        # 预渲染的投射物精灵
+        self._sprite_scale = None
+
+    def _allocate(self, capacity):
+        """分配或扩容数组"""
+        dtypes = {
+            'x': np.float32, 'y': np.float32,
+            'vx': np.float32, 'vy': np.float32,
+            'damage': np.float32, 'radius': np.float32,
+            'lifetime': np.float32, 'source': np.int8,
+        }
+        for name in self._fields:
+            array = np.zeros(capacity, dtype=dtypes[name])
+            if hasattr(self, name):
+                array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def spawn(self, x, y, vx, vy, damage, source, radius=None, lifetime=2.0):
+        """生成投射物
+        Args:
+            x, y: 初始位置
+            vx, vy: 速度
+            damage: 伤害值
+            source: 来源('player' or 'enemy')
+            radius: 半径(默认使用default_radius)
+            lifetime: 存活时间
+        """
+        if self.count >= self.capacity:
+            self._allocate(self.capacity * 2)
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.vx[i] = vx
+        self.vy[i] = vy
+        self.damage[i] = damage
+        self.radius[i] = self.default_radius if radius is None else radius
+        self.lifetime[i] = lifetime
+        self.source[i] = self.SOURCES[source]
+        self.count += 1
+
+    def remove(self, index):
+        """删除单个投射物(用末尾元素填补)"""
+        last = self.count - 1
+        if index != last:
+            for name in self._fields:
+                array = getattr(self, name)
+                array[index] = array[last]
+        self.count = last
+
+    def remove_many(self, indices):
+        """批量删除投射物
+        Args:
+            indices: 要删除的索引数组(不要求有序)
+        """
+        dead = np.unique(indices)
+        if len(dead) == 0:
+            return
+        n = self.count
+        new_count = n - len(dead)
+
+        # 前new_count项中的空位，用末尾仍存活的元素填补
+        holes = dead[dead < new_count]
+        tail = np.arange(new_count, n)
+        survivors = tail[~np.isin(tail, dead)]
+        if len(holes):
+            for name in self._fields:
+                array = getattr(self, name)
+                array[holes] = array[survivors]
+        self.count = new_count
+
+    def clear(self):
+        """清除所有投射物"""
+        self.count = 0
+
+    def update(self, dt):
+        """批量更新投射物
+        Returns:
+            np.ndarray: 撞墙的位置和来源数组 shape=(k, 3)，每行为(x, y, 来源编号)
+        """
+        n = self.count
+        if n == 0:
+            return np.empty((0, 3), dtype=np.float32)
+
+        x, y = self.x[:n], self.y[:n]
+        step_x = self.vx[:n] * dt
+        step_y = self.vy[:n] * dt
+
+        # 线段扫掠：沿本帧位移按不超过1/4砖块的间隔采样，防止高速投射物穿墙
+        tile_size = self.game.gamemap.tile_size
+        distance = np.maximum(np.abs(step_x), np.abs(step_y))
+        samples = max(1, int(np.ceil(distance.max() / (tile_size / 4))))
+        fractions = np.arange(1, samples + 1, dtype=np.float32) / samples
+        sample_x = x[:, None] + step_x[:, None] * fractions
+        sample_y = y[:, None] + step_y[:, None] * fractions
+        solid = self.game.gamemap.is_solid_array(sample_x, sample_y)
+
+        hit = solid.any(axis=1)
+        first = solid.argmax(axis=1)
+        rows = np.flatnonzero(hit)
+        impacts = np.stack(
+            [sample_x[rows, first[rows]], sample_y[rows, first[rows]], self.source[:n][rows]], axis=1
+        ).astype(np.float32)
+
+        x += step_x
+        y += step_y
+        self.lifetime[:n] -= dt
+
+        # 撞墙或寿命结束的投射物一次性删除
+        expired = hit | (self.lifetime[:n] <= 0)
+        if expired.any():
+            self.remove_many(np.flatnonzero(expired))
+        return impacts
+
+    def find_source(self, source):
+        """获取指定来源的投射物索引"""
+        return np.flatnonzero(self.source[:self.count] == self.SOURCES[source])
+
+    def find_hits(self, center_x, center_y, target_radius, source):
+        """查找与圆形目标相交的投射物
+        Args:
+            center_x, center_y: 目标中心
+            target_radius: 目标半径
+            source: 投射物来源('player' or 'enemy')
+        Returns:
+            np.ndarray: 命中的投射物索引
+        """
+        n = self.count
+        if n == 0:
+            return np.empty(0, dtype=np.int64)
+        dx = self.x[:n] - center_x
+        dy = self.y[:n] - center_y
+        reach = self.radius[:n] + target_radius
+        hits = (self.source[:n] == self.SOURCES[source]) & (dx * dx + dy * dy < reach * reach)
+        return np.flatnonzero(hits)
+
+    def _get_sprite(self, scale):
+        """获取预渲染的投射物精灵"""
+        if self._sprite is None or self._sprite_scale != scale:
+            radius = max(1, int(self.default_radius * scale))
+            sprite = pygame.Surface((radius * 2 + 1, radius * 2 + 1), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, self.color, (radius, radius), radius)
+            self._sprite = sprite
+            self._sprite_scale = scale
+        return self._sprite
+
+    def render(self, camera_offset=(0, 0)):
+        """用同一个精灵批量绘制投射物"""
+        n = self.count
+        if n == 0:
+            return
+        screen = self.game.screen
+        scale = self.game.render_scale
+        sprite = self._get_sprite(scale)
+        offset = sprite.get_width() // 2
+
+        screen_x = ((self.x[:n] - camera_offset[0]) * scale).astype(np.int32) - offset
+        screen_y = ((self.y[:n] - camera_offset[1]) * scale).astype(np.int32) - offset
+        width, height = screen.get_size()
+        visible = ((screen_x > -sprite.get_width()) & (screen_x < width) &
+                   (screen_y > -sprite.get_height()) & (screen_y < height))
+        screen.blits(
+            [(sprite, pos) for pos in zip(screen_x[visible].tolist(), screen_y[visible].tolist())],
+            doreturn=False
+        )
@@ -0,0 +1,127 @@
+from enum import Enum
+
+
+class SimulationTier(Enum):
+    FULL = "full"          # 相机附近：完整物理和AI
+    COARSE = "coarse"      # 外围环带：低频粗略模拟
+    DORMANT = "dormant"    # 远处：休眠，不更新并释放临时数据
+
+
+class SimulationLOD:
+    """敌人模拟的细节层级管理
+
+    相机附近的敌人每帧完整更新；外围环带内的敌人按固定间隔做粗略模拟
+    (巡逻进度、状态计时，不做视线和寻路)；更远的敌人休眠，完全不更新，
+    只释放路径、叫骂表面等临时数据。
+    实体升到更精细的层级时，用同样的粗略模拟追赶落下的时间，结果是确定的。
+    """
+    def __init__(self, game, coarse_margin=None, coarse_interval=0.25, max_catch_up=60.0):
+        """
+        game: 游戏对象
+        coarse_margin: 外围环带宽度(默认为一个屏幕大小)
+        coarse_interval: 粗略模拟的间隔(秒)
+        max_catch_up: 唤醒时最多追赶的时间(秒)
+        """
+        self.game = game
+        self.coarse_margin = coarse_margin
+        self.coarse_interval = coarse_interval
+        self.max_catch_up = max_catch_up
+
+        self.time = 0.0            # 模拟时间
+        self.tiers = {}            # enemy -> SimulationTier (休眠的敌人不在其中)
+        self.last_simulated = {}   # enemy -> 最后一次模拟的时间
+
+    def get_tier(self, enemy):
+        """获取敌人当前所在的层级"""
+        return self.tiers.get(enemy, SimulationTier.DORMANT)
+
+    def update(self, dt, full_rect):
+        """重新划分层级并推进外围环带
+        Args:
+            dt: 帧时间
+            full_rect: 完整模拟区域(世界坐标)
+        Returns:
+            list: 需要完整更新的敌人
+        """
+        self.time += dt
+        spatial_hash = self.game.gamemap.spatial_hash
+
+        if self.coarse_margin is None:
+            margin_x, margin_y = self.game.display.get_size()
+        else:
+            margin_x = margin_y = self.coarse_margin
+        coarse_rect = full_rect.inflate(margin_x * 2, margin_y * 2)
+
+        full = spatial_hash.query_rect(full_rect)
+        nearby = spatial_hash.query_rect(coarse_rect)
+        full_set = set(full)
+        nearby_set = set(nearby)
+
+        # 离开外围环带的敌人进入休眠(已被移除的敌人直接丢弃)
+        for enemy in [e for e in self.tiers if e not in nearby_set]:
+            if enemy in spatial_hash:
+                self._make_dormant(enemy)
+            else:
+                del self.tiers[enemy]
+                self.last_simulated.pop(enemy, None)
+
+        for enemy in nearby:
+            tier = SimulationTier.FULL if enemy in full_set else SimulationTier.COARSE
+            previous = self.tiers.get(enemy, SimulationTier.DORMANT)
+            if previous == SimulationTier.DORMANT:
+                # 从未被模拟过的敌人从开局算起
+                self.last_simulated.setdefault(enemy, 0.0)
+            if tier == SimulationTier.FULL:
+                if previous != SimulationTier.FULL:
+                    self._catch_up(enemy)
+                    self._settle(enemy)
+                self.last_simulated[enemy] = self.time
+            elif self.time - self.last_simulated[enemy] >= self.coarse_interval:
+                self._catch_up(enemy)
+            self.tiers[enemy] = tier
+
+        return full
+
+    def _catch_up(self, enemy):
+        """用粗略模拟追赶到当前时间"""
+        elapsed = min(self.time - self.last_simulated.get(enemy, self.time), self.max_catch_up)
+        self.last_simulated[enemy] = self.time
+        if elapsed > 0 and hasattr(enemy, 'ai'):
+            enemy.ai.simulate_coarse(elapsed)
+            self.game.gamemap.spatial_hash.move_object(enemy, enemy.get_rect())
+
+    def _settle(self, enemy):
+        """进入完整模拟前，把粗略移动后的敌人放回地面
+        整个矩形嵌在地形里时向上寻找空位，然后落到下方最近的可站立表面。
+        """
+        gamemap = self.game.gamemap
+        tile_size = gamemap.tile_size
+        for _ in range(4):
+            if not gamemap.is_rect_solid(enemy.x, enemy.y, enemy.width, enemy.height):
+                break
+            enemy.y -= tile_size
+
+        enemy.on_ground = False
+        surface_index = getattr(gamemap, 'surface_index', None)
+        if surface_index is not None:
+            # 矩形覆盖的各列中最高的表面就是下落时先碰到的地面
+            start_row = surface_index.stand_row(enemy.y, enemy.height)
+            rows = [surface_index.find_surface(col, start_row)
+                    for col in range(int(enemy.x // tile_size),
+                                     int((enemy.x + enemy.width - 1) // tile_size) + 1)]
+            rows = [row for row in rows if row is not None]
+            if rows:
+                row = min(rows)
+                stand_y = surface_index.stand_y(row, enemy.height)
+                if not gamemap.is_rect_solid(enemy.x, stand_y, enemy.width, enemy.height):
+                    enemy.y = stand_y
+                    enemy.vy = 0
+                    enemy.on_ground = True
+        gamemap.spatial_hash.move_object(enemy, enemy.get_rect())
+
+    def _make_dormant(self, enemy):
+        """追赶到当前时间后释放临时数据(其余状态留在实体上，唤醒时从这里继续追赶)"""
+        self._catch_up(enemy)
+        del self.tiers[enemy]
+        if hasattr(enemy, 'ai'):
+            enemy.ai.release_transient_state()
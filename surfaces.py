@@ -0,0 +1,162 @@
+import bisect
+
+
+class SurfaceIndex:
+    """可站立表面索引
+
+    从砖块网格预先计算每一列的可站立表面(实心砖块上方的非实心格)，
+    记录每个表面上方连续非实心格的数量(净空)和连续空格的数量，
+    以及同一行相邻表面连成的可行走区段。砖块变化时只重算所在的列。
+    """
+    def __init__(self, game_map):
+        """
+        game_map: 游戏地图
+        """
+        self.game_map = game_map
+        self.tile_size = game_map.tile_size
+        self.rows, self.cols = game_map.solid_grid.shape
+        self.level_cols = self.cols // len(game_map.levels)
+
+        self._rows = [None] * self.cols       # 列 -> 表面所在行(升序)
+        self._surfaces = [None] * self.cols   # 列 -> [(行, 净空, 空格数)]
+        self._spans = {}                      # 最小净空 -> {格子编号: (行, 起始列, 结束列)}
+        self._ground_runs = {}                # (关卡, 最小空格数) -> [(起始列, 结束列)]
+        for col in range(self.cols):
+            self._build_column(col)
+
+    def _build_column(self, col):
+        """计算一列的所有表面"""
+        solid = self.game_map.solid_grid[:, col].tolist()
+        empty = (self.game_map.tile_grid[:, col] == self.game_map.EMPTY).tolist()
+        rows = []
+        surfaces = []
+        headroom = 0   # 当前格向上连续非实心格数
+        clear = 0      # 当前格向上连续空格数
+        for row in range(self.rows):
+            headroom = 0 if solid[row] else headroom + 1
+            clear = clear + 1 if empty[row] else 0
+            if headroom and row + 1 < self.rows and solid[row + 1]:
+                rows.append(row)
+                surfaces.append((row, headroom, clear))
+        self._rows[col] = rows
+        self._surfaces[col] = surfaces
+
+    def on_tile_changed(self, col, row):
+        """砖块变化时重算所在的列"""
+        self._build_column(col)
+        self._spans.clear()
+        self._ground_runs.clear()
+
+    def get_surfaces(self, col):
+        """获取一列的表面列表 [(行, 净空, 空格数)]，行号升序"""
+        if 0 <= col < self.cols:
+            return self._surfaces[col]
+        return []
+
+    def stand_y(self, row, height):
+        """站在表面上时实体左上角的y坐标"""
+        return (row + 1) * self.tile_size - height
+
+    def stand_row(self, y, height):
+        """站立位置(左上角y)不低于y的最高表面行"""
+        return int(-(-(y + height) // self.tile_size)) - 1
+
+    def find_surface(self, col, row, min_headroom=1, downward=True):
+        """查找一列中的表面
+        Args:
+            col: 列
+            row: 起始行
+            min_headroom: 最小净空(格)
+            downward: True时返回行号不小于row的第一个表面，False时返回行号小于row的最后一个表面
+        Returns:
+            int: 表面所在行，找不到时为None
+        """
+        if not 0 <= col < self.cols:
+            return None
+        rows = self._rows[col]
+        surfaces = self._surfaces[col]
+        index = bisect.bisect_left(rows, row)
+        if downward:
+            for surface_row, headroom, _ in surfaces[index:]:
+                if headroom >= min_headroom:
+                    return surface_row
+        else:
+            for surface_row, headroom, _ in reversed(surfaces[:index]):
+                if headroom >= min_headroom:
+                    return surface_row
+        return None
+
+    def get_surface(self, col, row):
+        """获取指定格子上的表面 (行, 净空, 空格数)，不是表面时为None"""
+        if not 0 <= col < self.cols:
+            return None
+        rows = self._rows[col]
+        index = bisect.bisect_left(rows, row)
+        if index < len(rows) and rows[index] == row:
+            return self._surfaces[col][index]
+        return None
+
+    def _get_span_map(self, min_headroom):
+        """按最小净空划分可行走区段：同一行、列相邻的表面连成一段"""
+        spans = self._spans.get(min_headroom)
+        if spans is not None:
+            return spans
+        spans = {}
+        cols = self.cols
+        open_spans = {}   # 行 -> 正在延伸的区段(起始列, 格子编号列表)
+        for col in range(cols + 1):
+            current = set()
+            if col < cols:
+                for row, headroom, _ in self._surfaces[col]:
+                    if headroom >= min_headroom:
+                        current.add(row)
+            # 结束没有延续到本列的区段
+            for row in [row for row in open_spans if row not in current]:
+                first, cells = open_spans.pop(row)
+                span = (row, first, col - 1)
+                for cell in cells:
+                    spans[cell] = span
+            for row in current:
+                if row not in open_spans:
+                    open_spans[row] = (col, [])
+                open_spans[row][1].append(row * cols + col)
+        self._spans[min_headroom] = spans
+        return spans
+
+    def span_at(self, col, row, min_headroom=1):
+        """获取表面所在的可行走区段
+        Returns:
+            tuple: (行, 起始列, 结束列)，不是表面时为None
+        """
+        if not 0 <= col < self.cols:
+            return None
+        return self._get_span_map(min_headroom).get(row * self.cols + col)
+
+    def get_ground_runs(self, level_index, min_clear):
+        """获取关卡中最低表面上方有足够空格的连续列
+        Args:
+            level_index: 关卡索引
+            min_clear: 最低表面上方至少需要的空格数
+        Returns:
+            list: [(起始列, 结束列)]，世界网格列号
+        """
+        key = (level_index, min_clear)
+        runs = self._ground_runs.get(key)
+        if runs is not None:
+            return runs
+        runs = []
+        start = None
+        first_col = level_index * self.level_cols
+        last_col = min(self.cols, first_col + self.level_cols)
+        for col in range(first_col, last_col):
+            surfaces = self._surfaces[col]
+            if surfaces and surfaces[-1][2] >= min_clear:
+                if start is None:
+                    start = col
+            elif start is not None:
+                runs.append((start, col - 1))
+                start = None
+        if start is not None:
+            runs.append((start, last_col - 1))
+        self._ground_runs[key] = runs
+        return runs
@@ -0,0 +1,136 @@
+import heapq
+import itertools
+
+
+class Timer:
+    """计时器句柄，由TimerQueue.schedule返回"""
+    __slots__ = ('queue', 'deadline', 'callback', 'active')
+
+    def __init__(self, queue, deadline, callback):
+        self.queue = queue
+        self.deadline = deadline
+        self.callback = callback
+        self.active = True
+
+    @property
+    def remaining(self):
+        """距到期的剩余时间(秒)，已到期或已取消时为0"""
+        if not self.active:
+            return 0.0
+        return max(0.0, self.deadline - self.queue.now)
+
+    def cancel(self):
+        """取消计时器(堆中的条目在弹出时丢弃)"""
+        if self.active:
+            self.active = False
+            self.callback = None
+            self.queue._cancelled += 1
+
+
+class TimerQueue:
+    """游戏时钟上的截止时间堆
+
+    实体登记到期时间和回调，时钟推进时只弹出已经到期的计时器；
+    没有到期的计时器不产生任何每帧开销。只需要判断是否冷却完毕的场合直接保存到期时刻，
+    剩余时间 = 到期时刻 - 当前时间，连堆都不用进。
+    """
+    def __init__(self):
+        self.now = 0.0                    # 游戏时间(秒)，暂停时不推进
+        self._heap = []                   # (到期时间, 序号, Timer)
+        self._sequence = itertools.count()
+        self._cancelled = 0               # 堆中已取消的条目数
+        self.stats = {'scheduled': 0, 'fired': 0}
+
+    def __len__(self):
+        return len(self._heap) - self._cancelled
+
+    def schedule(self, delay, callback):
+        """登记一个计时器
+        Args:
+            delay: 多少秒后到期
+            callback: 到期时调用的函数(无参数)
+        Returns:
+            Timer: 可用于取消或查询剩余时间的句柄
+        """
+        timer = Timer(self, self.now + delay, callback)
+        heapq.heappush(self._heap, (timer.deadline, next(self._sequence), timer))
+        self.stats['scheduled'] += 1
+        # 取消的条目过多时重建堆
+        if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+            self._compact()
+        return timer
+
+    def advance(self, dt):
+        """推进时钟并触发所有到期的计时器"""
+        self.now += dt
+        heap = self._heap
+        now = self.now
+        while heap and heap[0][0] <= now:
+            timer = heapq.heappop(heap)[2]
+            if not timer.active:
+                self._cancelled -= 1
+                continue
+            callback = timer.callback
+            timer.active = False
+            timer.callback = None
+            self.stats['fired'] += 1
+            try:
+                callback()
+            except Exception as e:
+                print(f"计时器回调错误: {e}")
+
+    def _compact(self):
+        """丢弃已取消的条目"""
+        self._heap = [entry for entry in self._heap if entry[2].active]
+        heapq.heapify(self._heap)
+        self._cancelled = 0
+
+    def clear(self):
+        """取消所有计时器"""
+        for entry in self._heap:
+            entry[2].active = False
+            entry[2].callback = None
+        self._heap = []
+        self._cancelled = 0
+
+
+def cooldown_property(slot, doc=None):
+    """以剩余时间读写的冷却属性，实际只保存到期时刻(宿主需要有timers属性)
+    Args:
+        slot: 保存到期时刻的属性名
+    """
+    def fget(self):
+        return max(0.0, getattr(self, slot) - self.timers.now)
+
+    def fset(self, value):
+        setattr(self, slot, self.timers.now + value)
+
+    return property(fget, fset, doc=doc)
+
+
+def timer_property(slot, on_expire, doc=None):
+    """以剩余时间读写、到期时调用回调的计时属性(宿主需要有timers属性)
+    设为正数时登记计时器，设为0时取消。
+    Args:
+        slot: 保存Timer句柄的属性名
+        on_expire: 到期时调用的宿主方法名
+    """
+    def fget(self):
+        timer = getattr(self, slot)
+        return timer.remaining if timer is not None else 0.0
+
+    def fset(self, value):
+        timer = getattr(self, slot)
+        if timer is not None:
+            timer.cancel()
+        if value > 0:
+            timer = self.timers.schedule(value, getattr(self, on_expire))
+        else:
+            timer = None
+        setattr(self, slot, timer)
+
+    return property(fget, fset, doc=doc)
+
+
+# 默认的共享游戏时钟，由游戏循环每帧推进一次
+default_timers = TimerQueue()
@@ -0,0 +1,223 @@
+import math
+import numpy as np
+
+
+class _Line:
+    """视野边界线，端点为格子角点坐标(相对玩家格子的象限坐标)"""
+    __slots__ = ('xi', 'yi', 'xf', 'yf')
+
+    def __init__(self, xi, yi, xf, yf):
+        self.xi, self.yi, self.xf, self.yf = xi, yi, xf, yf
+
+    def relative_slope(self, x, y):
+        """点相对直线的位置：>0在直线下方，<0在上方，0为共线"""
+        return (self.yf - self.yi) * (self.xf - x) - (self.xf - self.xi) * (self.yf - y)
+
+    def is_collinear_line(self, other):
+        return self.relative_slope(other.xi, other.yi) == 0 and self.relative_slope(other.xf, other.yf) == 0
+
+
+class _Bump:
+    """收窄视野的遮挡角点(链表)"""
+    __slots__ = ('x', 'y', 'parent')
+
+    def __init__(self, x, y, parent):
+        self.x, self.y, self.parent = x, y, parent
+
+
+class _View:
+    """象限中一段没有被遮挡的视野，由浅边界线和陡边界线围成"""
+    __slots__ = ('shallow', 'steep', 'shallow_bump', 'steep_bump')
+
+    def __init__(self, shallow, steep, shallow_bump=None, steep_bump=None):
+        self.shallow = shallow
+        self.steep = steep
+        self.shallow_bump = shallow_bump
+        self.steep_bump = steep_bump
+
+    def copy(self):
+        shallow, steep = self.shallow, self.steep
+        return _View(_Line(shallow.xi, shallow.yi, shallow.xf, shallow.yf),
+                     _Line(steep.xi, steep.yi, steep.xf, steep.yf),
+                     self.shallow_bump, self.steep_bump)
+
+
+class FieldOfView:
+    """以玩家所在格子为中心的视野图
+
+    用精确宽松视野(precise permissive field of view)计算：只要玩家格子内的某一点和目标格子内的某一点
+    之间有不穿过实心砖块内部的直线，目标格子就可见。因此视野是任意两点间精确视线的超集，
+    判定为不可见的格子一定看不到玩家，可以放心排除。范围限制在敌人的最大检测距离内，
+    只在玩家换格子或地图砖块变化时重新计算，敌人查询自己所在格子即可，与敌人数量无关。
+    """
+    # 四个象限的方向 (列方向, 行方向)
+    QUADRANTS = ((1, 1), (1, -1), (-1, -1), (-1, 1))
+
+    def __init__(self, game_map, max_range=400):
+        """
+        game_map: 游戏地图
+        max_range: 最大可见距离(像素)，一般取敌人检测距离的最大值
+        """
+        self.game_map = game_map
+        self.tile_size = game_map.tile_size
+        self.rows, self.cols = game_map.solid_grid.shape
+        self.max_range = max_range
+        self.radius = int(math.ceil(max_range / self.tile_size)) + 1
+
+        self.visible = np.zeros((self.rows, self.cols), dtype=bool)  # [行, 列]
+        self.origin = None           # 当前视野的中心格子 (列, 行)
+        self._tile_version = None    # 计算视野时的地图版本
+        self._lit = []               # 当前可见的格子 (列, 行)
+        self.recomputes = 0
+
+    def update(self, position):
+        """在玩家换格子或地图变化时重新计算视野
+        Args:
+            position: 玩家位置(世界坐标)
+        """
+        origin = (int(position[0] // self.tile_size), int(position[1] // self.tile_size))
+        tile_version = self.game_map.tile_version
+        if origin == self.origin and tile_version == self._tile_version:
+            return
+        self.origin = origin
+        self._tile_version = tile_version
+        self._compute(origin)
+
+    def covers(self, position):
+        """视野是否以该位置所在的格子为中心且与当前地图一致"""
+        return (self._tile_version == self.game_map.tile_version and
+                self.origin == (int(position[0] // self.tile_size), int(position[1] // self.tile_size)))
+
+    def is_visible(self, x, y):
+        """世界坐标所在的格子是否可能被看到"""
+        col = int(x // self.tile_size)
+        row = int(y // self.tile_size)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return bool(self.visible[row, col])
+        return False
+
+    def are_visible(self, xs, ys):
+        """批量查询多个世界坐标所在的格子是否可能被看到"""
+        cols = np.floor_divide(xs, self.tile_size).astype(np.int64)
+        rows = np.floor_divide(ys, self.tile_size).astype(np.int64)
+        inside = (cols >= 0) & (cols < self.cols) & (rows >= 0) & (rows < self.rows)
+        result = np.zeros(cols.shape, dtype=bool)
+        result[inside] = self.visible[rows[inside], cols[inside]]
+        return result
+
+    def _compute(self, origin):
+        """从中心格子按四个象限计算视野"""
+        if self._lit:
+            cols, rows = zip(*self._lit)
+            self.visible[list(rows), list(cols)] = False
+
+        lit = set()
+        col, row = origin
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            lit.add(origin)
+            radius = self.radius
+            extents = {
+                1: (min(self.cols - col - 1, radius), min(self.rows - row - 1, radius)),
+                -1: (min(col, radius), min(row, radius)),
+            }
+            for d_col, d_row in self.QUADRANTS:
+                self._check_quadrant(lit, col, row, d_col, d_row,
+                                     extents[d_col][0], extents[d_row][1])
+
+        self._lit = list(lit)
+        if self._lit:
+            cols, rows = zip(*self._lit)
+            self.visible[list(rows), list(cols)] = True
+        self.recomputes += 1
+
+    def _check_quadrant(self, lit, origin_col, origin_row, d_col, d_row, extent_x, extent_y):
+        """按到原点的对角线距离由近到远扫描一个象限，维护尚未被遮挡的视野列表"""
+        solid = self.game_map._solid_rows
+        views = [_View(_Line(0, 1, extent_x, 0), _Line(1, 0, 0, extent_y))]
+        for distance in range(1, extent_x + extent_y + 1):
+            if not views:
+                break
+            index = 0
+            for y in range(max(distance - extent_x, 0), min(distance, extent_y) + 1):
+                if index >= len(views):
+                    break
+                x = distance - y
+                col = origin_col + x * d_col
+                row = origin_row + y * d_row
+                index = self._visit(lit, views, index, x, y, col, row, solid[row][col])
+
+    def _visit(self, lit, views, index, x, y, col, row, blocked):
+        """处理象限中的一个格子，被遮挡时收窄、拆分或删除视野
+        Returns:
+            int: 下一个格子开始查找的视野下标
+        """
+        # 格子的左上角和右下角(象限坐标，y轴朝外)
+        top_x, top_y = x, y + 1
+        bottom_x, bottom_y = x + 1, y
+        while index < len(views) and views[index].steep.relative_slope(bottom_x, bottom_y) >= 0:
+            index += 1
+        if index == len(views) or views[index].shallow.relative_slope(top_x, top_y) <= 0:
+            return index
+        lit.add((col, row))
+        if not blocked:
+            return index
+
+        view = views[index]
+        above_shallow = view.shallow.relative_slope(bottom_x, bottom_y) < 0
+        below_steep = view.steep.relative_slope(top_x, top_y) > 0
+        if above_shallow and below_steep:
+            # 格子完全挡住这段视野
+            del views[index]
+        elif above_shallow:
+            self._add_shallow_bump(view, top_x, top_y)
+            self._check_view(views, index)
+        elif below_steep:
+            self._add_steep_bump(view, bottom_x, bottom_y)
+            self._check_view(views, index)
+        else:
+            # 格子在视野中间，拆成两段
+            views.insert(index, view.copy())
+            shallow_index, steep_index = index, index + 1
+            self._add_steep_bump(views[shallow_index], bottom_x, bottom_y)
+            if not self._check_view(views, shallow_index):
+                steep_index -= 1
+            self._add_shallow_bump(views[steep_index], top_x, top_y)
+            self._check_view(views, steep_index)
+            index = steep_index
+        return index
+
+    @staticmethod
+    def _add_shallow_bump(view, x, y):
+        """用遮挡角点抬高浅边界线"""
+        view.shallow.xf, view.shallow.yf = x, y
+        view.shallow_bump = _Bump(x, y, view.shallow_bump)
+        bump = view.steep_bump
+        while bump is not None:
+            if view.shallow.relative_slope(bump.x, bump.y) < 0:
+                view.shallow.xi, view.shallow.yi = bump.x, bump.y
+            bump = bump.parent
+
+    @staticmethod
+    def _add_steep_bump(view, x, y):
+        """用遮挡角点压低陡边界线"""
+        view.steep.xf, view.steep.yf = x, y
+        view.steep_bump = _Bump(x, y, view.steep_bump)
+        bump = view.shallow_bump
+        while bump is not None:
+            if view.steep.relative_slope(bump.x, bump.y) > 0:
+                view.steep.xi, view.steep.yi = bump.x, bump.y
+            bump = bump.parent
+
+    @staticmethod
+    def _check_view(views, index):
+        """删除已经收窄成一条穿过原点格子角点的线的视野
+        Returns:
+            bool: 视野是否保留
+        """
+        view = views[index]
+        shallow, steep = view.shallow, view.steep
+        if shallow.is_collinear_line(steep) and (shallow.relative_slope(0, 1) == 0 or
+                                                 shallow.relative_slope(1, 0) == 0):
+            del views[index]
+            return False
+        return True